@@ -2,8 +2,20 @@ import sys
 import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
+import datetime
+
+import polars as pl
 import streamlit as st
 
+from modules import metrics
+from modules.framecache import load_villes
+from modules.rolling import ROLLING_CACHE
+from modules.logs import configure_logging
+from modules.storage import init_db, read_latest
+
+# Point de configuration unique du logging (JSON, échantillonnage)
+configure_logging()
+
 st.set_page_config(
     page_title="HaïtiMétéo+",
     page_icon="🌤️",
@@ -26,10 +38,23 @@ menu = st.sidebar.radio(
         "Historique Live",
         "Archives météorologiques",
         "Carte des villes",
-        "Gestion des villes"
+        "Sécheresse (SPI)",
+        "Gestion des villes",
+        "Métriques (admin)"
     ]
 )
 
+# Schéma à jour (tables ajoutées depuis la création de la base), une fois par processus
+@st.cache_resource
+def _init_db():
+    init_db()
+
+_init_db()
+
+# Export Prometheus optionnel (ex: METEO_METRICS_PORT=9108)
+if os.environ.get("METEO_METRICS_PORT"):
+    metrics.serve_prometheus(int(os.environ["METEO_METRICS_PORT"]))
+
 # ------------------------------
 # ROUTEUR
 # ------------------------------
@@ -42,22 +67,57 @@ Bienvenue dans **HaïtiMétéo+**, votre tableau de bord centralisé pour explor
 Utilisez le menu de gauche pour naviguer entre les sections.
 """)
 
+    # État actuel de chaque ville : une ligne par ville (meteo_latest)
+    latest = read_latest()
+    if not latest.is_empty():
+        st.subheader("🌡️ Dernières observations")
+        st.dataframe(
+            latest.select("ville", "timestamp", "temperature", "humidite", "precipitation", "vent"),
+            use_container_width=True,
+            hide_index=True,
+        )
+
+    # Suivi sécheresse / crues : cumuls glissants du dernier jour archivé par ville.
+    # Cache prolongé jour par jour : seuls les jours nouveaux sont calculés.
+    villes = load_villes()
+    if not villes.is_empty():
+        today = datetime.date.today()
+        rolling = ROLLING_CACHE.get(villes["id"].to_list(), f"{today.year - 1}-01-01", today.isoformat())
+        if not rolling.is_empty():
+            st.subheader("🌧️ Cumuls de pluie et températures moyennes")
+            st.dataframe(
+                rolling.group_by("id_ville").agg(pl.all().sort_by("date").last())
+                .join(villes.select(pl.col("id").alias("id_ville"), "ville"), on="id_ville")
+                .select("ville", "date", "pluie_7j", "pluie_30j", "pluie_90j", "pluie_annee",
+                        "temp_moy_7j", "temp_moy_30j")
+                .sort("ville"),
+                use_container_width=True,
+                hide_index=True,
+            )
+
 elif menu == "Météo en direct":
     import views.page_live as page
-    page.render()
 
 elif menu == "Historique Live":
     import views.page_historique as page
-    page.render()
 
 elif menu == "Archives météorologiques":
     import views.page_archive as page
-    page.render()
 
 elif menu == "Carte des villes":
     import views.page_map as page
-    page.render()
+
+elif menu == "Sécheresse (SPI)":
+    import views.page_spi as page
 
 elif menu == "Gestion des villes":
     import views.page_ville as page
-    page.render()
+
+elif menu == "Métriques (admin)":
+    import views.page_metrics as page
+
+# Rendu mesuré (histogramme `render`, par page)
+if menu != "Accueil":
+    st.session_state["current_view"] = menu
+    with metrics.span("render", view=menu):
+        page.render()
@@ -8,52 +8,52 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")
 
 import streamlit as st
 import polars as pl
-import sqlite3
+import altair as alt
 from datetime import date
 import math
-from modules.storage import read_villes
+import uuid
+from modules.storage import (
+    read_archive,
+    read_date_bounds,
+    count_archive,
+    read_archive_page,
+    read_coverage,
+    ARCHIVE_COLUMNS,
+)
+from modules.framecache import ARCHIVE_CACHE, load_villes
+from modules.export import export_archive, prune_exports, EXPORT_FORMATS
+from modules.derived import cooling_degree_days, dew_point, heat_index, rain_day
+from modules.rolling import ROLLING_CACHE
+from modules.chartdata import chart_frame
+from views.widgets import (
+    paginated_table,
+    chart_section,
+    timed_fragment,
+    controls_fragment,
+    reset_render_timings,
+    render_timings_panel,
+)
 
-# python
-def _pl_from_cursor(cursor):
-    """
-    Convertit le résultat d'un curseur sqlite3 en Polars DataFrame.
-    Gère le cas sans lignes en retournant un DataFrame vide avec les colonnes.
-    """
-    cols = [d[0] for d in cursor.description] if cursor.description else []
-    rows = cursor.fetchall()
-    if not rows:
-        return pl.DataFrame({c: [] for c in cols})
-    # Construire une liste de dicts pour garantir les noms de colonnes
-    dicts = [dict(zip(cols, row)) for row in rows]
-    return pl.DataFrame(dicts)
-
-@st.cache_data(ttl=600)
+# ------------------------------------------------------
+# Chargements (cache processus partagé, sans copie)
+# ------------------------------------------------------
 def get_date_bounds(ville_id: int):
-    with sqlite3.connect("data/meteo_haiti.sqlite") as conn:
-        cursor = conn.execute(
-            """
-            SELECT MIN(date) AS min_d, MAX(date) AS max_d
-            FROM meteo_archive
-            WHERE id_ville = ?
-            """,
-            (ville_id,),
-        )
-        return _pl_from_cursor(cursor)
+    return ARCHIVE_CACHE.get_or_load(
+        ("bounds", ville_id),
+        lambda: read_date_bounds(ville_id),
+    )
 
-@st.cache_data(ttl=600)
 def load_archive(ville_id: int, start_str: str, end_str: str):
-    with sqlite3.connect("data/meteo_haiti.sqlite") as conn:
-        cursor = conn.execute(
-            """
-            SELECT date, temp_min, temp_max, humidite, precipitation, vent
-            FROM meteo_archive
-            WHERE id_ville = ?
-              AND date BETWEEN ? AND ?
-            ORDER BY date
-            """,
-            (ville_id, start_str, end_str),
-        )
-        return _pl_from_cursor(cursor)
+    # Même clé que frame_key dans render() (réutilisée par chart_section)
+    return ARCHIVE_CACHE.get_or_load(
+        ("archive", ville_id, start_str, end_str),
+        lambda: read_archive(ville_id, start_str, end_str),
+    )
+
+@st.cache_data(ttl=600)
+def count_rows(ville_id: int, start_str: str, end_str: str) -> int:
+    # Total affiché par le tableau paginé (calculé une fois par plage)
+    return count_archive(ville_id, start_str, end_str)
 
 def _to_date(val):
     if val is None:
@@ -72,23 +72,19 @@ def _fmt_metric(v, unit):
         return "N/A"
     return f"{v:.1f} {unit}"
 
-def render():
-    st.title("Archives météorologiques – HaïtiMété+")
-
-    st.write("""
-Analysez les données climatiques historiques sur toute Haïti.
-Sélectionnez une ville et choisissez librement votre plage temporelle.
-""")
-
-    st.markdown("---")
-
+def _controls():
+    """
+    Ville + plage de dates. Renvoie (ville_id, début, fin) ou None.
+    Ville et bornes viennent du cache partagé : aucune requête SQL ici
+    quand seule une date change.
+    """
     # ------------------------------------------------------
     # Sélection de la ville
     # ------------------------------------------------------
-    villes = read_villes()  # Polars
+    villes = load_villes()  # Polars (cache partagé)
     if villes.is_empty():
         st.error("Aucune ville disponible. Vérifiez la source `read_villes`.")
-        return
+        return None
 
     villes_list = villes["ville"].to_list()
     ville_choice = st.selectbox("Ville :", villes_list)
@@ -96,16 +92,16 @@ Sélectionnez une ville et choisissez librement votre plage temporelle.
     sel = villes.filter(pl.col("ville") == ville_choice)
     if sel.is_empty():
         st.error("Ville sélectionnée introuvable.")
-        return
+        return None
     ville_id = int(sel["id"][0])
 
     # ------------------------------------------------------
-    # Récupération bornes MIN/MAX via cursor SQL (avec cache)
+    # Récupération bornes MIN/MAX (avec cache)
     # ------------------------------------------------------
     bounds = get_date_bounds(ville_id)
     if bounds.is_empty():
         st.warning("Aucune donnée historique disponible pour cette ville.")
-        return
+        return None
 
     min_date_db = bounds["min_d"][0]
     max_date_db = bounds["max_d"][0]
@@ -115,7 +111,7 @@ Sélectionnez une ville et choisissez librement votre plage temporelle.
 
     if default_start is None or default_end is None:
         st.warning("Les bornes de dates sont invalides dans la base.")
-        return
+        return None
 
     col1, col2 = st.columns(2)
     start_date = col1.date_input(
@@ -133,80 +129,231 @@ Sélectionnez une ville et choisissez librement votre plage temporelle.
 
     if start_date > end_date:
         st.error("❌ La date de début doit être antérieure à la date de fin.")
-        return
+        return None
 
-    st.markdown("---")
+    return ville_id, str(start_date), str(end_date)
 
+@timed_fragment
+def _table_section(label, ville_id, start_str, end_str):
+    # Pagination et tri ne relancent que ce fragment
+    st.subheader(label)
+    paginated_table(
+        key="archive_table",
+        columns=ARCHIVE_COLUMNS,
+        count_rows=lambda: count_rows(ville_id, start_str, end_str),
+        fetch_page=lambda sort_by, desc, limit, offset: read_archive_page(
+            ville_id, start_str, end_str, sort_by, desc, limit, offset
+        ),
+    )
+
+@timed_fragment
+def _stats_section(label, df):
     # ------------------------------------------------------
-    # Chargement optimisé via cursor + Polars (cached)
+    # Statistiques (robustes)
     # ------------------------------------------------------
-    df = load_archive(ville_id, str(start_date), str(end_date))
+    stats = df.select([
+        pl.col("temp_min").mean().alias("min_avg"),
+        pl.col("temp_max").mean().alias("max_avg"),
+        pl.col("humidite").mean().alias("hum_avg"),
+        pl.col("vent").mean().alias("vent_avg"),
+        dew_point().mean().alias("rosee_avg"),
+        heat_index().max().alias("chaleur_max"),
+        cooling_degree_days().sum().alias("dj_clim"),
+        rain_day().sum().alias("jours_pluie"),
+    ]).to_dicts()[0]
+
+    st.subheader(label)
+
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Temp. min (moy.)", _fmt_metric(stats.get("min_avg"), "°C"))
+    col2.metric("Temp. max (moy.)", _fmt_metric(stats.get("max_avg"), "°C"))
+    col3.metric("Humidité (moy.)", _fmt_metric(stats.get("hum_avg"), "%"))
+    col4.metric("Vent (moy.)", _fmt_metric(stats.get("vent_avg"), "km/h"))
+
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Point de rosée (moy.)", _fmt_metric(stats.get("rosee_avg"), "°C"))
+    col2.metric("Indice de chaleur (max)", _fmt_metric(stats.get("chaleur_max"), "°C"))
+    col3.metric("Degrés-jours clim.", _fmt_metric(stats.get("dj_clim"), "°C·j"))
+    col4.metric("Jours de pluie (≥ 1 mm)", f"{stats.get('jours_pluie') or 0}")
+
+# Exports écrits sur disque, lot par lot ; au-delà de la limite, le fichier
+# n'est pas proposé au téléchargement (Streamlit le chargerait en mémoire).
+# Les exports plus anciens que EXPORT_MAX_AGE_HOURS (toutes sessions) sont
+# supprimés à chaque nouvel export.
+EXPORT_DIR = "data/exports"
+EXPORT_DOWNLOAD_MAX_MB = 200
+EXPORT_MAX_AGE_HOURS = 24
+
+@timed_fragment
+def _export_section(label, ville_id, start_str, end_str):
+    st.subheader(label)
+
+    villes = load_villes()
+    names = dict(zip(villes["ville"].to_list(), villes["id"].to_list()))
+    current = [n for n, i in names.items() if i == ville_id]
+
+    col1, col2, col3 = st.columns([2, 1, 1])
+    chosen = col1.multiselect("Villes", list(names), default=current, key="export_villes")
+    start = col2.date_input("Du", value=date.fromisoformat(start_str), key="export_start")
+    end = col3.date_input("Au", value=date.fromisoformat(end_str), key="export_end")
+    fmt = st.radio("Format", list(EXPORT_FORMATS), horizontal=True, key="export_fmt")
+
+    if not chosen or start > end:
+        st.info("Choisissez au moins une ville et une plage valide.")
+        return
+
+    if st.button("📤 Préparer l'export", key="export_go"):
+        # Un seul fichier par session : le précédent est remplacé
+        previous = st.session_state.pop("export_result", None)
+        if previous and os.path.exists(previous["path"]):
+            os.remove(previous["path"])
+
+        prune_exports(EXPORT_DIR, EXPORT_MAX_AGE_HOURS * 3600)
+        os.makedirs(EXPORT_DIR, exist_ok=True)
+        name = f"archive_{start}_{end}_{len(chosen)}villes.{fmt}"
+        token = st.session_state.setdefault("export_token", uuid.uuid4().hex[:8])
+        path = os.path.join(EXPORT_DIR, f"{token}_{name}")
+
+        bar = st.progress(0.0, text="Export en cours…")
+        result = export_archive(
+            path, fmt, [names[n] for n in chosen], str(start), str(end),
+            progress=lambda done, total: bar.progress(
+                done / total if total else 1.0, text=f"Export : {done:,} / {total:,} lignes"
+            ),
+        )
+        bar.empty()
+        st.session_state["export_result"] = {**result, "name": name, "fmt": fmt}
+
+    result = st.session_state.get("export_result")
+    if not result or not os.path.exists(result["path"]):
+        return
+
+    st.caption(f"{result['rows']:,} lignes • {result['bytes'] / 1e6:.1f} Mo")
+    if result["bytes"] > EXPORT_DOWNLOAD_MAX_MB * 1e6:
+        st.warning(
+            f"Fichier trop volumineux pour le navigateur : disponible sur le serveur "
+            f"({result['path']}). Pour les très grands exports : `python scripts/export.py`."
+        )
+        return
+
+    # st.download_button charge tout le fichier en mémoire : il n'est lu que
+    # dans le rerun du clic, pas à chaque rerun de la page
+    if not st.button(f"📦 Télécharger {result['name']}", key="export_serve"):
+        return
+
+    with open(result["path"], "rb") as f:
+        st.download_button(
+            "⬇️ Enregistrer le fichier",
+            f,
+            file_name=result["name"],
+            mime=EXPORT_FORMATS[result["fmt"]],
+            key="export_download",
+            on_click="ignore",
+        )
+
+@timed_fragment
+def _rolling_section(label, ville_id, start_str, end_str):
+    """Cumuls de pluie sur 7 / 30 / 90 jours et cumul depuis le 1er janvier."""
+    st.subheader(label)
+    df = ROLLING_CACHE.get([ville_id], start_str, end_str)
     if df.is_empty():
-        st.warning("Aucune donnée disponible pour cette période.")
+        st.info("Aucune donnée disponible pour cette période.")
         return
 
-    # Normaliser la date
-    df = df.with_columns(pl.col("date").str.to_date().alias("date"))
+    st.line_chart(chart_frame(df)[["pluie_7j", "pluie_30j", "pluie_90j"]])
+    last = df.row(-1, named=True)
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Pluie 30 j", _fmt_metric(last["pluie_30j"], "mm"))
+    col2.metric("Pluie 90 j", _fmt_metric(last["pluie_90j"], "mm"))
+    col3.metric(f"Pluie depuis le 1er janvier {last['date'].year}", _fmt_metric(last["pluie_annee"], "mm"))
 
-    # Coercion des colonnes numériques
-    numeric_cols = ["temp_min", "temp_max", "humidite", "precipitation", "vent"]
-    for c in numeric_cols:
-        if c in df.columns:
-            df = df.with_columns(pl.col(c).cast(pl.Float64))
+@timed_fragment
+def _coverage_section(label):
+    """Matrice ville × année : part des jours présents (catalogue archive_coverage)."""
+    st.subheader(label)
+    cov = read_coverage()
+    if cov.is_empty():
+        st.info("Catalogue vide : aucune donnée d'archive.")
+        return
 
-    # ------------------------------------------------------
-    # Visualisations
-    # ------------------------------------------------------
-    st.subheader("Évolution des températures")
-    st.line_chart(
-        df.select(["date", "temp_min", "temp_max"])
-          .to_pandas()
-          .set_index("date")
+    cov = cov.with_columns(
+        (pl.col("days_present") / pl.col("days_expected").clip(1) * 100).clip(0, 100).round(1).alias("complet_pct")
     )
-
-    st.subheader("Précipitations")
-    st.area_chart(
-        df.select(["date", "precipitation"])
-          .to_pandas()
-          .set_index("date")
+    chart = (
+        alt.Chart(cov.select("ville", "year", "complet_pct", "days_present", "days_missing").to_pandas())
+        .mark_rect()
+        .encode(
+            x=alt.X("year:O", title="Année"),
+            y=alt.Y("ville:N", title=None),
+            color=alt.Color("complet_pct:Q", title="% complet",
+                            scale=alt.Scale(domain=[0, 100], scheme="redyellowgreen")),
+            tooltip=["ville", "year", "complet_pct", "days_present", "days_missing"],
+        )
     )
+    st.altair_chart(chart, use_container_width=True)
 
-    st.subheader("Humidité")
-    st.line_chart(
-        df.select(["date", "humidite"])
-          .to_pandas()
-          .set_index("date")
-    )
+    holes = cov.filter(pl.col("days_missing") > 0)
+    if holes.is_empty():
+        st.caption("✔ Aucune année incomplète dans le catalogue.")
+    else:
+        st.caption(
+            f"🧩 {holes.height} année(s) incomplète(s) • {holes['days_missing'].sum():,} jours manquants. "
+            "Compléter : `python scripts/collect.py --gaps --start <année> --end <année>`."
+        )
 
-    st.subheader("Vent")
-    st.line_chart(
-        df.select(["date", "vent"])
-          .to_pandas()
-          .set_index("date")
-    )
+def render():
+    st.title("Archives météorologiques – HaïtiMété+")
+
+    st.write("""
+Analysez les données climatiques historiques sur toute Haïti.
+Sélectionnez une ville et choisissez librement votre plage temporelle.
+""")
+
+    st.markdown("---")
+
+    reset_render_timings()
+
+    # Sélection dans un fragment : les sections ne sont relancées que
+    # lorsqu'elle change réellement
+    selection = controls_fragment("archive_selection", _controls)
+    if selection is None:
+        return
+    ville_id, start_str, end_str = selection
 
     st.markdown("---")
 
     # ------------------------------------------------------
-    # Tableau
+    # Chargement (cache partagé, même objet à chaque rendu)
     # ------------------------------------------------------
-    st.subheader("Tableau complet")
-    st.dataframe(df.to_pandas(), use_container_width=True)
+    frame_key = ("archive", ville_id, start_str, end_str)
+    df = load_archive(ville_id, start_str, end_str)
+    if df.is_empty():
+        st.warning("Aucune donnée disponible pour cette période.")
+        return
 
     # ------------------------------------------------------
-    # Statistiques (robustes)
+    # Visualisations : un fragment par graphique
     # ------------------------------------------------------
-    stats = df.select([
-        pl.col("temp_min").mean().alias("min_avg"),
-        pl.col("temp_max").mean().alias("max_avg"),
-        pl.col("humidite").mean().alias("hum_avg"),
-        pl.col("vent").mean().alias("vent_avg"),
-    ]).to_dicts()[0]
+    chart_section("Évolution des températures", frame_key, df, ["temp_min", "temp_max"])
+    chart_section("Précipitations", frame_key, df, ["precipitation"], kind="area")
+    chart_section("Humidité", frame_key, df, ["humidite"])
+    chart_section("Vent", frame_key, df, ["vent"])
 
-    st.subheader("Statistiques rapides")
+    st.markdown("---")
 
-    col1, col2, col3, col4 = st.columns(4)
-    col1.metric("Temp. min (moy.)", _fmt_metric(stats.get("min_avg"), "°C"))
-    col2.metric("Temp. max (moy.)", _fmt_metric(stats.get("max_avg"), "°C"))
-    col3.metric("Humidité (moy.)", _fmt_metric(stats.get("hum_avg"), "%"))
-    col4.metric("Vent (moy.)", _fmt_metric(stats.get("vent_avg"), "km/h"))
+    # ------------------------------------------------------
+    # Tableau + statistiques (fragments)
+    # ------------------------------------------------------
+    _table_section("Tableau complet", ville_id, start_str, end_str)
+    _stats_section("Statistiques rapides", df)
+
+    st.markdown("---")
+    _rolling_section("Cumuls glissants de pluie", ville_id, start_str, end_str)
+
+    st.markdown("---")
+    _coverage_section("Couverture de l'archive")
+
+    st.markdown("---")
+    _export_section("Export CSV / Parquet", ville_id, start_str, end_str)
+
+    render_timings_panel()
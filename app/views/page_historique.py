@@ -8,60 +8,45 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")
 
 import streamlit as st
 import polars as pl
-import sqlite3
 from datetime import date, timedelta
-from modules.storage import read_villes
-
-
-# -------------------------------------------
-# Utilitaire : curseur SQLite → DataFrame Polars
-# -------------------------------------------
-def _pl_from_cursor(cursor):
-    cols = [d[0] for d in cursor.description] if cursor.description else []
-    rows = cursor.fetchall()
-    if not rows:
-        return pl.DataFrame({c: [] for c in cols})
-    dicts = [dict(zip(cols, r)) for r in rows]
-    return pl.DataFrame(dicts)
+from modules.storage import read_archive, count_archive, read_archive_page, ARCHIVE_COLUMNS
+from modules.framecache import ARCHIVE_CACHE, load_villes
+from views.widgets import (
+    paginated_table,
+    chart_section,
+    timed_fragment,
+    controls_fragment,
+    reset_render_timings,
+    render_timings_panel,
+)
 
 
 # -------------------------------------------
 # Chargement historique avec limite 30 jours
+# (cache processus partagé, sans copie)
 # -------------------------------------------
-@st.cache_data(ttl=600)
 def load_history(ville_id: int, start: str, end: str):
-    with sqlite3.connect("data/meteo_haiti.sqlite") as conn:
-        cursor = conn.execute(
-            """
-            SELECT date, temp_min, temp_max, humidite, precipitation, vent
-            FROM meteo_archive
-            WHERE id_ville = ?
-              AND date BETWEEN ? AND ?
-            ORDER BY date
-            """,
-            (ville_id, start, end),
-        )
-        return _pl_from_cursor(cursor)
-
+    return ARCHIVE_CACHE.get_or_load(
+        ("archive", ville_id, start, end),
+        lambda: read_archive(ville_id, start, end),
+    )
 
-def render():
-    st.title("Historique récent – HaïtiMétéo+")
 
-    st.write("""
-Consultez l’évolution de la météo récente pour une ville.
-**Période maximale : 30 jours.**  
-Une analyse simple, rapide et orientée “tendances”.
-""")
+@st.cache_data(ttl=600)
+def count_rows(ville_id: int, start: str, end: str) -> int:
+    # Total affiché par le tableau paginé (calculé une fois par plage)
+    return count_archive(ville_id, start, end)
 
-    st.markdown("---")
 
+def _controls():
+    """Ville + période (max 30 jours). Renvoie (ville_id, début, fin) ou None."""
     # -------------------------------------------
     # Sélection ville
     # -------------------------------------------
-    villes = read_villes()
+    villes = load_villes()
     if villes.is_empty():
         st.error("Aucune ville disponible.")
-        return
+        return None
 
     choices = villes["ville"].to_list()
     ville_choice = st.selectbox("Ville :", choices)
@@ -69,7 +54,7 @@ Une analyse simple, rapide et orientée “tendances”.
     row = villes.filter(pl.col("ville") == ville_choice)
     if row.is_empty():
         st.error("Ville introuvable.")
-        return
+        return None
 
     ville_id = int(row["id"][0])
 
@@ -98,88 +83,96 @@ Une analyse simple, rapide et orientée “tendances”.
 
     if start_date > end_date:
         st.error("❌ La date de début doit être antérieure à la date de fin.")
-        return
+        return None
 
     if (end_date - start_date).days > 30:
         st.error("❌ La période ne peut pas dépasser 30 jours.")
+        return None
+
+    return ville_id, str(start_date), str(end_date)
+
+
+@timed_fragment
+def _table_section(label, ville_id, start, end):
+    # Pagination et tri ne relancent que ce fragment
+    st.subheader(label)
+    paginated_table(
+        key="historique_table",
+        columns=ARCHIVE_COLUMNS,
+        count_rows=lambda: count_rows(ville_id, start, end),
+        fetch_page=lambda sort_by, desc, limit, offset: read_archive_page(
+            ville_id, start, end, sort_by, desc, limit, offset
+        ),
+    )
+
+
+@timed_fragment
+def _stats_section(label, df):
+    stats = df.select([
+        pl.col("temp_min").mean().alias("min_avg"),
+        pl.col("temp_max").mean().alias("max_avg"),
+        pl.col("humidite").mean().alias("hum_avg"),
+        pl.col("vent").mean().alias("vent_avg"),
+    ]).to_dicts()[0]
+
+    st.subheader(label)
+
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("Temp. min (moy.)", f"{stats['min_avg']:.1f} °C")
+    c2.metric("Temp. max (moy.)", f"{stats['max_avg']:.1f} °C")
+    c3.metric("Humidité (moy.)", f"{stats['hum_avg']:.1f} %")
+    c4.metric("Vent (moy.)", f"{stats['vent_avg']:.1f} km/h")
+
+
+def render():
+    st.title("Historique récent – HaïtiMétéo+")
+
+    st.write("""
+Consultez l’évolution de la météo récente pour une ville.
+**Période maximale : 30 jours.**  
+Une analyse simple, rapide et orientée “tendances”.
+""")
+
+    st.markdown("---")
+
+    reset_render_timings()
+
+    # Sélection dans un fragment : les sections ne sont relancées que
+    # lorsqu'elle change réellement
+    selection = controls_fragment("historique_selection", _controls)
+    if selection is None:
         return
+    ville_id, start, end = selection
 
     st.markdown("---")
 
     # -------------------------------------------
-    # Chargement données
+    # Chargement données (cache partagé)
     # -------------------------------------------
-    df = load_history(ville_id, str(start_date), str(end_date))
+    frame_key = ("archive", ville_id, start, end)
+    df = load_history(ville_id, start, end)
 
     if df.is_empty():
         st.warning("Aucune donnée disponible pour cette période.")
         return
 
-    # Convertir colonnes
-    df = df.with_columns([
-        pl.col("date").str.to_date(),
-        pl.col("temp_min").cast(pl.Float64),
-        pl.col("temp_max").cast(pl.Float64),
-        pl.col("humidite").cast(pl.Float64),
-        pl.col("precipitation").cast(pl.Float64),
-        pl.col("vent").cast(pl.Float64),
-    ])
-
     # -------------------------------------------
-    # Graphiques
+    # Graphiques : un fragment par graphique
     # -------------------------------------------
-    st.subheader("🌡️ Températures")
-    st.line_chart(
-        df.select(["date", "temp_min", "temp_max"])
-          .to_pandas()
-          .set_index("date")
-    )
-
-    st.subheader("🌧️ Précipitation")
-    st.area_chart(
-        df.select(["date", "precipitation"])
-          .to_pandas()
-          .set_index("date")
-    )
-
-    st.subheader("💧 Humidité")
-    st.line_chart(
-        df.select(["date", "humidite"])
-          .to_pandas()
-          .set_index("date")
-    )
-
-    st.subheader("💨 Vent")
-    st.line_chart(
-        df.select(["date", "vent"])
-          .to_pandas()
-          .set_index("date")
-    )
+    chart_section("🌡️ Températures", frame_key, df, ["temp_min", "temp_max"])
+    chart_section("🌧️ Précipitation", frame_key, df, ["precipitation"], kind="area")
+    chart_section("💧 Humidité", frame_key, df, ["humidite"])
+    chart_section("💨 Vent", frame_key, df, ["vent"])
 
     st.markdown("---")
 
     # -------------------------------------------
-    # Tableau
+    # Tableau + statistiques récentes (fragments)
     # -------------------------------------------
-    st.subheader("📋 Données complètes")
-    st.dataframe(df.to_pandas(), use_container_width=True)
+    _table_section("📋 Données complètes", ville_id, start, end)
 
     st.markdown("---")
 
-    # -------------------------------------------
-    # Statistiques récentes
-    # -------------------------------------------
-    stats = df.select([
-        pl.col("temp_min").mean().alias("min_avg"),
-        pl.col("temp_max").mean().alias("max_avg"),
-        pl.col("humidite").mean().alias("hum_avg"),
-        pl.col("vent").mean().alias("vent_avg"),
-    ]).to_dicts()[0]
+    _stats_section("📊 Statistiques (période sélectionnée)", df)
 
-    st.subheader("📊 Statistiques (période sélectionnée)")
-
-    c1, c2, c3, c4 = st.columns(4)
-    c1.metric("Temp. min (moy.)", f"{stats['min_avg']:.1f} °C")
-    c2.metric("Temp. max (moy.)", f"{stats['max_avg']:.1f} °C")
-    c3.metric("Humidité (moy.)", f"{stats['hum_avg']:.1f} %")
-    c4.metric("Vent (moy.)", f"{stats['vent_avg']:.1f} km/h")
+    render_timings_panel()
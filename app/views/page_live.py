@@ -10,8 +10,9 @@ import streamlit as st
 import polars as pl
 import pydeck as pdk
 
-from modules.storage import save_weather, read_villes
-from modules.meteo import get_live_weather
+from modules.storage import read_villes
+from modules.livecache import LIVE_READINGS, LIVE_BUDGET_MS, format_age
+from views.widgets import live_refresh_watcher
 
 
 # ----------------------------
@@ -59,26 +60,38 @@ def render():
     villes = read_villes()
     choice = st.selectbox("Ville :", villes["ville"].to_list())
 
-    row = villes.filter(pl.col("ville") == choice).row(0)
-    lat = float(row[2])
-    lon = float(row[3])
+    ville = villes.filter(pl.col("ville") == choice).row(0, named=True)
+    lat = float(ville["latitude"])
+    lon = float(ville["longitude"])
 
     st.markdown("---")
 
     # ----------------------------
-    # Bouton mise à jour
+    # Dernière mesure connue + actualisation en arrière-plan
+    # (attente bornée à LIVE_BUDGET_MS, la page ne bloque plus sur l'API)
     # ----------------------------
-    if not st.button("🔄 Actualiser maintenant"):
-        st.info("Cliquez sur le bouton pour récupérer la météo en direct.")
+    force = st.button("🔄 Actualiser maintenant")
+    readings, late = LIVE_READINGS.gather([ville], budget=LIVE_BUDGET_MS / 1000, force=force)
+    reading = readings[choice]
+    if late:
+        live_refresh_watcher(LIVE_READINGS, [choice])
+
+    if reading is None:
+        if late:
+            st.info("📡 Première mesure en cours de récupération…")
+        else:
+            st.error(f"❌ Aucune mesure disponible : {LIVE_READINGS.error(choice) or 'API injoignable'}")
         return
 
-    with st.spinner("Connexion à Open-Meteo..."):
-        try:
-            data = get_live_weather(lat, lon)
-            current = data.get("current", {})
-        except Exception as e:
-            st.error(f"❌ Erreur API : {e}")
-            return
+    data = reading.data
+    current = reading.current
+    age = format_age(reading.age())
+    if reading.source == "db":
+        st.warning(f"🕒 Dernière mesure enregistrée ({age}) : l’API n’a pas encore répondu.")
+    elif reading.is_stale():
+        st.warning(f"🕒 Mesure {age} : actualisation en attente.")
+    else:
+        st.caption(f"🕒 Mesure Open-Meteo {age}")
 
     # ----------------------------
     # Extraction sécurisée
@@ -87,19 +100,10 @@ def render():
     hum = safe_float(current.get("relative_humidity_2m"))
     rain = safe_float(current.get("precipitation"))
     wind = safe_float(current.get("wind_speed_10m"))
-    code = int(current.get("weather_code", 0))
+    code = int(current.get("weather_code") or 0)
 
     icon, label = WEATHER_DESC.get(code, ("🌡️", "Condition inconnue"))
 
-    # ----------------------------
-    # Enregistrer l’observation
-    # ----------------------------
-    try:
-        save_weather(choice, temp or 0, rain or 0, wind or 0)
-        st.success("Observations enregistrées dans l’historique ✔")
-    except Exception as e:
-        st.warning(f"⚠️ Erreur lors de l’enregistrement : {e}")
-
     st.markdown("---")
 
     # ----------------------------
@@ -159,7 +163,9 @@ def render():
 
     alerts = data.get("alerts", {})
 
-    if alerts and alerts.get("alert"):
+    if reading.source == "db":
+        st.info("Alertes indisponibles tant que l’API n’a pas répondu.")
+    elif alerts and alerts.get("alert"):
         for a in alerts["alert"]:
             with st.expander(f"⚠️ {a.get('event', 'Alerte')}"):
                 st.write(f"**Début :** {a.get('onset', '—')}")
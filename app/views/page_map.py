@@ -6,18 +6,15 @@ import sys
 import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
 
-import logging
-import concurrent.futures
-import numpy as np
-import pandas as pd
+import time
+
 import polars as pl
 import streamlit as st
 import pydeck as pdk
 
 from modules.storage import read_villes
-from modules.meteo import get_live_weather
-
-logging.basicConfig(level=logging.INFO)
+from modules.livecache import LIVE_READINGS, LIVE_BUDGET_MS
+from views.widgets import live_refresh_watcher
 
 
 WEATHER_ICONS = {
@@ -54,91 +51,48 @@ def render():
         st.error("Aucune ville n’a été trouvée.")
         return
 
-    st.info("📡 Récupération de la météo en temps réel…")
-
-    # Collecter les villes en liste pour itération parallèle
+    # Rendu immédiat depuis les dernières mesures connues ; l'actualisation
+    # part en arrière-plan et n'est attendue que LIVE_BUDGET_MS au plus.
+    # Les villes en retard restent affichées avec leur mesure précédente.
     villes_list = list(villes.iter_rows(named=True))
-
-    rows = []
-
-    def fetch_for_ville(v):
-        try:
-            data = get_live_weather(v["latitude"], v["longitude"])
-            cur = data.get("current", {}) or {}
-            return {
-                "ville": v["ville"],
-                "lat": float(v["latitude"]),
-                "lon": float(v["longitude"]),
-                "temp": _safe_float(cur.get("temperature_2m")),
-                "hum": _safe_float(cur.get("relative_humidity_2m")),
-                "precip": _safe_float(cur.get("precipitation")),
-                "vent": _safe_float(cur.get("wind_speed_10m")),
-                "wcode": int(cur.get("weather_code", 0) or 0),
-                "icon": str(WEATHER_ICONS.get(cur.get("weather_code", 0), "🌡️")),
-            }
-        except Exception as e:
-            logging.exception("Erreur récupération météo pour %s", v.get("ville"))
-            # Ne pas masquer l'erreur : on retourne un état identifiable
-            return {
-                "ville": v["ville"],
-                "lat": float(v["latitude"]),
-                "lon": float(v["longitude"]),
-                "temp": None,
-                "hum": None,
-                "precip": 0.0,
-                "vent": 0.0,
-                "wcode": 0,
-                "icon": "⚠️",
-                "error": str(e)
-            }
-
-    # Taille du pool adaptative (limite raisonnable)
-    max_workers = min(20, max(2, len(villes_list)))
-    with st.spinner("Récupération parallèle des données météo..."):
-        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-            futures = {executor.submit(fetch_for_ville, v): v for v in villes_list}
-            for fut in concurrent.futures.as_completed(futures):
-                res = fut.result()
-                if res.get("error"):
-                    st.warning(f"Erreur pour {res['ville']}: {res['error']}")
-                rows.append(res)
-
-    # Utiliser pandas directement (on convertit ensuite en polars si besoin)
-    df_pd = pd.DataFrame(rows)
-
-    # Nettoyage ciblé
-    df_pd["icon"] = df_pd["icon"].fillna("⚠️").astype(str)
-
-    df_pd["precip"] = pd.to_numeric(df_pd["precip"], errors="coerce").fillna(0.0)
-    df_pd["vent"] = pd.to_numeric(df_pd["vent"], errors="coerce").fillna(0.0)
-
-    # temp/hum : garder NaN si absent (ne pas remplacer par 0)
-    df_pd["temp"] = pd.to_numeric(df_pd["temp"], errors="coerce")
-    df_pd["hum"] = pd.to_numeric(df_pd["hum"], errors="coerce")
-
-    # wcode : int sûr (remplacer NaN par 0)
-    df_pd["wcode"] = pd.to_numeric(df_pd.get("wcode", 0), errors="coerce").fillna(0).astype(int)
-
-    df_pd["lat"] = df_pd["lat"].astype(float)
-    df_pd["lon"] = df_pd["lon"].astype(float)
-
-    # Génération vectorisée des couleurs (numpy) : évite map_elements Polars
-    temps = df_pd["temp"]
-    t_clamped = temps.clip(lower=-5, upper=40)
-    r = np.rint(((t_clamped + 5) / 45.0) * 255).astype("int32")
-    r = np.where(temps.isna(), 150, r)
-    g = np.full(len(df_pd), 90, dtype="int32")
-    g = np.where(temps.isna(), 150, g)
-    b = 255 - r
-    b = np.where(temps.isna(), 150, b)
-    a = np.full(len(df_pd), 220, dtype="int32")
-    a = np.where(temps.isna(), 180, a)
-    df_pd["color"] = np.stack([r, g, b, a], axis=1).tolist()
+    readings, late = LIVE_READINGS.gather(villes_list, budget=LIVE_BUDGET_MS / 1000)
+
+    now = time.time()
+    currents, ages, stale = [], [], []
+    for v in villes_list:
+        r = readings[v["ville"]]
+        if r is None:
+            err = LIVE_READINGS.error(v["ville"])
+            currents.append({"error": err or "aucune mesure"})
+            ages.append(None)
+            stale.append(True)
+            if err:
+                st.warning(f"Erreur pour {v['ville']}: {err}")
+        else:
+            currents.append(r.current)
+            ages.append(r.age(now))
+            stale.append(r.is_stale(now))
+
+    df_map = build_map_frame(villes, currents, ages, stale)
+
+    n_stale = sum(stale)
+    if n_stale:
+        st.caption(f"🕒 {n_stale} ville(s) affichée(s) avec une mesure ancienne (estompées sur la carte).")
+    if late:
+        live_refresh_watcher(LIVE_READINGS, [v["ville"] for v in villes_list])
+
+    # pydeck sérialise les données de chaque couche séparément : seule la
+    # couche cliquable (infobulle) reçoit les enregistrements complets, les
+    # autres n'ont que la position et le champ qu'elles dessinent
+    points = df_map.select(MAP_PAYLOAD_COLS).to_dicts()
+
+    def positions(*cols):
+        return df_map.select("lon", "lat", *cols).to_dicts()
 
     # Layers PyDeck
     layer_temp = pdk.Layer(
         "ScatterplotLayer",
-        data=df_pd,
+        data=points,
         get_position="[lon, lat]",
         get_color="color",
         get_radius=42000,
@@ -147,7 +101,7 @@ def render():
 
     layer_heat = pdk.Layer(
         "HeatmapLayer",
-        data=df_pd,
+        data=positions("precip"),
         get_position="[lon, lat]",
         get_weight="precip",
         radiusPixels=60,
@@ -156,17 +110,17 @@ def render():
 
     text_layer = pdk.Layer(
         "TextLayer",
-        data=df_pd,
+        data=positions("icon"),
         get_position="[lon, lat]",
         get_text="icon",
         get_size=28,
         get_color=[255, 255, 255],
-        pickable=True
+        pickable=False  # l'infobulle vient du cercle de température dessous
     )
 
     wind_layer = pdk.Layer(
         "ArrowLayer",
-        data=df_pd,
+        data=positions("vent"),
         get_position="[lon, lat]",
         get_direction="[1, 0, 0]",
         get_length="vent / 3",
@@ -175,8 +129,8 @@ def render():
     )
 
     view_state = pdk.ViewState(
-        latitude=float(df_pd["lat"].mean()),
-        longitude=float(df_pd["lon"].mean()),
+        latitude=float(df_map["lat"].mean()),
+        longitude=float(df_map["lon"].mean()),
         zoom=7
     )
 
@@ -191,7 +145,8 @@ def render():
                         "💧 Humidité : {hum}%<br>"
                         "🌧 Pluie : {precip} mm<br>"
                         "💨 Vent : {vent} km/h<br>"
-                        "Code météo : {wcode}",
+                        "Code météo : {wcode}<br>"
+                        "🕒 Mesure : {age}",
                 "style": {"color": "white"}
             }
         )
@@ -200,15 +155,104 @@ def render():
     st.markdown("---")
     st.subheader("Tableau récapitulatif (Live)")
     st.dataframe(
-        df_pd[["ville", "temp", "hum", "precip", "vent", "wcode"]],
+        df_map.select(["ville", "temp", "hum", "precip", "vent", "wcode", "age"]),
         use_container_width=True
     )
 
 
-def _safe_float(x):
-    try:
-        if x is None:
-            return None
-        return float(x)
-    except Exception:
-        return None
+# ---------------------------------------------------------
+# CONSTRUCTION DU JEU DE DONNÉES CARTE (Polars, une passe)
+# ---------------------------------------------------------
+MAP_SCHEMA = {
+    "ville": pl.String,
+    "lat": pl.Float64,
+    "lon": pl.Float64,
+    "temp": pl.Float64,
+    "hum": pl.Float64,
+    "precip": pl.Float64,
+    "vent": pl.Float64,
+    "wcode": pl.Int32,
+    "error": pl.String,
+    "age_s": pl.Float64,
+    "stale": pl.Boolean,
+}
+
+# Colonnes de la couche cliquable : position, couleur et infobulle
+MAP_PAYLOAD_COLS = ["ville", "lat", "lon", "temp", "hum", "precip", "vent", "wcode", "age", "color"]
+
+
+def _age_label(seconds: pl.Expr) -> pl.Expr:
+    """Équivalent vectorisé de livecache.format_age ; « — » si l'âge est inconnu."""
+    def ago(value: pl.Expr, unit: str) -> pl.Expr:
+        return pl.format("il y a {} " + unit, value.round(0).cast(pl.Int64))
+
+    return (
+        pl.when(seconds.is_null()).then(pl.lit("—"))
+        .when(seconds < 90).then(pl.lit("à l’instant"))
+        .when(seconds < 3600).then(ago(seconds / 60, "min"))
+        .when(seconds < 48 * 3600).then(ago(seconds / 3600, "h"))
+        .otherwise(ago(seconds / 86400, "j"))
+    )
+
+
+def build_map_frame(villes: pl.DataFrame, currents: list[dict],
+                    ages: list[float | None] | None = None,
+                    stale: list[bool] | None = None) -> pl.DataFrame:
+    """
+    Construit le DataFrame de la carte directement en colonnes typées.
+      - villes   : sortie de read_villes() (id, ville, latitude, longitude)
+      - currents : bloc "current" de l'API par ville, dans le même ordre
+                   ({"error": ...} si l'appel a échoué)
+      - ages     : âge de chaque mesure en secondes (None si inconnu)
+      - stale    : mesure ancienne (non actualisée dans le budget) → estompée
+    Couleurs et icônes sont calculées par expressions Polars vectorisées.
+    """
+    n = len(currents)
+    cols = {k: [] for k in ("temp", "hum", "precip", "vent", "wcode", "error")}
+    for cur in currents:
+        cols["temp"].append(cur.get("temperature_2m"))
+        cols["hum"].append(cur.get("relative_humidity_2m"))
+        cols["precip"].append(cur.get("precipitation"))
+        cols["vent"].append(cur.get("wind_speed_10m"))
+        cols["wcode"].append(cur.get("weather_code"))
+        cols["error"].append(cur.get("error"))
+
+    # strict=False : toute valeur non numérique devient null (équivalent _safe_float)
+    df = pl.DataFrame(
+        {
+            "ville": villes["ville"],
+            "lat": villes["latitude"],
+            "lon": villes["longitude"],
+            **cols,
+            "age_s": ages if ages is not None else [None] * n,
+            "stale": stale if stale is not None else [False] * n,
+        },
+        schema=MAP_SCHEMA,
+        strict=False,
+    )
+
+    temp = pl.col("temp")
+    missing = temp.is_null()
+    red = (((temp.clip(-5, 40) + 5) / 45.0) * 255).round().cast(pl.Int32)
+
+    return df.with_columns(
+        # precip/vent : 0 si absent ; temp/hum : restent null
+        pl.col("precip").fill_null(0.0),
+        pl.col("vent").fill_null(0.0),
+        pl.col("wcode").fill_null(0),
+        pl.when(pl.col("error").is_not_null())
+          .then(pl.lit("⚠️"))
+          .otherwise(
+              pl.col("wcode").fill_null(0).replace_strict(
+                  WEATHER_ICONS, default="🌡️", return_dtype=pl.String
+              )
+          )
+          .alias("icon"),
+        pl.concat_list([
+            pl.when(missing).then(150).otherwise(red),
+            pl.when(missing).then(150).otherwise(90),
+            pl.when(missing).then(150).otherwise(255 - red),
+            pl.when(missing).then(180).when(pl.col("stale")).then(110).otherwise(220),
+        ]).cast(pl.List(pl.Int32)).alias("color"),
+        _age_label(pl.col("age_s")).alias("age"),
+    )
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+# ../app/views/page_metrics.py
+# HaïtiMétéo+ — Page Métriques (admin) : où passent les secondes
+
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from datetime import datetime
+
+import polars as pl
+import streamlit as st
+
+from modules import metrics
+from modules.framecache import ARCHIVE_CACHE
+from modules.livebuffer import LIVE_BUFFER
+from modules.rolling import ROLLING_CACHE
+from modules.singleflight import flight_stats
+from modules import quota
+
+
+# Familles de mesures affichées, dans l'ordre
+SECTIONS = [
+    ("🌐 Appels Open-Meteo", "http_request"),
+    ("🗄️ Requêtes SQL", "sql_query"),
+    ("🖥️ Rendu des pages", "render"),
+    ("🧩 Sections de page", "render_phase"),
+]
+
+
+def render():
+    st.title("Métriques – HaïtiMétéo+")
+    st.write("Latences agrégées depuis le démarrage du processus (toutes sessions confondues).")
+
+    col1, col2 = st.columns([1, 1])
+    if col1.button("🔄 Rafraîchir"):
+        st.rerun()
+    if col2.button("🧹 Remettre à zéro"):
+        metrics.reset()
+        st.rerun()
+
+    st.markdown("---")
+
+    # Pas encore de latences : les sections suivantes (quota, tampon,
+    # single-flight…) ont leurs propres données et restent affichées
+    rows = metrics.snapshot()
+    if not rows:
+        st.info("Aucune mesure pour l’instant : naviguez dans l’application puis revenez ici.")
+
+    # ------------------------------------------------------
+    # Histogrammes par famille
+    # ------------------------------------------------------
+    df = pl.DataFrame(rows)
+    for title, name in SECTIONS:
+        if df.is_empty():
+            break
+        part = df.filter(pl.col("metric") == name).drop("metric")
+        if part.is_empty():
+            continue
+        st.subheader(title)
+        st.dataframe(part.sort("p95_ms", descending=True), use_container_width=True, hide_index=True)
+
+    # ------------------------------------------------------
+    # Compteurs (octets, lignes, reprises…)
+    # ------------------------------------------------------
+    counters = metrics.counters()
+    if counters:
+        st.subheader("🔢 Compteurs")
+        st.dataframe(pl.DataFrame(counters), use_container_width=True, hide_index=True)
+
+    # ------------------------------------------------------
+    # Cache de frames
+    # ------------------------------------------------------
+    st.subheader("🧊 Cache de frames")
+    cache = ARCHIVE_CACHE.stats()
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("Entrées", cache["entries"])
+    c2.metric("Mémoire", f"{cache['bytes'] / 1e6:.1f} / {cache['max_bytes'] / 1e6:.0f} Mo")
+    c3.metric("Hits / misses", f"{cache['hits']} / {cache['misses']}")
+    c4.metric("Évictions", cache["evictions"])
+
+    rolling = ROLLING_CACHE.stats()
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("Cumuls glissants (entrées)", rolling["entries"])
+    c2.metric("Mémoire", f"{rolling['bytes'] / 1e6:.1f} Mo")
+    c3.metric("Hits / prolongations", f"{rolling['hits']} / {rolling['extends']}")
+    c4.metric("Recalculs complets", rolling["rebuilds"])
+
+    # ------------------------------------------------------
+    # Budget Open-Meteo (tous processus)
+    # ------------------------------------------------------
+    st.subheader("📶 Budget Open-Meteo")
+    budget = pl.DataFrame([
+        {"priorité": p, "fenêtre": w, **b}
+        for p in quota.RESERVE
+        for w, b in quota.remaining(p).items()
+    ])
+    if budget.is_empty():
+        st.info("Quota désactivé (METEO_QUOTA_PER_* = 0).")
+    else:
+        st.dataframe(
+            budget.pivot("priorité", index="fenêtre", values="available").join(
+                budget.filter(pl.col("priorité") == "live").select("fenêtre", "limit", "used", "resets_in"),
+                on="fenêtre",
+            ),
+            use_container_width=True,
+            hide_index=True,
+        )
+        st.caption("Appels encore disponibles par classe : le backfill laisse 25 % de chaque fenêtre, le poll 10 %.")
+
+    # ------------------------------------------------------
+    # Requêtes regroupées (single-flight)
+    # ------------------------------------------------------
+    st.subheader("🔀 Requêtes simultanées regroupées")
+    st.caption("« shared » = appels Open-Meteo / SQL évités : l’appelant a reçu le résultat d’un appel identique déjà en vol.")
+    st.dataframe(pl.DataFrame(flight_stats()), use_container_width=True, hide_index=True)
+    waiters = [r for r in metrics.distributions() if r["metric"] == "singleflight_waiters"]
+    if waiters:
+        st.caption("Appelants regroupés par vol terminé (0 = appel non partagé) :")
+        st.dataframe(pl.DataFrame(waiters).drop("metric"), use_container_width=True, hide_index=True)
+
+    # ------------------------------------------------------
+    # Tampon live (meteo_live)
+    # ------------------------------------------------------
+    st.subheader("📥 Tampon des observations live")
+    live = LIVE_BUFFER.stats
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("En attente", LIVE_BUFFER.pending())
+    c2.metric("Reçues / doublons", f"{live['received']} / {live['deduped']}")
+    c3.metric("Écrites", f"{live['flushed']} en {live['flushes']} lots")
+    c4.metric("Erreurs d'écriture", live["errors"])
+    if st.button("💾 Vider le tampon maintenant"):
+        LIVE_BUFFER.flush()
+        st.rerun()
+
+    st.markdown("---")
+
+    # ------------------------------------------------------
+    # Dernières mesures
+    # ------------------------------------------------------
+    with st.expander("🕒 Dernières mesures"):
+        recent = [
+            {**r, "time": datetime.fromtimestamp(r["time"]).strftime("%H:%M:%S")}
+            for r in metrics.recent(200)
+        ]
+        if recent:
+            st.dataframe(pl.DataFrame(recent, infer_schema_length=None), use_container_width=True, hide_index=True)
+        else:
+            st.caption("Aucune mesure récente.")
+
+    # ------------------------------------------------------
+    # Export Prometheus
+    # ------------------------------------------------------
+    with st.expander("📤 Export Prometheus"):
+        text = metrics.prometheus_text()
+        st.download_button("Télécharger metrics.txt", text, file_name="metrics.txt", mime="text/plain")
+        st.code(text, language="text")
+        st.caption("Pour un scrape direct : lancer l’application avec METEO_METRICS_PORT=9108 → /metrics.")
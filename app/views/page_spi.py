@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+# ../app/views/page_spi.py
+# HaïtiMétéo+ — Page Sécheresse : indice de précipitations normalisé (SPI)
+
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+import streamlit as st
+import polars as pl
+import altair as alt
+from modules.spi import SPI_SCALES, spi_table
+from modules.framecache import load_villes
+from views.widgets import (
+    timed_fragment,
+    render_timer,
+    reset_render_timings,
+    render_timings_panel,
+)
+
+
+SCALE_LABELS = {1: "1 mois", 3: "3 mois (saisonnier)", 6: "6 mois", 12: "12 mois (hydrologique)"}
+
+
+@timed_fragment
+def _latest_section(label, scale):
+    """Dernier SPI de chaque ville pour l'échelle choisie."""
+    st.subheader(label)
+    df = spi_table(scale)
+    if df.is_empty():
+        st.info("Aucun SPI enregistré. Ajuster les lois : `python scripts/spi.py --fit`.")
+        return
+
+    latest = df.group_by("ville").agg(pl.all().sort_by("periode").last()).sort("spi")
+    st.dataframe(
+        latest.select("ville", "periode", "cumul", "spi", "classe"),
+        use_container_width=True,
+        hide_index=True,
+    )
+
+    dry = latest.filter(pl.col("spi") <= -1.0)
+    if not dry.is_empty():
+        st.warning(f"🏜️ Sécheresse en cours : {', '.join(dry['ville'].to_list())}")
+
+
+@timed_fragment
+def _history_section(label, scale):
+    """SPI mois par mois d'une ville (barres : rouge = sec, bleu = humide)."""
+    st.subheader(label)
+    villes = load_villes()
+    if villes.is_empty():
+        st.error("Aucune ville disponible.")
+        return
+
+    ville_choice = st.selectbox("Ville :", villes["ville"].to_list(), key="spi_ville")
+    ville_id = int(villes.filter(pl.col("ville") == ville_choice)["id"][0])
+
+    df = spi_table(scale, ville_id).drop_nulls("spi")
+    if df.is_empty():
+        st.info("Aucune valeur SPI pour cette ville.")
+        return
+
+    chart = (
+        alt.Chart(df.select(pl.col("periode").str.to_date("%Y-%m"), "spi", "cumul", "classe").to_pandas())
+        .mark_bar()
+        .encode(
+            x=alt.X("periode:T", title=None),
+            y=alt.Y("spi:Q", title="SPI", scale=alt.Scale(domain=[-3.1, 3.1])),
+            color=alt.condition(alt.datum.spi < 0, alt.value("#d7301f"), alt.value("#2b8cbe")),
+            tooltip=[alt.Tooltip("periode:T", format="%Y-%m"), "spi", "cumul", "classe"],
+        )
+    )
+    st.altair_chart(chart, use_container_width=True)
+
+    months = df.height
+    dry = df.filter(pl.col("spi") <= -1.0).height
+    st.caption(f"{dry} mois secs (SPI ≤ −1) sur {months} • −1 / −1,5 / −2 : sécheresse modérée / sévère / extrême.")
+
+
+def render():
+    st.title("Sécheresse – Indice de précipitations normalisé (SPI)")
+
+    st.write("""
+Le SPI compare la pluie cumulée sur 1 à 12 mois à la normale de la ville et du mois :
+0 = normal, négatif = plus sec, positif = plus humide (en écarts-types).
+""")
+
+    st.markdown("---")
+
+    reset_render_timings()
+
+    with render_timer("Contrôles"):
+        scale = st.radio(
+            "Échelle de cumul",
+            list(SPI_SCALES),
+            index=list(SPI_SCALES).index(3),
+            format_func=lambda k: SCALE_LABELS.get(k, f"{k} mois"),
+            horizontal=True,
+        )
+
+    _latest_section("Situation actuelle", scale)
+
+    st.markdown("---")
+    _history_section("Historique par ville", scale)
+
+    render_timings_panel()
@@ -12,6 +12,7 @@ import pydeck as pdk
 
 from modules.utils import load_yaml
 from modules.storage import sync_villes_from_yaml, read_villes
+from modules.framecache import invalidate_villes
 
 CONFIG_PATH = "data/config.yaml"
 
@@ -128,6 +129,7 @@ def render():
             yaml.safe_dump({"villes": villes_config}, f, allow_unicode=True)
 
         sync_villes_from_yaml()
+        invalidate_villes()
         st.success("Ville ajoutée avec succès 🎉")
         st.experimental_rerun()
 
@@ -175,6 +177,7 @@ def render():
                 yaml.safe_dump({"villes": villes_config}, f, allow_unicode=True)
 
             sync_villes_from_yaml()
+            invalidate_villes()
             st.success("Ville mise à jour ✔")
             st.experimental_rerun()
 
@@ -199,5 +202,6 @@ def render():
                 yaml.safe_dump({"villes": villes_config}, f, allow_unicode=True)
 
             sync_villes_from_yaml()
+            invalidate_villes()
             st.success("Ville supprimée 🗑️")
             st.experimental_rerun()
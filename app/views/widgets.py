@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+# ../app/views/widgets.py
+# HaïtiMétéo+ — Composants Streamlit partagés entre les pages
+
+import functools
+import math
+import time
+from contextlib import contextmanager
+
+import streamlit as st
+
+from modules import metrics
+from modules.chartdata import chart_frame, resample
+from modules.framecache import ARCHIVE_CACHE
+
+
+# ------------------------------------------------------
+# Tableau paginé côté serveur
+# ------------------------------------------------------
+def paginated_table(key: str, columns: list[str], count_rows, fetch_page,
+                    default_sort: str = "date", page_sizes=(25, 50, 100, 250)):
+    """
+    Affiche un tableau paginé et triable dont seule la page visible est
+    chargée puis envoyée au navigateur.
+      - count_rows()                                  → nombre total de lignes
+      - fetch_page(sort_by, descending, limit, offset) → DataFrame de la page
+    `key` préfixe les clés des widgets (plusieurs tableaux par page possibles).
+    """
+    total = count_rows()
+    if total == 0:
+        st.info("Aucune ligne à afficher.")
+        return
+
+    c1, c2, c3, c4 = st.columns([2, 1, 1, 1])
+    sort_by = c1.selectbox(
+        "Trier par",
+        columns,
+        index=columns.index(default_sort),
+        key=f"{key}_sort",
+    )
+    descending = c2.toggle("Décroissant", key=f"{key}_desc")
+    page_size = c3.selectbox("Lignes / page", page_sizes, key=f"{key}_size")
+
+    n_pages = max(1, math.ceil(total / page_size))
+
+    # La plage a pu rétrécir depuis le dernier rendu : ramener la page en borne
+    page_key = f"{key}_page"
+    if st.session_state.get(page_key, 1) > n_pages:
+        st.session_state[page_key] = n_pages
+
+    page = c4.number_input("Page", min_value=1, max_value=n_pages, step=1, key=page_key)
+
+    offset = (int(page) - 1) * page_size
+    page_df = fetch_page(sort_by, descending, page_size, offset)
+
+    st.dataframe(page_df, use_container_width=True, hide_index=True)
+    st.caption(
+        f"Lignes {offset + 1:,}–{offset + page_df.height:,} sur {total:,} "
+        f"• page {int(page)} / {n_pages}"
+    )
+
+
+# ------------------------------------------------------
+# Chronométrage du rendu (fragments et blocs)
+# ------------------------------------------------------
+@contextmanager
+def render_timer(label: str):
+    """
+    Mesure le temps de rendu d'un bloc, l'affiche sous le bloc et le
+    conserve dans st.session_state["render_timings"] (dernier rendu).
+    La mesure alimente aussi l'histogramme `render_phase` (page Métriques).
+    """
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        ms = (time.perf_counter() - t0) * 1000
+        st.session_state.setdefault("render_timings", {})[label] = ms
+        metrics.observe("render_phase", ms, view=st.session_state.get("current_view", ""), phase=label)
+        st.caption(f"⏱ {label} : {ms:.0f} ms")
+
+
+def timed_fragment(fn):
+    """
+    Transforme fn(label, *args) en fragment Streamlit chronométré :
+    un widget interne ne relance que ce fragment, pas toute la page.
+    `label` sert de titre et d'entrée dans la mesure de temps.
+    """
+    @st.fragment
+    @functools.wraps(fn)
+    def wrapper(label, *args, **kwargs):
+        with render_timer(label):
+            fn(label, *args, **kwargs)
+
+    return wrapper
+
+
+def controls_fragment(key: str, controls, label: str = "Contrôles"):
+    """
+    Exécute controls() (widgets de sélection) dans un fragment et range son
+    résultat dans st.session_state[key], que la page lit pour ses sections.
+    Un widget qui ne change pas la sélection (même valeur, plage invalide
+    déjà signalée…) ne relance que ce fragment ; seule une nouvelle
+    sélection relance la page, donc les sections.
+    """
+    full_run = f"{key}__full_run"
+
+    @st.fragment
+    def fragment():
+        with render_timer(label):
+            selection = controls()
+        changed = st.session_state.get(key) != selection
+        st.session_state[key] = selection
+        # Lors d'un rendu complet, la page lit directement la nouvelle valeur
+        if not st.session_state.pop(full_run, False) and changed:
+            st.rerun(scope="app")
+
+    st.session_state[full_run] = True
+    fragment()
+    return st.session_state.get(key)
+
+
+def reset_render_timings():
+    """À appeler en début de page : repart d'un relevé vide."""
+    st.session_state["render_timings"] = {}
+
+
+def render_timings_panel():
+    """Récapitulatif des derniers temps de rendu mesurés sur la page."""
+    timings = st.session_state.get("render_timings", {})
+    if not timings:
+        return
+    with st.expander("⏱ Temps de rendu par section"):
+        for label, ms in sorted(timings.items(), key=lambda kv: -kv[1]):
+            st.write(f"**{label}** : {ms:.1f} ms")
+
+
+# ------------------------------------------------------
+# Graphique d'archive (fragment indépendant)
+# ------------------------------------------------------
+RESAMPLE_OPTIONS = {"Jour": None, "Semaine": "1w", "Mois": "1mo"}
+
+
+@timed_fragment
+def chart_section(label: str, frame_key: tuple, df, cols: list[str], kind: str = "line"):
+    """
+    Un graphique et son pas de temps. Changer le pas ne relance que ce
+    graphique ; le frame agrégé est mis en cache à côté du frame source.
+      - frame_key : clé du frame dans ARCHIVE_CACHE (ex: ("archive", id, début, fin))
+      - kind      : "line" ou "area"
+    """
+    st.subheader(label)
+    step = st.radio(
+        "Pas de temps",
+        list(RESAMPLE_OPTIONS),
+        horizontal=True,
+        key=f"step_{label}",
+        label_visibility="collapsed",
+    )
+
+    every = RESAMPLE_OPTIONS[step]
+    data = df if every is None else ARCHIVE_CACHE.get_or_load(
+        (*frame_key, every),
+        lambda: resample(df, every),
+    )
+
+    chart_df = chart_frame(data)[cols]
+    if kind == "area":
+        st.area_chart(chart_df)
+    else:
+        st.line_chart(chart_df)
+
+
+# ------------------------------------------------------
+# Actualisation live en arrière-plan
+# ------------------------------------------------------
+@st.fragment(run_every=2)
+def live_refresh_watcher(readings, villes: list[str]):
+    """
+    Surveille les villes encore en cours d'actualisation après le rendu
+    (budget de latence dépassé) et relance la page dès qu'elles ont abouti
+    (succès ou échec). À n'appeler que s'il reste des villes en cours.
+    """
+    late = readings.pending(villes)
+    if late:
+        st.caption(f"⏳ Actualisation en cours pour {late} ville(s)…")
+    else:
+        st.rerun()
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+# ../benchmarks/generate.py
+# Génère une base meteo_haiti.sqlite synthétique de taille configurable
+
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import argparse
+import sqlite3
+import time
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+import polars as pl
+
+import modules.storage as storage
+
+
+# ---------------------------------------------------------
+# ÉCHELLES PRÉDÉFINIES (villes × années)
+# ---------------------------------------------------------
+SCALES = {
+    "xs": (4, 10),
+    "s": (20, 20),
+    "m": (100, 30),
+    "l": (500, 40),
+    "xl": (2000, 40),
+}
+
+# Haïti (boîte englobante approximative)
+LAT_RANGE = (18.0, 20.0)
+LON_RANGE = (-74.5, -71.6)
+
+END_YEAR = 2024
+
+
+# ---------------------------------------------------------
+# DONNÉES SYNTHÉTIQUES
+# ---------------------------------------------------------
+def synthetic_villes(n_villes: int, seed: int = 42) -> pl.DataFrame:
+    rng = np.random.default_rng(seed)
+    return pl.DataFrame({
+        "id": np.arange(1, n_villes + 1),
+        "nom": [f"Ville-{i:04d}" for i in range(1, n_villes + 1)],
+        "latitude": rng.uniform(*LAT_RANGE, n_villes).round(4),
+        "longitude": rng.uniform(*LON_RANGE, n_villes).round(4),
+    })
+
+
+def synthetic_archive(id_ville: int, start_year: int, end_year: int, seed: int = 42) -> pl.DataFrame:
+    """
+    Série journalière plausible pour une ville : cycle saisonnier + bruit.
+    Même schéma que get_meteo_data() (date ISO en texte).
+    """
+    rng = np.random.default_rng(seed + id_ville)
+
+    dates = pl.date_range(date(start_year, 1, 1), date(end_year, 12, 31), "1d", eager=True)
+    n = len(dates)
+    doy = dates.dt.ordinal_day().to_numpy()
+    season = np.sin(2 * np.pi * (doy - 100) / 365.25)
+
+    temp_min = 22.0 + 2.5 * season + rng.normal(0, 1.0, n)
+    temp_max = temp_min + 7.0 + rng.normal(0, 1.2, n)
+    rain_day = rng.random(n) < (0.25 + 0.15 * season)
+    precipitation = np.where(rain_day, rng.gamma(0.8, 8.0, n), 0.0)
+
+    return pl.DataFrame({
+        "id_ville": np.full(n, id_ville),
+        "date": dates.dt.to_string("%Y-%m-%d"),
+        "temp_min": temp_min.round(1),
+        "temp_max": temp_max.round(1),
+        "humidite": np.clip(75 + 10 * season + rng.normal(0, 6, n), 20, 100).round(0),
+        "precipitation": precipitation.round(1),
+        "vent": np.abs(12 + rng.normal(0, 5, n)).round(1),
+    })
+
+
+# ---------------------------------------------------------
+# GÉNÉRATION DE LA BASE
+# ---------------------------------------------------------
+def generate_db(path: str | Path, n_villes: int, n_years: int, seed: int = 42, batch_villes: int = 50):
+    """
+    Crée `path` avec le schéma de modules.storage (init_db) puis le remplit.
+    Écriture par lots de `batch_villes` villes : mémoire bornée même en xl.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if path.exists():
+        path.unlink()
+
+    previous = storage.DB_PATH
+    storage.DB_PATH = path
+    try:
+        storage.init_db()
+    finally:
+        storage.DB_PATH = previous
+
+    start_year = END_YEAR - n_years + 1
+    villes = synthetic_villes(n_villes, seed)
+
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode = OFF")
+    conn.execute("PRAGMA synchronous = OFF")
+
+    conn.executemany(
+        "INSERT INTO villes (id, nom, latitude, longitude) VALUES (?, ?, ?, ?)",
+        villes.iter_rows(),
+    )
+
+    t0 = time.perf_counter()
+    for first in range(0, n_villes, batch_villes):
+        ids = villes["id"][first:first + batch_villes].to_list()
+        batch = pl.concat([synthetic_archive(i, start_year, END_YEAR, seed) for i in ids])
+        conn.executemany(
+            "INSERT INTO meteo_archive "
+            "(id_ville, date, temp_min, temp_max, humidite, precipitation, vent) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            batch.iter_rows(),
+        )
+        conn.commit()
+        print(f"  {min(first + batch_villes, n_villes)}/{n_villes} villes "
+              f"({time.perf_counter() - t0:.1f} s)")
+
+    conn.execute("ANALYZE")
+    conn.commit()
+    conn.close()
+    return path
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(
+        description="Génère une base d'archives synthétique pour les benchmarks.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument("--scale", choices=sorted(SCALES), help="Échelle prédéfinie (villes × années)")
+    parser.add_argument("--villes", type=int, default=4, help="Nombre de villes (sans --scale)")
+    parser.add_argument("--annees", type=int, default=10, help="Nombre d'années (sans --scale)")
+    parser.add_argument("--seed", type=int, default=42, help="Graine aléatoire")
+    parser.add_argument("--out", default="benchmarks/.data/meteo_haiti.sqlite", help="Fichier SQLite produit")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    n_villes, n_years = SCALES[args.scale] if args.scale else (args.villes, args.annees)
+
+    print(f"🧪 Génération : {n_villes} villes × {n_years} années → {args.out}")
+    generate_db(args.out, n_villes, n_years, seed=args.seed)
+    print("✔ Base synthétique prête.")
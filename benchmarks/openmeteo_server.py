@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+# ../benchmarks/openmeteo_server.py
+# Serveur local imitant Open-Meteo (/v1/forecast, /v1/archive) pour les tests de charge
+#
+# Usage :
+#   python benchmarks/openmeteo_server.py --port 8765 --latency 0.05 --error-rate 0.02
+#   METEO_LIVE_URL=http://127.0.0.1:8765/v1/forecast \
+#   METEO_ARCHIVE_URL=http://127.0.0.1:8765/v1/archive \
+#   python scripts/collect.py --start 2015 --end 2016
+
+import argparse
+import json
+import math
+import random
+import threading
+import time
+import zlib
+from collections import deque
+from datetime import date, datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+# ---------------------------------------------------------
+# DONNÉES SYNTHÉTIQUES DÉTERMINISTES
+# ---------------------------------------------------------
+WEATHER_CODES = [0, 1, 2, 3, 45, 51, 61, 63, 80, 95]
+
+FORECAST_DAYS = 7
+
+
+def _rng(*parts) -> random.Random:
+    """Générateur seedé par (variable, lieu, série) : mêmes paramètres → mêmes valeurs."""
+    return random.Random(zlib.crc32("|".join(str(p) for p in parts).encode("utf-8")))
+
+
+def _season(d: date) -> float:
+    return math.sin(2 * math.pi * (d.timetuple().tm_yday - 100) / 365.25)
+
+
+def _value(var: str, d: date, hour: int | None, rng: random.Random):
+    """Valeur plausible d'une variable Open-Meteo pour un jour (et une heure)."""
+    s = _season(d)
+    diurnal = 0.0 if hour is None else math.sin(2 * math.pi * (hour - 9) / 24)
+
+    if var.startswith("temperature_2m_min"):
+        return round(22 + 2.5 * s + rng.gauss(0, 1), 1)
+    if var.startswith("temperature_2m_max"):
+        return round(30 + 2.5 * s + rng.gauss(0, 1.2), 1)
+    if var.startswith("temperature_2m"):
+        return round(26 + 2.5 * s + 4 * diurnal + rng.gauss(0, 0.8), 1)
+    if var.startswith("relative_humidity"):
+        return round(min(100, max(20, 75 + 10 * s - 12 * diurnal + rng.gauss(0, 5))))
+    if var.startswith("precipitation") or var.startswith("rain"):
+        wet = rng.random() < 0.25 + 0.15 * s
+        amount = rng.gammavariate(0.8, 8.0 if hour is None else 1.5) if wet else 0.0
+        return round(amount, 1)
+    if var.startswith("wind") or var.startswith("windspeed"):
+        return round(abs(12 + rng.gauss(0, 5)), 1)
+    if var == "weather_code":
+        return rng.choice(WEATHER_CODES)
+    return round(rng.gauss(0, 1), 2)
+
+
+def _series(variables: list[str], lat: float, lon: float, start: date, end: date, hourly: bool) -> dict:
+    out = {"time": []}
+    rngs = {v: _rng(v, lat, lon, start, hourly) for v in variables}
+    for v in variables:
+        out[v] = []
+
+    d = start
+    while d <= end:
+        hours = range(24) if hourly else [None]
+        for h in hours:
+            out["time"].append(f"{d.isoformat()}T{h:02d}:00" if hourly else d.isoformat())
+            for v in variables:
+                out[v].append(_value(v, d, h, rngs[v]))
+        d += timedelta(days=1)
+    return out
+
+
+def _current(variables: list[str], lat: float, lon: float) -> dict:
+    now = datetime.now().replace(second=0, microsecond=0)
+    now = now.replace(minute=now.minute - now.minute % 15)
+    rng = _rng("current", lat, lon, now.isoformat())
+    cur = {"time": now.isoformat(timespec="minutes"), "interval": 900}
+    for v in variables:
+        cur[v] = _value(v, now.date(), now.hour, rng)
+    return cur
+
+
+def _split(values: list[str]) -> list[str]:
+    # Open-Meteo accepte "a,b" comme a=...&a=...
+    return [v for raw in values for v in raw.split(",") if v]
+
+
+def build_payload(path: str, params: dict) -> list[dict] | dict:
+    """
+    Réponse JSON pour /v1/forecast ou /v1/archive.
+    Plusieurs coordonnées (latitude=a,b&longitude=c,d) → liste d'objets,
+    comme l'API réelle.
+    """
+    lats = [float(x) for x in _split(params.get("latitude", []))]
+    lons = [float(x) for x in _split(params.get("longitude", []))]
+    if not lats or len(lats) != len(lons):
+        raise ValueError("latitude/longitude manquantes ou de tailles différentes")
+
+    daily = _split(params.get("daily", []))
+    hourly = _split(params.get("hourly", []))
+    current = _split(params.get("current", []))
+    timezone = params.get("timezone", ["GMT"])[0]
+
+    if path.endswith("/archive"):
+        if "start_date" not in params or "end_date" not in params:
+            raise ValueError("start_date et end_date sont obligatoires")
+    today = date.today()
+    start = date.fromisoformat(params.get("start_date", [today.isoformat()])[0])
+    end = date.fromisoformat(
+        params.get("end_date", [(today + timedelta(days=FORECAST_DAYS - 1)).isoformat()])[0]
+    )
+    if end < start:
+        raise ValueError("end_date antérieure à start_date")
+
+    locations = []
+    for lat, lon in zip(lats, lons):
+        loc = {
+            "latitude": lat,
+            "longitude": lon,
+            "timezone": "America/Port_au_Prince" if timezone == "auto" else timezone,
+            "utc_offset_seconds": -18000,
+        }
+        if current:
+            loc["current"] = _current(current, lat, lon)
+        if hourly:
+            loc["hourly"] = _series(hourly, lat, lon, start, end, hourly=True)
+        if daily:
+            loc["daily"] = _series(daily, lat, lon, start, end, hourly=False)
+        locations.append(loc)
+
+    return locations if len(locations) > 1 else locations[0]
+
+
+# ---------------------------------------------------------
+# SERVEUR HTTP (latence, erreurs et 429 configurables)
+# ---------------------------------------------------------
+class StandInConfig:
+    def __init__(self, latency: float, jitter: float, error_rate: float,
+                 throttle_per_minute: int, seed: int):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_per_minute = throttle_per_minute
+        self.rng = random.Random(seed)
+        self.calls = deque()
+        self.lock = threading.Lock()
+        self.counters = {"requests": 0, "ok": 0, "errors": 0, "throttled": 0}
+
+    def admit(self) -> str:
+        """Décide du sort d'une requête : "ok", "error" ou "throttled"."""
+        with self.lock:
+            self.counters["requests"] += 1
+            now = time.monotonic()
+            while self.calls and now - self.calls[0] > 60:
+                self.calls.popleft()
+            if self.throttle_per_minute and len(self.calls) >= self.throttle_per_minute:
+                self.counters["throttled"] += 1
+                return "throttled"
+            self.calls.append(now)
+            if self.rng.random() < self.error_rate:
+                self.counters["errors"] += 1
+                return "error"
+            self.counters["ok"] += 1
+            return "ok"
+
+    def delay(self) -> float:
+        with self.lock:
+            return max(0.0, self.latency + self.rng.uniform(-self.jitter, self.jitter))
+
+
+def make_handler(config: StandInConfig):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            url = urlparse(self.path)
+
+            if url.path == "/stats":
+                return self._send(200, config.counters)
+            if url.path not in ("/v1/forecast", "/v1/archive"):
+                return self._send(404, {"error": True, "reason": f"Unknown path {url.path}"})
+
+            outcome = config.admit()
+            time.sleep(config.delay())
+
+            if outcome == "throttled":
+                return self._send(429, {"error": True, "reason": "Minutely API request limit exceeded."},
+                                  headers={"Retry-After": "60"})
+            if outcome == "error":
+                return self._send(500, {"error": True, "reason": "Injected failure"})
+
+            try:
+                payload = build_payload(url.path, parse_qs(url.query))
+            except ValueError as e:
+                return self._send(400, {"error": True, "reason": str(e)})
+            self._send(200, payload)
+
+        def _send(self, status: int, body, headers: dict | None = None):
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, fmt, *args):
+            pass
+
+    return Handler
+
+
+def serve(host: str, port: int, config: StandInConfig) -> ThreadingHTTPServer:
+    """Démarre le serveur dans un thread d'arrière-plan et le renvoie."""
+    server = ThreadingHTTPServer((host, port), make_handler(config))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(
+        description="Serveur local imitant l'API Open-Meteo (données synthétiques).",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument("--host", default="127.0.0.1", help="Adresse d'écoute")
+    parser.add_argument("--port", type=int, default=8765, help="Port d'écoute")
+    parser.add_argument("--latency", type=float, default=0.0, help="Latence ajoutée (secondes)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Variation ± de la latence (secondes)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Proportion de réponses 500")
+    parser.add_argument("--throttle", type=int, default=0,
+                        help="Requêtes par minute avant 429 (0 = illimité)")
+    parser.add_argument("--seed", type=int, default=42, help="Graine des erreurs et de la latence")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    config = StandInConfig(args.latency, args.jitter, args.error_rate, args.throttle, args.seed)
+    server = serve(args.host, args.port, config)
+
+    base = f"http://{args.host}:{args.port}"
+    print(f"🛰 Open-Meteo local sur {base}")
+    print(f"   METEO_LIVE_URL={base}/v1/forecast")
+    print(f"   METEO_ARCHIVE_URL={base}/v1/archive")
+
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+        print(f"\n{config.counters}")
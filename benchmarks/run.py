@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+# ../benchmarks/run.py
+# Chronométrage des chemins critiques (stockage + préparation des pages)
+
+import sys
+import os
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, "app"))
+
+import argparse
+import contextlib
+import io
+import json
+import platform
+import statistics
+import time
+from datetime import datetime
+from pathlib import Path
+
+import polars as pl
+
+import modules.storage as storage
+from modules.chartdata import chart_frame, resample
+from modules.framecache import ARCHIVE_CACHE
+from benchmarks.generate import SCALES, END_YEAR, generate_db, synthetic_archive
+
+import views.page_archive as page_archive
+from views.page_map import build_map_frame, MAP_PAYLOAD_COLS
+
+DATA_DIR = Path("benchmarks/.data")
+RESULTS_DIR = Path("benchmarks/results")
+
+# Année hors plage générée : les insertions de test sont supprimées ensuite
+SCRATCH_YEAR = 2100
+
+
+# ---------------------------------------------------------
+# OUTILS DE MESURE
+# ---------------------------------------------------------
+def measure(fn, repeat: int, setup=None) -> dict:
+    """Exécute fn() `repeat` fois (setup() avant chaque essai, non chronométré)."""
+    timings = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        with contextlib.redirect_stdout(io.StringIO()):
+            t0 = time.perf_counter()
+            fn()
+            timings.append((time.perf_counter() - t0) * 1000)
+
+    return {
+        "runs": repeat,
+        "min_ms": round(min(timings), 3),
+        "median_ms": round(statistics.median(timings), 3),
+        "mean_ms": round(statistics.fmean(timings), 3),
+    }
+
+
+def _delete_scratch_rows():
+    # Lignes et cellules de couverture de l'année témoin, dans la même
+    # transaction : sinon read_date_bounds verrait encore 2100 au run suivant
+    conn = storage.connect_db()
+    try:
+        with conn:
+            conn.execute(
+                "DELETE FROM meteo_archive WHERE date BETWEEN ? AND ?",
+                (f"{SCRATCH_YEAR}-01-01", f"{SCRATCH_YEAR}-12-31"),
+            )
+            conn.execute("DELETE FROM archive_coverage WHERE year = ?", (SCRATCH_YEAR,))
+    finally:
+        conn.close()
+
+
+def _fake_get_meteo_data(id_ville, lat, lon, year):
+    # Remplace l'appel réseau : on mesure le chemin d'écriture, pas l'API
+    return synthetic_archive(id_ville, year, year)
+
+
+# ---------------------------------------------------------
+# BENCHMARKS D'UNE ÉCHELLE
+# ---------------------------------------------------------
+def run_scale(scale: str, repeat: int) -> dict:
+    n_villes, n_years = SCALES[scale]
+    db_path = DATA_DIR / f"meteo_haiti_{scale}.sqlite"
+
+    if not db_path.exists():
+        print(f"🧪 Génération {scale} ({n_villes} villes × {n_years} ans)…")
+        with contextlib.redirect_stdout(io.StringIO()):
+            generate_db(db_path, n_villes, n_years)
+
+    storage.DB_PATH = db_path
+    # Base générée par une version antérieure : appliquer les migrations (tables, index)
+    storage.init_db()
+    _delete_scratch_rows()  # restes d'un run interrompu
+    ARCHIVE_CACHE.invalidate()
+
+    ville_id = 1
+    start = f"{END_YEAR - n_years + 1}-01-01"
+    end = f"{END_YEAR}-12-31"
+    month_start = f"{END_YEAR}-12-01"
+    one_year = synthetic_archive(ville_id, SCRATCH_YEAR, SCRATCH_YEAR)
+
+    villes = storage.read_villes()
+    currents = [
+        {"temperature_2m": 28.0, "relative_humidity_2m": 70, "precipitation": 0.4,
+         "wind_speed_10m": 12.0, "weather_code": 2}
+        for _ in range(villes.height)
+    ]
+
+    def archive_page_prep():
+        df = page_archive.load_archive(ville_id, start, end)
+        chart_frame(df)
+        chart_frame(resample(df, "1mo"))
+        df.select(pl.col(["temp_min", "temp_max", "humidite", "vent"]).mean())
+        storage.count_archive(ville_id, start, end)
+        storage.read_archive_page(ville_id, start, end, "date", False, 50, 0)
+
+    def map_page_prep():
+        build_map_frame(villes, currents).select(MAP_PAYLOAD_COLS).to_dicts()
+
+    cold = ARCHIVE_CACHE.invalidate
+    original_fetch = storage.get_meteo_data
+    storage.get_meteo_data = _fake_get_meteo_data
+
+    try:
+        results = {
+            "read_villes": measure(storage.read_villes, repeat),
+            "get_date_bounds": measure(lambda: page_archive.get_date_bounds(ville_id), repeat, setup=cold),
+            "load_archive": measure(lambda: page_archive.load_archive(ville_id, start, end), repeat, setup=cold),
+            "load_archive_warm": measure(lambda: page_archive.load_archive(ville_id, start, end), repeat),
+            "load_history_30d": measure(lambda: page_archive.load_archive(ville_id, month_start, end), repeat, setup=cold),
+            "insert_dataframe": measure(lambda: storage.insert_dataframe("meteo_archive", one_year), repeat),
+            "insert_meteo_data": measure(
+                lambda: storage.insert_meteo_data(SCRATCH_YEAR, SCRATCH_YEAR, wait_seconds=0),
+                max(1, repeat // 3),
+            ),
+            "page_archive_prep": measure(archive_page_prep, repeat, setup=cold),
+            "page_map_prep": measure(map_page_prep, repeat),
+        }
+    finally:
+        storage.get_meteo_data = original_fetch
+        _delete_scratch_rows()
+
+    return {"villes": n_villes, "annees": n_years, "benchmarks": results}
+
+
+# ---------------------------------------------------------
+# COMPARAISON AVEC UNE RÉFÉRENCE
+# ---------------------------------------------------------
+def compare(current: dict, baseline: dict, threshold: float) -> list[dict]:
+    """Ratio médiane actuelle / médiane de référence pour chaque mesure commune."""
+    rows = []
+    for scale, res in current["scales"].items():
+        base = baseline.get("scales", {}).get(scale)
+        if base is None:
+            continue
+        for name, stats in res["benchmarks"].items():
+            ref = base["benchmarks"].get(name)
+            if ref is None or ref["median_ms"] == 0:
+                continue
+            ratio = stats["median_ms"] / ref["median_ms"]
+            rows.append({
+                "scale": scale,
+                "benchmark": name,
+                "baseline_ms": ref["median_ms"],
+                "current_ms": stats["median_ms"],
+                "ratio": round(ratio, 3),
+                "regression": ratio > threshold,
+            })
+    return rows
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(
+        description="Benchmarks HaïtiMétéo+ sur bases synthétiques.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument("--scales", nargs="+", default=["xs", "s"], choices=sorted(SCALES),
+                        help="Échelles à mesurer")
+    parser.add_argument("--repeat", type=int, default=5, help="Répétitions par mesure")
+    parser.add_argument("--baseline", default="benchmarks/baseline.json",
+                        help="Résultats de référence pour la comparaison")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="Enregistre ces résultats comme nouvelle référence")
+    parser.add_argument("--threshold", type=float, default=1.25,
+                        help="Ratio au-delà duquel une mesure est une régression")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    os.chdir(ROOT)
+    args = parse_arguments()
+
+    report = {
+        "meta": {
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "polars": pl.__version__,
+            "platform": platform.platform(),
+            "repeat": args.repeat,
+        },
+        "scales": {},
+    }
+
+    for scale in args.scales:
+        print(f"⏱ Échelle {scale}…")
+        report["scales"][scale] = run_scale(scale, args.repeat)
+        for name, stats in report["scales"][scale]["benchmarks"].items():
+            print(f"   {name:<20} médiane {stats['median_ms']:>10.2f} ms")
+
+    baseline_path = Path(args.baseline)
+    regressions = []
+    if baseline_path.exists() and not args.save_baseline:
+        baseline = json.loads(baseline_path.read_text(encoding="utf-8"))
+        report["comparison"] = compare(report, baseline, args.threshold)
+        regressions = [r for r in report["comparison"] if r["regression"]]
+
+        print(f"\n📊 Comparaison avec {baseline_path} (seuil ×{args.threshold})")
+        for r in report["comparison"]:
+            flag = "❌" if r["regression"] else "✔"
+            print(f"   {flag} {r['scale']:<3} {r['benchmark']:<20} "
+                  f"{r['baseline_ms']:>10.2f} → {r['current_ms']:>10.2f} ms (×{r['ratio']})")
+
+    RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+    out = RESULTS_DIR / f"bench_{datetime.now():%Y%m%d_%H%M%S}.json"
+    out.write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+    print(f"\n💾 Résultats : {out}")
+
+    if args.save_baseline:
+        baseline_path.write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+        print(f"📌 Référence mise à jour : {baseline_path}")
+
+    if regressions:
+        print(f"\n❌ {len(regressions)} régression(s) détectée(s).")
+        sys.exit(1)
@@ -0,0 +1,319 @@
+# -*- coding: utf-8 -*-
+# ../modules/api.py
+# API HTTP en lecture seule (JSON / Arrow) sur la base SQLite
+
+import hashlib
+import io
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+import polars as pl
+
+from modules.logs import get_logger, log_event
+from modules.metrics import span
+from modules.storage import ARCHIVE_COLUMNS, LATEST_COLUMNS, check_slow
+
+_log = get_logger("api")
+
+
+# ---------------------------------------------------------
+# POOL DE CONNEXIONS EN LECTURE SEULE
+# ---------------------------------------------------------
+class ReadOnlyPool:
+    """
+    `size` connexions SQLite ouvertes en mode ro (file:…?mode=ro),
+    partagées entre les threads du serveur.
+    """
+
+    def __init__(self, path: Path, size: int = 4, timeout: float = 10.0):
+        self.path = Path(path)
+        self.timeout = timeout
+        self._idle = queue.Queue()
+        for _ in range(size):
+            conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+            conn.execute("PRAGMA query_only = 1")
+            self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = self._idle.get(timeout=self.timeout)
+        try:
+            yield conn
+        finally:
+            self._idle.put(conn)
+
+    def query(self, name: str, sql: str, params=()) -> pl.DataFrame:
+        with span("sql_query", query=f"api_{name}") as s, self.connection() as conn:
+            t0 = time.perf_counter()
+            df = pl.read_database(
+                sql,
+                connection=conn,
+                execute_options={"parameters": list(params)} if params else None,
+            )
+            s.set(rows=df.height)
+            # Plan capturé sur la connexion du pool (le span n'est pas encore clos)
+            check_slow(f"api_{name}", sql, params, (time.perf_counter() - t0) * 1000, df.height, conn)
+        return df
+
+    def version(self) -> float:
+        """Date de dernière écriture (base + journal WAL éventuel)."""
+        wal = Path(f"{self.path}-wal")
+        return max(self.path.stat().st_mtime, wal.stat().st_mtime if wal.exists() else 0.0)
+
+
+# ---------------------------------------------------------
+# REQUÊTES EXPOSÉES
+# ---------------------------------------------------------
+class ApiError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+# Regroupements proposés par /v1/rollup (format strftime SQLite)
+ROLLUPS = {"week": "%Y-W%W", "month": "%Y-%m", "year": "%Y"}
+
+
+def _param(params: dict, name: str, default: str | None = None) -> str:
+    values = params.get(name)
+    if not values:
+        if default is None:
+            raise ApiError(400, f"Paramètre manquant : {name}")
+        return default
+    return values[0]
+
+
+def _ville_id(pool: ReadOnlyPool, params: dict) -> int:
+    """?ville= accepte l'identifiant ou le nom."""
+    ville = _param(params, "ville")
+    df = pool.query("ville_id", "SELECT id FROM villes WHERE CAST(id AS TEXT) = ? OR nom = ?", [ville, ville])
+    if df.is_empty():
+        raise ApiError(404, f"Ville inconnue : {ville}")
+    return int(df["id"][0])
+
+
+def get_villes(pool: ReadOnlyPool, params: dict) -> pl.DataFrame:
+    return pool.query("villes", "SELECT id, nom AS ville, latitude, longitude FROM villes ORDER BY id")
+
+
+def get_archive(pool: ReadOnlyPool, params: dict) -> pl.DataFrame:
+    ville_id = _ville_id(pool, params)
+    start = _param(params, "start", "1900-01-01")
+    end = _param(params, "end", "2100-12-31")
+    limit = int(_param(params, "limit", "-1"))
+    offset = int(_param(params, "offset", "0"))
+    return pool.query(
+        "archive",
+        f"SELECT {', '.join(ARCHIVE_COLUMNS)} FROM meteo_archive "
+        f"WHERE id_ville = ? AND date BETWEEN ? AND ? ORDER BY date LIMIT ? OFFSET ?",
+        [ville_id, start, end, limit, offset],
+    )
+
+
+def get_rollup(pool: ReadOnlyPool, params: dict) -> pl.DataFrame:
+    ville_id = _ville_id(pool, params)
+    every = _param(params, "every", "month")
+    if every not in ROLLUPS:
+        raise ApiError(400, f"every doit valoir {', '.join(ROLLUPS)}")
+    start = _param(params, "start", "1900-01-01")
+    end = _param(params, "end", "2100-12-31")
+
+    # DISTINCT : les lignes dupliquées de l'archive ne comptent qu'une fois
+    return pool.query(
+        f"rollup_{every}",
+        "SELECT strftime(?, date) AS periode, COUNT(*) AS jours, "
+        "AVG(temp_min) AS temp_min, AVG(temp_max) AS temp_max, AVG(humidite) AS humidite, "
+        "SUM(precipitation) AS precipitation, MAX(vent) AS vent_max "
+        f"FROM (SELECT DISTINCT {', '.join(ARCHIVE_COLUMNS)} FROM meteo_archive "
+        "      WHERE id_ville = ? AND date BETWEEN ? AND ?) "
+        "GROUP BY periode ORDER BY periode",
+        [ROLLUPS[every], ville_id, start, end],
+    )
+
+
+def get_live_latest(pool: ReadOnlyPool, params: dict) -> pl.DataFrame:
+    """Dernière mesure live par ville (?ville= pour une seule)."""
+    ville = params.get("ville", [None])[0]
+    where, args = ("WHERE ville = ?", [ville]) if ville else ("", [])
+    return pool.query(
+        "live_latest",
+        f"SELECT {', '.join(LATEST_COLUMNS)} FROM meteo_latest {where} ORDER BY ville",
+        args,
+    )
+
+
+ROUTES = {
+    "/v1/villes": get_villes,
+    "/v1/archive": get_archive,
+    "/v1/rollup": get_rollup,
+    "/v1/live/latest": get_live_latest,
+}
+
+
+# ---------------------------------------------------------
+# SÉRIALISATION + CACHE DE RÉPONSES
+# ---------------------------------------------------------
+ARROW_MIME = "application/vnd.apache.arrow.stream"
+
+
+def encode(df: pl.DataFrame, fmt: str) -> bytes:
+    if fmt == "arrow":
+        buf = io.BytesIO()
+        df.write_ipc_stream(buf)
+        return buf.getvalue()
+    return df.write_json().encode("utf-8")
+
+
+class ResponseCache:
+    """LRU (route, paramètres, format) → (version des données, ETag, corps)."""
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, version: float):
+        with self._lock:
+            hit = self._entries.get(key)
+            if hit is None or hit[0] != version:
+                return None
+            self._entries.move_to_end(key)
+            return hit
+
+    def put(self, key, version: float, etag: str, body: bytes):
+        with self._lock:
+            self._entries[key] = (version, etag, body)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+def make_etag(version: float, key) -> str:
+    digest = hashlib.sha1(f"{version!r}|{key!r}".encode("utf-8")).hexdigest()[:20]
+    return f'"{digest}"'
+
+
+def not_modified(headers, etag: str, version: float) -> bool:
+    """If-None-Match prioritaire ; sinon If-Modified-Since (à la seconde)."""
+    inm = headers.get("If-None-Match")
+    if inm:
+        return etag in [t.strip().removeprefix("W/") for t in inm.split(",")] or inm.strip() == "*"
+    ims = headers.get("If-Modified-Since")
+    if ims:
+        try:
+            return int(version) <= parsedate_to_datetime(ims).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+# ---------------------------------------------------------
+# SERVEUR HTTP
+# ---------------------------------------------------------
+def make_handler(pool: ReadOnlyPool, cache: ResponseCache, max_age: int = 60):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            # http.server décode la ligne de requête en latin-1 : on récupère
+            # l'UTF-8 des clients qui n'encodent pas les accents (?ville=Gonaïves)
+            try:
+                path = self.path.encode("latin-1").decode("utf-8")
+            except UnicodeError:
+                path = self.path
+            url = urlparse(path)
+            route = ROUTES.get(url.path)
+            if url.path == "/health":
+                return self._send(200, b'{"status": "ok"}', "application/json")
+            if route is None:
+                return self._error(404, f"Chemin inconnu : {url.path}")
+
+            params = parse_qs(url.query)
+            fmt = params.pop("format", [None])[0]
+            if fmt is None:
+                fmt = "arrow" if ARROW_MIME in self.headers.get("Accept", "") else "json"
+            if fmt not in ("json", "arrow"):
+                return self._error(400, "format doit valoir json ou arrow")
+
+            with span("api_request", route=url.path) as s:
+                version = pool.version()
+                key = (url.path, tuple(sorted((k, tuple(v)) for k, v in params.items())), fmt)
+                etag = make_etag(version, key)
+                headers = {
+                    "ETag": etag,
+                    "Last-Modified": formatdate(version, usegmt=True),
+                    "Cache-Control": f"public, max-age={max_age}",
+                }
+
+                if not_modified(self.headers, etag, version):
+                    s.set(status=304)
+                    return self._send(304, b"", None, headers)
+
+                hit = cache.get(key, version)
+                if hit is None:
+                    try:
+                        body = encode(route(pool, params), fmt)
+                    except ApiError as e:
+                        s.set(status=e.status)
+                        return self._error(e.status, str(e))
+                    except ValueError as e:
+                        s.set(status=400)
+                        return self._error(400, str(e))
+                    except sqlite3.Error as e:
+                        # Panne côté serveur (base verrouillée, corrompue…), pas une requête invalide
+                        s.set(status=500)
+                        log_event(_log, "api_db_error", logging.ERROR, route=url.path, error=str(e))
+                        return self._error(500, "erreur de base de données")
+                    except Exception as e:
+                        # Erreur inattendue (calcul Polars…) : réponse JSON plutôt qu'une connexion coupée
+                        s.set(status=500)
+                        log_event(_log, "api_error", logging.ERROR, route=url.path,
+                                  error=f"{type(e).__name__}: {e}")
+                        return self._error(500, "erreur interne")
+                    cache.put(key, version, etag, body)
+                else:
+                    body = hit[2]
+
+                s.set(status=200, bytes=len(body), cached=int(hit is not None))
+                self._send(200, body, ARROW_MIME if fmt == "arrow" else "application/json", headers)
+
+        def _error(self, status: int, message: str):
+            body = json.dumps({"error": message}, ensure_ascii=False).encode("utf-8")
+            self._send(status, body, "application/json")
+
+        def _send(self, status: int, body: bytes, content_type: str | None, headers: dict | None = None):
+            self.send_response(status)
+            if content_type:
+                self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            if body:
+                self.wfile.write(body)
+
+        def log_message(self, fmt, *args):
+            pass
+
+    return Handler
+
+
+def serve(host: str, port: int, db_path: Path, pool_size: int = 4, max_age: int = 60) -> ThreadingHTTPServer:
+    """Démarre l'API dans un thread d'arrière-plan et renvoie le serveur."""
+    if not os.path.exists(db_path):
+        raise FileNotFoundError(db_path)
+    server = ThreadingHTTPServer((host, port), make_handler(ReadOnlyPool(db_path, pool_size), ResponseCache(), max_age))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
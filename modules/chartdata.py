@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+# ../modules/chartdata.py
+
+import weakref
+
+import pandas as pd
+import polars as pl
+
+
+# ---------------------------------------------------------
+# CACHE DES CONVERSIONS (clé = identité du DataFrame Polars)
+# ---------------------------------------------------------
+# Un DataFrame Polars n'est pas hashable : on indexe par id() et on purge
+# l'entrée quand le frame source est libéré (weakref.finalize).
+_CHART_CACHE: dict[int, pd.DataFrame] = {}
+
+
+def chart_frame(df: pl.DataFrame, index: str = "date") -> pd.DataFrame:
+    """
+    Convertit UNE fois un DataFrame Polars en pandas pour les graphiques.
+      - dtypes pandas adossés à Arrow (pas de recopie des buffers numériques)
+      - colonne `index` placée en index
+      - résultat mis en cache tant que le frame source existe
+
+    Les graphiques sélectionnent ensuite leurs colonnes sur ce frame
+    (ex: chart_frame(df)[["temp_min", "temp_max"]]) au lieu de rappeler
+    .to_pandas() à chaque fois.
+    """
+    key = id(df)
+    cached = _CHART_CACHE.get(key)
+    if cached is not None:
+        return cached
+
+    pdf = df.to_pandas(use_pyarrow_extension_array=True)
+    if index in pdf.columns:
+        pdf = pdf.set_index(index)
+
+    _CHART_CACHE[key] = pdf
+    weakref.finalize(df, _CHART_CACHE.pop, key, None)
+    return pdf
+
+
+# ---------------------------------------------------------
+# RÉÉCHANTILLONNAGE (graphiques longue période)
+# ---------------------------------------------------------
+def resample(df: pl.DataFrame, every: str) -> pl.DataFrame:
+    """
+    Agrège un frame journalier par période Polars (ex: "1w", "1mo").
+    Précipitations sommées, autres mesures moyennées.
+    """
+    return (
+        df.sort("date")
+          .group_by_dynamic("date", every=every)
+          .agg([
+              pl.col(c).sum() if c == "precipitation" else pl.col(c).mean()
+              for c in df.columns if c != "date"
+          ])
+    )
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+# ../modules/derived.py
+# Variables climatiques dérivées, en expressions Polars (DataFrame ou LazyFrame)
+
+import polars as pl
+
+from modules.storage import ROLLUP_COLUMNS
+
+
+# ---------------------------------------------------------
+# CONSTANTES
+# ---------------------------------------------------------
+CDD_BASE = 18.0        # base des degrés-jours de climatisation (°C)
+RAIN_DAY_MM = 1.0      # jour de pluie (convention OMM : ≥ 1 mm)
+
+# Formule de Magnus (Alduchov & Eskridge 1996)
+MAGNUS_A = 17.625
+MAGNUS_B = 243.04
+
+
+# ---------------------------------------------------------
+# EXPRESSIONS (colonnes de meteo_archive par défaut)
+# ---------------------------------------------------------
+# Chaque fonction renvoie une pl.Expr nommée : aucune boucle Python, tout
+# s'évalue en une passe vectorisée dans Polars, en mode eager ou lazy.
+
+def mean_temp(tmin: str = "temp_min", tmax: str = "temp_max") -> pl.Expr:
+    """Température moyenne journalière approchée : (min + max) / 2."""
+    return ((pl.col(tmin) + pl.col(tmax)) / 2).alias("temp_moy")
+
+
+def diurnal_range(tmin: str = "temp_min", tmax: str = "temp_max") -> pl.Expr:
+    """Amplitude thermique journalière (°C)."""
+    return (pl.col(tmax) - pl.col(tmin)).alias("amplitude")
+
+
+def dew_point(temp: pl.Expr | None = None, rh: str = "humidite") -> pl.Expr:
+    """
+    Point de rosée (°C) par la formule de Magnus, à partir de l'humidité
+    relative moyenne et de la température moyenne du jour. Une humidité
+    nulle ou absente donne null.
+    """
+    t = mean_temp() if temp is None else temp
+    rel = pl.when(pl.col(rh) > 0).then(pl.col(rh).clip(upper_bound=100))
+    gamma = (rel / 100).log() + MAGNUS_A * t / (MAGNUS_B + t)
+    return (MAGNUS_B * gamma / (MAGNUS_A - gamma)).alias("point_rosee")
+
+
+def heat_index(temp: str = "temp_max", rh: str = "humidite") -> pl.Expr:
+    """
+    Indice de chaleur (°C) de la NOAA : formule simple de Steadman, puis
+    régression de Rothfusz avec ses deux corrections au-delà de 80 °F.
+    Calculé sur la température maximale et l'humidité moyenne du jour
+    (l'archive ne donne pas l'humidité à l'heure du maximum).
+    """
+    t = pl.col(temp) * 9 / 5 + 32
+    r = pl.col(rh).clip(0, 100)
+
+    simple = 0.5 * (t + 61.0 + (t - 68.0) * 1.2 + r * 0.094)
+    rothfusz = (
+        -42.379 + 2.04901523 * t + 10.14333127 * r
+        - 0.22475541 * t * r - 6.83783e-3 * t ** 2 - 5.481717e-2 * r ** 2
+        + 1.22874e-3 * t ** 2 * r + 8.5282e-4 * t * r ** 2 - 1.99e-6 * t ** 2 * r ** 2
+    )
+    dry = ((13 - r) / 4) * ((17 - (t - 95).abs()) / 17).clip(0).sqrt()
+    humid = ((r - 85) / 10) * ((87 - t) / 5)
+
+    hi_f = (
+        pl.when((simple + t) / 2 < 80).then(simple)
+        .when((r < 13) & (t >= 80) & (t <= 112)).then(rothfusz - dry)
+        .when((r > 85) & (t >= 80) & (t <= 87)).then(rothfusz + humid)
+        .otherwise(rothfusz)
+    )
+    return ((hi_f - 32) * 5 / 9).alias("indice_chaleur")
+
+
+def cooling_degree_days(base: float = CDD_BASE) -> pl.Expr:
+    """Degrés-jours de climatisation : max(T moyenne − base, 0)."""
+    return (mean_temp() - base).clip(lower_bound=0).alias("dj_clim")
+
+
+def rain_day(threshold: float = RAIN_DAY_MM, precip: str = "precipitation") -> pl.Expr:
+    """Jour de pluie (booléen) : précipitations ≥ threshold mm."""
+    return (pl.col(precip) >= threshold).alias("jour_pluie")
+
+
+# Nom de colonne → expression (paramètres par défaut)
+DERIVED = {
+    "temp_moy": mean_temp,
+    "amplitude": diurnal_range,
+    "point_rosee": dew_point,
+    "indice_chaleur": heat_index,
+    "dj_clim": cooling_degree_days,
+    "jour_pluie": rain_day,
+}
+
+
+def with_derived(frame: pl.DataFrame | pl.LazyFrame, names: list[str] | None = None):
+    """
+    Ajoute les variables dérivées (toutes par défaut) à un frame d'archive.
+    Même type en sortie : un LazyFrame reste paresseux (rien n'est calculé
+    avant collect()), un DataFrame est calculé immédiatement.
+    """
+    return frame.with_columns([DERIVED[n]() for n in names or DERIVED])
+
+
+# ---------------------------------------------------------
+# CUMULS PAR PÉRIODE
+# ---------------------------------------------------------
+def derived_rollup(frame: pl.DataFrame | pl.LazyFrame, every: str = "1mo") -> pl.LazyFrame:
+    """
+    Cumuls par ville et par période Polars (`every` : "1mo", "1y", "1w"…) :
+    moyennes (température, amplitude, point de rosée), indice de chaleur
+    maximal, somme des degrés-jours, nombre de jours de pluie, pluie totale.
+    Les lignes dupliquées de l'archive (même ville, même date) ne comptent
+    qu'une fois. Renvoie un LazyFrame (colonnes ROLLUP_COLUMNS d'archive_rollup) :
+    une seule passe au collect().
+    """
+    lf = frame.lazy()
+    if lf.collect_schema()["date"] == pl.String:
+        lf = lf.with_columns(pl.col("date").str.to_date())
+
+    return (
+        with_derived(lf.unique(["id_ville", "date"], keep="first"))
+        .sort("id_ville", "date")
+        .group_by_dynamic("date", every=every, group_by="id_ville")
+        .agg(
+            pl.len().alias("jours"),
+            pl.col("temp_moy").mean(),
+            pl.col("amplitude").mean(),
+            pl.col("point_rosee").mean(),
+            pl.col("indice_chaleur").max().alias("indice_chaleur_max"),
+            pl.col("dj_clim").sum(),
+            pl.col("jour_pluie").sum().alias("jours_pluie"),
+            pl.col("precipitation").sum(),
+        )
+        .with_columns(pl.col("date").cast(pl.String).alias("periode"))
+        .select(ROLLUP_COLUMNS)
+    )
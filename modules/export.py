@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+# ../modules/export.py
+
+import os
+import time
+from typing import Callable
+
+import polars as pl
+import pyarrow.parquet as pq
+
+from modules.metrics import span
+from modules.storage import count_archive_multi, iter_archive_rows
+
+
+# ---------------------------------------------------------
+# EXPORT ARCHIVE EN FLUX (CSV / Parquet)
+# ---------------------------------------------------------
+# Lignes lues puis écrites par lot : la mémoire dépend de ce lot,
+# pas de la plage exportée
+EXPORT_BATCH_ROWS = 50_000
+
+EXPORT_FORMATS = {"csv": "text/csv", "parquet": "application/octet-stream"}
+
+EXPORT_SCHEMA = {
+    "id_ville": pl.Int32,
+    "ville": pl.String,
+    "date": pl.String,
+    "temp_min": pl.Float32,
+    "temp_max": pl.Float32,
+    "humidite": pl.Float32,
+    "precipitation": pl.Float32,
+    "vent": pl.Float32,
+}
+
+
+def _batch_frame(rows: list[tuple]) -> pl.DataFrame:
+    return pl.DataFrame(rows, schema=EXPORT_SCHEMA, orient="row").with_columns(
+        pl.col("date").str.to_date()
+    )
+
+
+def export_archive(
+    path: str,
+    fmt: str,
+    ville_ids: list[int],
+    start: str,
+    end: str,
+    progress: Callable[[int, int], None] | None = None,
+    batch_rows: int = EXPORT_BATCH_ROWS,
+) -> dict:
+    """
+    Écrit l'archive de `ville_ids` sur [start, end] dans `path` (csv | parquet),
+    lot par lot depuis SQLite ; chaque lot Parquet devient un row group.
+    progress(lignes_écrites, total) est appelé après chaque lot.
+    Renvoie {"rows", "bytes", "path"}.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Format d'export inconnu : {fmt}")
+
+    total = count_archive_multi(ville_ids, start, end)
+    written = 0
+
+    with span("export", format=fmt) as s:
+        if fmt == "csv":
+            with open(path, "wb") as f:
+                for rows in iter_archive_rows(ville_ids, start, end, batch_rows):
+                    _batch_frame(rows).write_csv(f, include_header=written == 0)
+                    written += len(rows)
+                    if progress:
+                        progress(written, total)
+                if written == 0:
+                    pl.DataFrame(schema=EXPORT_SCHEMA).write_csv(f)
+        else:
+            schema = pl.DataFrame(schema=EXPORT_SCHEMA).with_columns(pl.col("date").str.to_date()).to_arrow().schema
+            with pq.ParquetWriter(path, schema, compression="zstd") as writer:
+                for rows in iter_archive_rows(ville_ids, start, end, batch_rows):
+                    writer.write_table(_batch_frame(rows).to_arrow())
+                    written += len(rows)
+                    if progress:
+                        progress(written, total)
+
+        size = os.path.getsize(path)
+        s.set(rows=written, bytes=size)
+
+    return {"rows": written, "bytes": size, "path": path}
+
+
+def prune_exports(directory: str, max_age_seconds: float) -> int:
+    """Supprime les exports de `directory` plus anciens que max_age_seconds ; renvoie leur nombre."""
+    if not os.path.isdir(directory):
+        return 0
+
+    cutoff = time.time() - max_age_seconds
+    removed = 0
+    for entry in os.scandir(directory):
+        try:
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+                removed += 1
+        except OSError:
+            pass  # fichier en cours de lecture ou déjà supprimé par une autre session
+    return removed
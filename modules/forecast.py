@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+# ../modules/forecast.py
+
+from datetime import datetime, timezone
+
+import polars as pl
+
+from modules.meteo import FORECAST_BATCH, FORECAST_VARIABLES, get_forecast_batch
+from modules.metrics import span
+from modules.storage import (
+    FORECAST_SCHEMA,
+    insert_forecasts,
+    merge_forecast_skill,
+    read_archive_last_dates,
+    read_forecast_skill,
+    read_forecasts,
+    read_observations,
+    read_villes,
+)
+
+
+# Variables vérifiées (colonnes communes à meteo_archive)
+VERIFIED = list(FORECAST_VARIABLES.values())
+
+SKILL_SCHEMA = {
+    "id_ville": pl.Int64, "variable": pl.String, "lead_days": pl.Int64,
+    "n": pl.UInt32, "sum_err": pl.Float64, "sum_abs_err": pl.Float64, "sum_sq_err": pl.Float64,
+}
+
+
+# ---------------------------------------------------------
+# COLLECTE DES ÉMISSIONS
+# ---------------------------------------------------------
+def forecast_frame(villes: list[dict], dailies: list[dict | None], issued_at: str) -> pl.DataFrame:
+    """
+    Blocs `daily` Open-Meteo → format long meteo_forecast :
+      id_ville • issued_at • valid_date • lead_days • variable • value
+    lead_days = écart (jours) avec le premier jour prévu (jour d'émission local).
+    """
+    frames = [
+        pl.DataFrame(daily, strict=False).select(
+            pl.lit(v["id"], dtype=pl.Int64).alias("id_ville"),
+            pl.col("time").alias("valid_date"),
+            *[pl.col(api).cast(pl.Float64).alias(col) for api, col in FORECAST_VARIABLES.items() if api in daily],
+        )
+        for v, daily in zip(villes, dailies)
+        if daily
+    ]
+    if not frames:
+        return pl.DataFrame(schema=FORECAST_SCHEMA)
+
+    valid = pl.col("valid_date").str.to_date()
+    return (
+        pl.concat(frames, how="diagonal")
+        .with_columns(
+            pl.lit(issued_at).alias("issued_at"),
+            (valid - valid.min().over("id_ville")).dt.total_days().alias("lead_days"),
+        )
+        .unpivot(index=["id_ville", "issued_at", "valid_date", "lead_days"],
+                 variable_name="variable", value_name="value")
+        .drop_nulls("value")
+    )
+
+
+def collect_forecasts(days: int = 7) -> int:
+    """
+    Une émission pour toutes les villes, par lots de FORECAST_BATCH
+    coordonnées. Renvoie le nombre de lignes écrites dans meteo_forecast.
+    """
+    issued_at = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:00Z")
+    villes = read_villes().to_dicts()
+
+    written = 0
+    for i in range(0, len(villes), FORECAST_BATCH):
+        batch = villes[i:i + FORECAST_BATCH]
+        df = forecast_frame(batch, get_forecast_batch(batch, days=days), issued_at)
+        if not df.is_empty():
+            written += insert_forecasts(df)
+    return written
+
+
+# ---------------------------------------------------------
+# VÉRIFICATION (une passe Polars vectorisée)
+# ---------------------------------------------------------
+def observations_long(obs: pl.DataFrame) -> pl.DataFrame:
+    """
+    Archive → (id_ville, valid_date, variable, obs).
+    Les doublons (même ville, même date) sont moyennés.
+    """
+    return (
+        obs.group_by("id_ville", "date")
+        .agg(pl.col(VERIFIED).mean())
+        .rename({"date": "valid_date"})
+        .unpivot(index=["id_ville", "valid_date"], variable_name="variable", value_name="obs")
+        .drop_nulls("obs")
+    )
+
+
+def error_stats(forecasts: pl.DataFrame, observations: pl.DataFrame) -> pl.DataFrame:
+    """
+    Jointure prévisions ↔ observations puis statistiques suffisantes
+    par ville × variable × échéance (cumulables d'une passe à l'autre).
+    """
+    return (
+        forecasts.join(
+            observations_long(observations),
+            on=["id_ville", "valid_date", "variable"],
+            how="inner",
+        )
+        .with_columns((pl.col("value") - pl.col("obs")).alias("err"))
+        .group_by("id_ville", "variable", "lead_days")
+        .agg(
+            pl.len().alias("n"),
+            pl.col("err").sum().alias("sum_err"),
+            pl.col("err").abs().sum().alias("sum_abs_err"),
+            (pl.col("err") ** 2).sum().alias("sum_sq_err"),
+        )
+    )
+
+
+def refresh_verification(rebuild: bool = False) -> int:
+    """
+    Vérifie les prévisions dont les observations sont arrivées depuis
+    la dernière passe (date vérifiée par ville), puis cumule les résultats.
+    Une prévision porte sur le futur : toute échéance déjà vérifiée ne
+    peut plus recevoir de nouvelle émission.
+    rebuild : recalcule tout depuis la première prévision.
+    Renvoie le nombre de paires prévision/observation ajoutées.
+    """
+    with span("forecast_verification", rebuild=rebuild) as s:
+        # Filtre par ville (date vérifiée propre à chacune) fait en SQL : une
+        # ville dont l'archive est en retard garde toutes ses prévisions
+        forecasts = (
+            read_forecasts(unverified=not rebuild)
+            .join(read_archive_last_dates(), on="id_ville", how="inner")
+            .filter(pl.col("valid_date") <= pl.col("last_obs"))
+        )
+        if forecasts.is_empty():
+            if rebuild:
+                merge_forecast_skill(
+                    pl.DataFrame(schema=SKILL_SCHEMA),
+                    pl.DataFrame(schema={"id_ville": pl.Int64, "verified_through": pl.String}),
+                    reset=True,
+                )
+            s.set(pairs=0)
+            return 0
+
+        observations = read_observations(forecasts["valid_date"].min(), forecasts["valid_date"].max())
+        stats = error_stats(forecasts.select("id_ville", "valid_date", "lead_days", "variable", "value"),
+                            observations)
+
+        # Date vérifiée = dernière observation des villes traitées
+        new_marks = (
+            forecasts.select("id_ville", pl.col("last_obs").alias("verified_through")).unique("id_ville")
+        )
+        merge_forecast_skill(stats, new_marks, reset=rebuild)
+
+        pairs = int(stats["n"].sum())
+        s.set(pairs=pairs)
+        return pairs
+
+
+def skill_table() -> pl.DataFrame:
+    """
+    Scores cumulés par ville × variable × échéance :
+      n • bias (moy. prévision − obs.) • mae • rmse
+    """
+    return (
+        read_forecast_skill()
+        .join(read_villes().select(pl.col("id").alias("id_ville"), "ville"), on="id_ville", how="left")
+        .select(
+            "ville", "id_ville", "variable", "lead_days", "n",
+            (pl.col("sum_err") / pl.col("n")).alias("bias"),
+            (pl.col("sum_abs_err") / pl.col("n")).alias("mae"),
+            (pl.col("sum_sq_err") / pl.col("n")).sqrt().alias("rmse"),
+        )
+        .sort("ville", "variable", "lead_days")
+    )
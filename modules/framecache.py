@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+# ../modules/framecache.py
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+import polars as pl
+from modules.logs import get_logger, log_cache
+from modules.storage import data_version, read_villes
+from modules.singleflight import ARCHIVE_FLIGHTS
+
+_log = get_logger("framecache")
+
+
+# ---------------------------------------------------------
+# FRAMES COMPACTS
+# ---------------------------------------------------------
+MEASURE_COLS = ["temp_min", "temp_max", "humidite", "precipitation", "vent"]
+
+
+def compact_frame(df: pl.DataFrame) -> pl.DataFrame:
+    """
+    Forme compacte d'un frame d'archive avant mise en cache :
+      - mesures en Float32 (moitié de la mémoire, précision largement suffisante)
+      - date en type Date
+      - nom de ville en Categorical (si la colonne est présente)
+    """
+    if df.is_empty():
+        return df
+
+    exprs = [pl.col(c).cast(pl.Float32) for c in MEASURE_COLS if c in df.columns]
+    if "date" in df.columns and df.schema["date"] == pl.String:
+        exprs.append(pl.col("date").str.to_date())
+    if "ville" in df.columns:
+        exprs.append(pl.col("ville").cast(pl.Categorical))
+
+    return df.with_columns(exprs) if exprs else df
+
+
+# ---------------------------------------------------------
+# CACHE PROCESSUS (LRU borné en octets, disque optionnel)
+# ---------------------------------------------------------
+class FrameCache:
+    """
+    Cache de DataFrames Polars partagé par toutes les sessions du processus.
+
+    Contrairement à st.cache_data, aucune copie n'est faite à la lecture :
+    tous les appelants reçoivent le MÊME objet. Les frames sont donc à
+    considérer comme immuables (les opérations Polars renvoient de nouveaux
+    frames, ne jamais utiliser les méthodes en place dessus).
+
+      - max_bytes : budget mémoire, éviction LRU au-delà
+      - ttl       : durée de vie d'une entrée en secondes (None = illimitée)
+      - spill_dir : si défini, chaque frame est aussi écrit en Arrow IPC et
+                    relu par memory-map après redémarrage
+      - version   : fonction renvoyant la version courante des données
+                    (storage.data_version) ; une entrée, en mémoire comme
+                    sur disque, porte la version de son chargement et n'est
+                    servie que si elle est toujours à jour
+
+    Dès que la version change, les entrées mémoire et les copies disque
+    des versions précédentes sont supprimées (les copies aussi au premier
+    chargement après redémarrage) ; la copie d'une entrée évincée ou
+    invalidée est supprimée avec elle.
+    """
+
+    def __init__(self, max_bytes: int, ttl: float | None = None,
+                 spill_dir: str | Path | None = None, version=None):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.spill_dir = Path(spill_dir) if spill_dir else None
+        self.version = version
+        self._version: str | None = None
+
+        # clé → (frame, taille, date de stockage, version des données)
+        self._entries: OrderedDict[tuple, tuple[pl.DataFrame, int, float, str | None]] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if self.spill_dir:
+            self.spill_dir.mkdir(parents=True, exist_ok=True)
+
+    # -----------------------------
+    # API
+    # -----------------------------
+    def get_or_load(self, key: tuple, loader) -> pl.DataFrame:
+        """Renvoie le frame associé à `key`, ou appelle loader() puis le met en cache."""
+        version = self._sync_version()
+        with self._lock:
+            entry = self._entries.get(key)
+            hit = (
+                entry is not None and version is not None
+                and entry[3] == version and not self._expired(entry[2])
+            )
+            if hit:
+                self._entries.move_to_end(key)
+                self.hits += 1
+        if hit:
+            log_cache(_log, "frames", "hit", key=repr(key))
+            return entry[0]
+
+        # Sessions simultanées sur la même clé → un seul chargement en vol
+        return ARCHIVE_FLIGHTS.do((id(self), key, version), lambda: self._load(key, loader, version))
+
+    def invalidate(self, predicate=None):
+        """Supprime les entrées dont la clé satisfait predicate(key) (toutes si None)."""
+        with self._lock:
+            for key in [k for k in self._entries if predicate is None or predicate(k)]:
+                size = self._entries.pop(key)[1]
+                self._bytes -= size
+                self._drop_spills(key)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    # -----------------------------
+    # Interne
+    # -----------------------------
+    def _load(self, key: tuple, loader, version: str | None) -> pl.DataFrame:
+        df = self._read_spill(key, version)
+        if df is None:
+            df = compact_frame(loader())
+            self._write_spill(key, version, df)
+            with self._lock:
+                self.misses += 1
+            log_cache(_log, "frames", "miss", key=repr(key), rows=df.height)
+        else:
+            with self._lock:
+                self.hits += 1
+            log_cache(_log, "frames", "spill", key=repr(key), rows=df.height)
+
+        self._store(key, df, version)
+        return df
+
+    def _expired(self, stored_at: float) -> bool:
+        return self.ttl is not None and time.monotonic() - stored_at > self.ttl
+
+    def _store(self, key: tuple, df: pl.DataFrame, version: str | None):
+        size = int(df.estimated_size())
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+
+            # Un frame plus gros que le budget n'est pas conservé en mémoire
+            if size > self.max_bytes:
+                return
+
+            self._entries[key] = (df, size, time.monotonic(), version)
+            self._bytes += size
+
+            evicted_keys = []
+            while self._bytes > self.max_bytes:
+                evicted_key, (_, evicted, _, _) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+                self.evictions += 1
+                evicted_keys.append(evicted_key)
+
+        for evicted_key in evicted_keys:
+            self._drop_spills(evicted_key)
+
+    def _sync_version(self) -> str | None:
+        """
+        Version des données ; un changement purge les entrées mémoire et les
+        copies disque des versions précédentes. None (version illisible) :
+        aucune entrée n'est servie ni copiée sur disque.
+        """
+        try:
+            version = self.version() if self.version is not None else ""
+        except Exception as e:
+            print(f"[ERREUR] Version des données (cache ignoré) → {e}")
+            return None
+        with self._lock:
+            changed = version != self._version
+            if changed:
+                self._version = version
+                for key in [k for k, e in self._entries.items() if e[3] != version]:
+                    self._bytes -= self._entries.pop(key)[1]
+        if changed and self.spill_dir is not None:
+            for path in self.spill_dir.glob("*.arrow"):
+                if not path.name.endswith(f".{version}.arrow"):
+                    path.unlink(missing_ok=True)
+        return version
+
+    # -----------------------------
+    # Copies disque (Arrow IPC)
+    # -----------------------------
+
+    @staticmethod
+    def _digest(key: tuple) -> str:
+        return hashlib.sha1(repr(key).encode("utf-8")).hexdigest()[:20]
+
+    def _spill_path(self, key: tuple, version: str | None) -> Path | None:
+        if self.spill_dir is None or version is None:
+            return None
+        return self.spill_dir / f"{self._digest(key)}.{version}.arrow"
+
+    def _drop_spills(self, key: tuple):
+        # Toutes versions confondues
+        if self.spill_dir is not None:
+            for path in self.spill_dir.glob(f"{self._digest(key)}.*.arrow"):
+                path.unlink(missing_ok=True)
+
+    def _read_spill(self, key: tuple, version: str | None) -> pl.DataFrame | None:
+        path = self._spill_path(key, version)
+        if path is None or not path.exists():
+            return None
+
+        try:
+            return pl.read_ipc(path, memory_map=True)
+        except Exception as e:
+            print(f"[ERREUR] Lecture cache {path} → {e}")
+            return None
+
+    def _write_spill(self, key: tuple, version: str | None, df: pl.DataFrame):
+        path = self._spill_path(key, version)
+        if path is None:
+            return
+        tmp = path.with_suffix(".tmp")
+        try:
+            df.write_ipc(tmp)
+            os.replace(tmp, path)
+        except Exception as e:
+            print(f"[ERREUR] Écriture cache {path} → {e}")
+
+
+# ---------------------------------------------------------
+# INSTANCE PARTAGÉE (archives)
+# ---------------------------------------------------------
+# METEO_CACHE_MB  : budget mémoire (Mo), 256 par défaut
+# METEO_CACHE_DIR : dossier Arrow IPC pour la persistance (désactivé si vide)
+ARCHIVE_CACHE = FrameCache(
+    max_bytes=int(os.environ.get("METEO_CACHE_MB", "256")) * 1024 * 1024,
+    ttl=600,
+    spill_dir=os.environ.get("METEO_CACHE_DIR") or None,
+    version=data_version,
+)
+
+
+def load_villes() -> pl.DataFrame:
+    """Table des villes via le cache partagé (invalider après modification)."""
+    return ARCHIVE_CACHE.get_or_load(("villes",), read_villes)
+
+
+def invalidate_villes():
+    ARCHIVE_CACHE.invalidate(lambda key: key[0] == "villes")
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+# ../modules/livebuffer.py
+# Tampon d'écriture différée des observations live → meteo_live + meteo_latest
+
+import atexit
+import os
+import threading
+import time
+
+from modules.logs import get_logger, log_event
+from modules.metrics import incr
+from modules.storage import insert_live_batch
+
+_log = get_logger("livebuffer")
+
+
+class LiveBuffer:
+    """
+    Observations live en attente d'écriture, dédoublonnées par
+    (ville, heure d'observation) : la dernière lecture reçue l'emporte.
+
+    Vidage en une transaction quand `max_rows` lectures sont en attente,
+    ou au plus tard `max_age` secondes après la plus ancienne (thread
+    d'arrière-plan), et à l'arrêt du processus (atexit).
+    """
+
+    def __init__(self, max_rows: int = 100, max_age: float = 30.0):
+        self.max_rows = max_rows
+        self.max_age = max_age
+        self._pending: dict[tuple[str, str], tuple] = {}
+        self._oldest: float | None = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self.stats = {"received": 0, "deduped": 0, "flushed": 0, "flushes": 0, "errors": 0}
+        self._thread = threading.Thread(target=self._run, name="live-buffer", daemon=True)
+        self._thread.start()
+
+    # ------------------------------------------------------
+    # Alimentation
+    # ------------------------------------------------------
+    def add(self, ville: str, observed_at: str, temperature, precipitation, vent,
+            humidite=None, weather_code=None):
+        with self._lock:
+            key = (ville, observed_at)
+            self.stats["received"] += 1
+            if key in self._pending:
+                self.stats["deduped"] += 1
+            elif not self._pending:
+                self._oldest = time.monotonic()
+            self._pending[key] = (ville, observed_at, temperature, precipitation, vent, humidite, weather_code)
+            full = len(self._pending) >= self.max_rows
+
+        if full:
+            self.flush()
+
+    def add_current(self, ville: str, current: dict | None):
+        """Bloc `current` Open-Meteo (get_live_weather / get_city_current)."""
+        if not current or not current.get("time"):
+            return
+        self.add(
+            ville,
+            current["time"],
+            current.get("temperature_2m"),
+            current.get("precipitation"),
+            current.get("wind_speed_10m"),
+            current.get("relative_humidity_2m"),
+            current.get("weather_code"),
+        )
+
+    # ------------------------------------------------------
+    # Vidage
+    # ------------------------------------------------------
+    def flush(self) -> int:
+        """Écrit toutes les lectures en attente ; renvoie le nombre inséré."""
+        with self._flush_lock:
+            with self._lock:
+                rows = list(self._pending.values())
+                self._pending.clear()
+                self._oldest = None
+            if not rows:
+                return 0
+
+            try:
+                inserted = insert_live_batch(rows)
+            except Exception as e:
+                # On remet les lectures en attente (sans écraser les plus récentes)
+                with self._lock:
+                    for r in rows:
+                        self._pending.setdefault((r[0], r[1]), r)
+                    self._oldest = self._oldest or time.monotonic()
+                    self.stats["errors"] += 1
+                log_event(_log, "live_flush_error", error=str(e), rows=len(rows))
+                return 0
+
+            with self._lock:
+                self.stats["flushed"] += inserted
+                self.stats["flushes"] += 1
+            incr("live_buffer_rows_total", inserted)
+            return inserted
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def close(self):
+        """Dernier vidage (arrêt du processus)."""
+        self._closed = True
+        self._wake.set()
+        self.flush()
+
+    def _run(self):
+        while not self._closed:
+            self._wake.wait(timeout=min(1.0, self.max_age))
+            self._wake.clear()
+            with self._lock:
+                due = self._oldest is not None and time.monotonic() - self._oldest >= self.max_age
+            if due:
+                self.flush()
+
+
+# Tampon du processus (app Streamlit) : METEO_LIVE_FLUSH_ROWS / METEO_LIVE_FLUSH_SECONDS
+LIVE_BUFFER = LiveBuffer(
+    max_rows=int(os.environ.get("METEO_LIVE_FLUSH_ROWS", 100)),
+    max_age=float(os.environ.get("METEO_LIVE_FLUSH_SECONDS", 30)),
+)
+atexit.register(LIVE_BUFFER.close)
@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+# ../modules/livecache.py
+# Dernières mesures live par ville : rendu immédiat + actualisation en arrière-plan
+
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+from modules.livebuffer import LIVE_BUFFER
+from modules.logs import get_logger, log_cache, log_event
+from modules.meteo import get_live_weather
+from modules.metrics import incr
+from modules.storage import read_latest
+
+_log = get_logger("livecache")
+
+# Fuseau des horodatages de meteo_live (heure locale des villes)
+LIVE_TZ = ZoneInfo("America/Port-au-Prince")
+
+# Une mesure API plus récente que REFRESH_AFTER n'est pas redemandée
+# (ni une ville dont la dernière tentative a échoué depuis moins longtemps)
+REFRESH_AFTER = float(os.environ.get("METEO_LIVE_REFRESH_SECONDS", 60))
+
+# Budget de latence d'une page live : au-delà, on affiche la mesure précédente
+LIVE_BUDGET_MS = float(os.environ.get("METEO_LIVE_BUDGET_MS", 1000))
+
+
+@dataclass(frozen=True)
+class Reading:
+    """Mesure d'une ville : réponse get_live_weather, ou ligne de meteo_latest."""
+
+    data: dict
+    observed_at: float  # epoch de l'observation
+    source: str         # "api" | "db"
+    fetched_at: float   # epoch de la récupération
+
+    @property
+    def current(self) -> dict:
+        return self.data.get("current") or {}
+
+    def age(self, now: float | None = None) -> float:
+        return max(0.0, (time.time() if now is None else now) - self.observed_at)
+
+    def is_stale(self, now: float | None = None) -> bool:
+        now = time.time() if now is None else now
+        return self.source != "api" or now - self.fetched_at > REFRESH_AFTER
+
+
+def _observed_at(timestamp: str, utc_offset: int | None = None) -> float:
+    ts = datetime.fromisoformat(timestamp)
+    if ts.tzinfo is None:
+        tz = timezone(timedelta(seconds=utc_offset)) if utc_offset is not None else LIVE_TZ
+        ts = ts.replace(tzinfo=tz)
+    return ts.timestamp()
+
+
+def format_age(seconds: float) -> str:
+    if seconds < 90:
+        return "à l’instant"
+    if seconds < 3600:
+        return f"il y a {seconds / 60:.0f} min"
+    if seconds < 48 * 3600:
+        return f"il y a {seconds / 3600:.0f} h"
+    return f"il y a {seconds / 86400:.0f} j"
+
+
+# ---------------------------------------------------------
+# MESURES DU PROCESSUS
+# ---------------------------------------------------------
+class LiveReadings:
+    """
+    Dernière mesure connue par ville, partagée par toutes les sessions.
+
+    Les pages lisent d'abord ce qui est déjà là (mesure API récente, ou à
+    défaut la ligne de la ville dans meteo_latest), lancent l'actualisation en
+    arrière-plan et n'attendent qu'au plus leur budget de latence : une
+    ville lente ne bloque plus le rendu, elle reste affichée « ancienne »
+    jusqu'au rendu suivant. Chaque mesure API reçue part aussi dans le
+    tampon meteo_live.
+    """
+
+    def __init__(self, max_workers: int = 16, refresh_after: float = REFRESH_AFTER):
+        self.refresh_after = refresh_after
+        self._readings: dict[str, Reading] = {}
+        self._inflight: dict[str, Future] = {}
+        self._attempted: dict[str, float] = {}
+        self._errors: dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="live-refresh")
+
+    # -----------------------------
+    # Lecture
+    # -----------------------------
+    def latest(self, ville: str) -> Reading | None:
+        with self._lock:
+            return self._readings.get(ville)
+
+    def error(self, ville: str) -> str | None:
+        with self._lock:
+            return self._errors.get(ville)
+
+    def pending(self, villes: list[str]) -> int:
+        with self._lock:
+            return sum(v in self._inflight for v in villes)
+
+    # -----------------------------
+    # Actualisation
+    # -----------------------------
+    def refresh(self, villes: list[dict], force: bool = False) -> list[Future]:
+        """
+        Lance en arrière-plan la récupération des villes dont la mesure est
+        trop ancienne (toutes si force). Une ville déjà en cours n'est pas
+        relancée. villes : [{"ville", "latitude", "longitude"}, …]
+        """
+        now = time.time()
+        futures = []
+        with self._lock:
+            for v in villes:
+                name = v["ville"]
+                if name in self._inflight:
+                    futures.append(self._inflight[name])
+                    continue
+                if not force and now - self._attempted.get(name, 0.0) < self.refresh_after:
+                    continue
+                self._attempted[name] = now
+                fut = self._inflight[name] = self._pool.submit(self._fetch, v)
+                futures.append(fut)
+        return futures
+
+    def gather(self, villes: list[dict], budget: float, force: bool = False) -> tuple[dict, int]:
+        """
+        refresh() puis attente d'au plus `budget` secondes ; les villes sans
+        mesure fraîche sont complétées depuis meteo_latest.
+        Chaque ville donne un enregistrement `cache_lookup` : hit (mesure API
+        récente réutilisée), miss (récupérée pendant l'attente), stale
+        (mesure ancienne ou meteo_latest servie) ou none.
+        Renvoie ({ville: Reading | None}, nombre de villes encore en cours).
+        """
+        t0 = time.time()
+        futures = self.refresh(villes, force)
+        if futures:
+            wait(futures, timeout=budget)
+        names = [v["ville"] for v in villes]
+        if any((r := self.latest(n)) is None or r.is_stale() for n in names):
+            self._load_stored()
+        late = self.pending(names)
+        if late:
+            incr("live_budget_missed_total", late)
+
+        readings = {name: self.latest(name) for name in names}
+        for name, r in readings.items():
+            if r is None:
+                result = "none"
+            elif r.source == "api" and r.fetched_at >= t0:
+                result = "miss"
+            elif r.is_stale():
+                result = "stale"
+            else:
+                result = "hit"
+            log_cache(_log, "live_readings", result, ville=name)
+        return readings, late
+
+    # -----------------------------
+    # Interne
+    # -----------------------------
+    def _fetch(self, v: dict) -> bool:
+        name = v["ville"]
+        try:
+            data = get_live_weather(v["latitude"], v["longitude"], ville=name)
+            current = (data or {}).get("current") or {}
+            now = time.time()
+            with self._lock:
+                if current.get("time"):
+                    self._readings[name] = Reading(
+                        data, _observed_at(current["time"], data.get("utc_offset_seconds")), "api", now,
+                    )
+                    self._errors.pop(name, None)
+                else:
+                    self._errors[name] = "aucune réponse de l’API"
+        except Exception as e:
+            current = {}
+            with self._lock:
+                self._errors[name] = str(e)
+            log_event(_log, "live_refresh_error", ville=name, error=str(e))
+        finally:
+            with self._lock:
+                self._inflight.pop(name, None)
+
+        if current.get("time"):
+            LIVE_BUFFER.add_current(name, current)
+            return True
+        return False
+
+    def _load_stored(self):
+        """
+        Dernières observations enregistrées (meteo_latest, une ligne par
+        ville) : démarrage à froid, et mesures écrites par un autre processus.
+        Une ligne n'est retenue que si elle est plus récente que la mesure
+        déjà en mémoire.
+        """
+        try:
+            rows = read_latest().to_dicts()
+        except Exception as e:
+            log_event(_log, "live_load_error", error=str(e))
+            return
+
+        with self._lock:
+            for r in rows:
+                try:
+                    observed = _observed_at(r["timestamp"])
+                except (TypeError, ValueError):
+                    continue
+                known = self._readings.get(r["ville"])
+                if known is not None and known.observed_at >= observed:
+                    continue
+                current = {
+                    "time": r["timestamp"],
+                    "temperature_2m": r["temperature"],
+                    "relative_humidity_2m": r["humidite"],
+                    "precipitation": r["precipitation"],
+                    "wind_speed_10m": r["vent"],
+                    "weather_code": r["weather_code"],
+                }
+                self._readings[r["ville"]] = Reading({"current": current}, observed, "db", observed)
+
+
+LIVE_READINGS = LiveReadings()
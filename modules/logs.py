@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+# ../modules/logs.py
+
+import json
+import logging
+import os
+import random
+import sys
+from datetime import datetime, timezone
+
+
+# ---------------------------------------------------------
+# FORMAT JSON (une ligne par événement)
+# ---------------------------------------------------------
+class JsonFormatter(logging.Formatter):
+    """
+    {"ts": ..., "level": ..., "logger": ..., "event": ..., <champs>}
+    Les champs structurés sont passés via extra={"fields": {...}}.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "event": record.getMessage(),
+        }
+        payload.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            payload["exception"] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+# ---------------------------------------------------------
+# CONFIGURATION UNIQUE
+# ---------------------------------------------------------
+# METEO_LOG_LEVEL   : niveau (INFO par défaut)
+# METEO_LOG_FILE    : fichier de sortie (stderr sinon)
+# METEO_LOG_SAMPLE  : proportion des appels réussis journalisés (1.0 = tous)
+# METEO_LOG_SLOW_MS : au-delà, un appel est toujours journalisé
+SAMPLE_RATE = 1.0
+SLOW_MS = 2000.0
+
+_configured = False
+
+
+def configure_logging(level: str | None = None, sample_rate: float | None = None,
+                      slow_ms: float | None = None, path: str | None = None):
+    """
+    Point de configuration unique du logging (app, scripts).
+    Idempotent : les appels suivants ne modifient que l'échantillonnage.
+    """
+    global _configured, SAMPLE_RATE, SLOW_MS
+
+    SAMPLE_RATE = float(sample_rate if sample_rate is not None else os.environ.get("METEO_LOG_SAMPLE", SAMPLE_RATE))
+    SLOW_MS = float(slow_ms if slow_ms is not None else os.environ.get("METEO_LOG_SLOW_MS", SLOW_MS))
+
+    if _configured:
+        return
+    _configured = True
+
+    path = path or os.environ.get("METEO_LOG_FILE")
+    handler = logging.FileHandler(path, encoding="utf-8") if path else logging.StreamHandler(sys.stderr)
+    handler.setFormatter(JsonFormatter())
+
+    root = logging.getLogger("meteo")
+    root.setLevel((level or os.environ.get("METEO_LOG_LEVEL", "INFO")).upper())
+    root.addHandler(handler)
+    root.propagate = False
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Logger de l'application (hiérarchie `meteo.*`)."""
+    return logging.getLogger(f"meteo.{name}")
+
+
+def log_event(logger: logging.Logger, event: str, level: int = logging.INFO,
+              duration_ms: float | None = None, **fields):
+    """
+    Journalise un événement structuré.
+    Les événements INFO sont échantillonnés (SAMPLE_RATE), sauf s'ils sont
+    plus lents que SLOW_MS ; WARNING et au-delà sont toujours émis.
+    """
+    if level < logging.WARNING:
+        slow = duration_ms is not None and duration_ms >= SLOW_MS
+        if not slow and SAMPLE_RATE < 1.0 and random.random() >= SAMPLE_RATE:
+            return
+
+    if duration_ms is not None:
+        fields["duration_ms"] = round(duration_ms, 2)
+    logger.log(level, event, extra={"fields": fields})
+
+
+def log_cache(logger: logging.Logger, layer: str, result: str, **fields):
+    """
+    Enregistrement `cache_lookup`, émis là où le cache décide :
+    result = hit | miss | spill (relu sur disque) | shared (vol d'un autre
+    appelant) | stale (mesure ancienne servie pendant l'actualisation).
+    """
+    log_event(logger, "cache_lookup", cache=result, layer=layer, **fields)
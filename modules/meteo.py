@@ -1,23 +1,127 @@
 # -*- coding: utf-8 -*-
 # ../modules/meteo.py
 
+import logging
+import os
+import time
+from datetime import date, timedelta
+from typing import Iterator
+
 import requests
 import polars as pl
 
+from modules.logs import get_logger, log_event
+from modules.metrics import span
+from modules.singleflight import LIVE_FLIGHTS
+from modules.quota import acquire
+
+_log = get_logger("meteo")
+
 
 # =========================================================
 # API ENDPOINTS
 # =========================================================
 
-LIVE_URL = "https://api.open-meteo.com/v1/forecast"
-ARCHIVE_URL = "https://archive-api.open-meteo.com/v1/archive"
+# Surchargeables par variables d'environnement (ex: serveur local
+# benchmarks/openmeteo_server.py pour les tests hors ligne)
+LIVE_URL = os.environ.get("METEO_LIVE_URL", "https://api.open-meteo.com/v1/forecast")
+ARCHIVE_URL = os.environ.get("METEO_ARCHIVE_URL", "https://archive-api.open-meteo.com/v1/archive")
+
+
+# =========================================================
+# APPEL HTTP COMMUN (reprises + mesure)
+# =========================================================
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+MAX_RETRIES = 2
+BACKOFF_SECONDS = 0.5
+BACKOFF_MAX = 5.0
+
+
+def _backoff(attempt: int, retry_after: str | None = None) -> float:
+    if retry_after:
+        try:
+            return min(float(retry_after), BACKOFF_MAX)
+        except ValueError:
+            pass
+    return min(BACKOFF_SECONDS * 2 ** (attempt - 1), BACKOFF_MAX)
+
+
+def _get_json(endpoint: str, url: str, params: dict, timeout: float,
+              report: dict | None = None, priority: str = "live", **context):
+    """
+    GET → JSON avec reprises sur 429/5xx et erreurs réseau.
+    Chaque appel est un span `http_request` (durée, statut, octets, reprises)
+    et un enregistrement JSON `upstream_call` / `upstream_error` ; `context`
+    (ville, …) est ajouté à l'enregistrement. Un appel réel est toujours un
+    défaut de cache : les hits sont journalisés (`cache_lookup`) par les
+    caches eux-mêmes (framecache, livecache, singleflight).
+    Chaque tentative est décomptée du budget partagé (modules.quota) dans
+    la classe `priority` : live, poll ou backfill.
+    Si `report` est fourni, il reçoit ces mêmes champs (rapports de collecte).
+    Lève l'exception finale (raise_for_status / requests) après MAX_RETRIES.
+    """
+    fields = {
+        "endpoint": endpoint,
+        "lat": params.get("latitude"),
+        "lon": params.get("longitude"),
+        "start": params.get("start_date"),
+        "end": params.get("end_date"),
+        "priority": priority,
+        **context,
+    }
+
+    t0 = time.perf_counter()
+    try:
+        return _fetch(endpoint, url, params, timeout, fields)
+    except Exception as e:
+        fields["error"] = str(e)
+        raise
+    finally:
+        duration_ms = (time.perf_counter() - t0) * 1000
+        if report is not None:
+            report.update(fields, duration_ms=round(duration_ms, 2))
+        failed = "error" in fields
+        log_event(_log, "upstream_error" if failed else "upstream_call",
+                  logging.WARNING if failed else logging.INFO,
+                  duration_ms=duration_ms, **fields)
+
+
+def _fetch(endpoint: str, url: str, params: dict, timeout: float, fields: dict):
+    # Boucle de reprises ; renseigne status/bytes/retries dans `fields`
+    # Open-Meteo compte un appel par coordonnée (latitude=a,b,…)
+    cost = str(params.get("latitude", "")).count(",") + 1
+    with span("http_request", endpoint=endpoint) as s:
+        fields["retries"] = 0
+        while True:
+            acquire(fields["priority"], cost)
+            try:
+                r = requests.get(url, params=params, timeout=timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                if fields["retries"] >= MAX_RETRIES:
+                    s.set(retries=fields["retries"])
+                    raise
+                fields["retries"] += 1
+                time.sleep(_backoff(fields["retries"]))
+                continue
+
+            if r.status_code in RETRY_STATUS and fields["retries"] < MAX_RETRIES:
+                fields["retries"] += 1
+                time.sleep(_backoff(fields["retries"], r.headers.get("Retry-After")))
+                continue
+
+            fields["status"] = r.status_code
+            fields["bytes"] = len(r.content)
+            s.set(status=r.status_code, bytes=len(r.content), retries=fields["retries"])
+            r.raise_for_status()
+            return r.json()
 
 
 # =========================================================
 # MÉTÉO LIVE BASIQUE
 # =========================================================
 
-def get_weather(lat: float, lon: float):
+def get_weather(lat: float, lon: float, ville: str | int | None = None):
     """
     Récupère météo live horaire :
       - température
@@ -33,11 +137,9 @@ def get_weather(lat: float, lon: float):
     }
 
     try:
-        r = requests.get(LIVE_URL, params=params, timeout=15)
-        r.raise_for_status()
-        return r.json()
-    except Exception as e:
-        print(f"[ERREUR] get_weather({lat}, {lon}) → {e}")
+        return _get_json("forecast_hourly", LIVE_URL, params, timeout=15, ville=ville)
+    except Exception:
+        # Déjà journalisé (upstream_error) par _get_json
         return None
 
 
@@ -45,7 +147,7 @@ def get_weather(lat: float, lon: float):
 # MÉTÉO LIVE LÉGÈRE (pour carte : température + weather_code)
 # =========================================================
 
-def get_city_current(lat: float, lon: float):
+def get_city_current(lat: float, lon: float, ville: str | int | None = None):
     """
     Retour ultra-léger pour la carte :
       - temp
@@ -58,12 +160,13 @@ def get_city_current(lat: float, lon: float):
         "timezone": "auto",
     }
 
+    # Sessions simultanées sur la même ville → un seul appel en vol
     try:
-        r = requests.get(LIVE_URL, params=params, timeout=12)
-        r.raise_for_status()
-        return r.json().get("current", {})
-    except Exception as e:
-        print(f"[ERREUR] get_city_current({lat}, {lon}) → {e}")
+        return LIVE_FLIGHTS.do(
+            ("current_light", lat, lon),
+            lambda: _get_json("current_light", LIVE_URL, params, timeout=12, ville=ville).get("current", {}),
+        )
+    except Exception:
         return None
 
 
@@ -71,7 +174,7 @@ def get_city_current(lat: float, lon: float):
 # MÉTÉO LIVE PREMIUM (alertes + humidité + vent)
 # =========================================================
 
-def get_live_weather(lat: float, lon: float):
+def get_live_weather(lat: float, lon: float, ville: str | int | None = None):
     """
     Appel complet :
       - temp, humidité, pluie
@@ -94,28 +197,76 @@ def get_live_weather(lat: float, lon: float):
     }
 
     try:
-        r = requests.get(LIVE_URL, params=params, timeout=15)
-        r.raise_for_status()
-        return r.json()
-    except Exception as e:
-        print(f"[ERREUR] get_live_weather({lat}, {lon}) → {e}")
+        return LIVE_FLIGHTS.do(
+            ("current", lat, lon),
+            lambda: _get_json("current", LIVE_URL, params, timeout=15, ville=ville),
+        )
+    except Exception:
         return None
 
 
+# =========================================================
+# PRÉVISIONS JOURNALIÈRES GROUPÉES (plusieurs villes / requête)
+# =========================================================
+
+# Variable Open-Meteo → colonne de meteo_archive (pour la vérification)
+FORECAST_VARIABLES = {
+    "temperature_2m_min": "temp_min",
+    "temperature_2m_max": "temp_max",
+    "precipitation_sum": "precipitation",
+    "relative_humidity_2m_mean": "humidite",
+    "wind_speed_10m_max": "vent",
+}
+FORECAST_BATCH = 50  # coordonnées par requête
+
+
+def get_forecast_batch(villes: list[dict], days: int = 7) -> list[dict | None]:
+    """
+    Prévisions journalières pour jusqu'à FORECAST_BATCH villes en UN appel
+    (latitude=a,b,…&longitude=c,d,…).
+    villes : [{"id", "latitude", "longitude"}, …]
+    Retour : bloc `daily` de chaque ville, dans l'ordre (None si échec).
+    """
+    params = {
+        "latitude": ",".join(str(v["latitude"]) for v in villes),
+        "longitude": ",".join(str(v["longitude"]) for v in villes),
+        "daily": ",".join(FORECAST_VARIABLES),
+        "forecast_days": days,
+        "timezone": "auto",
+    }
+
+    try:
+        data = _get_json("forecast_daily", LIVE_URL, params, timeout=30, priority="poll", villes=len(villes))
+    except Exception:
+        return [None] * len(villes)
+
+    # Une seule coordonnée → objet ; plusieurs → liste
+    locations = data if isinstance(data, list) else [data]
+    return [loc.get("daily") for loc in locations]
+
+
 # =========================================================
 # ARCHIVE HISTORIQUE — VERSION POLARS (ultra rapide)
 # =========================================================
 
-def get_meteo_data(id_ville: int, lat: float, lon: float, year: int) -> pl.DataFrame | None:
+def get_meteo_data(id_ville: int, lat: float, lon: float, year: int,
+                   report: dict | None = None) -> pl.DataFrame | None:
     """
     Récupère les données climatiques ANNUELLES (archives Open-Meteo).
     Retour : Polars DataFrame
+    `report` (optionnel) reçoit statut, octets, reprises, durée et erreur.
     """
+    return get_meteo_range(id_ville, lat, lon, f"{year}-01-01", f"{year}-12-31", report=report)
+
+
+def get_meteo_range(id_ville: int, lat: float, lon: float, start: str, end: str,
+                    report: dict | None = None) -> pl.DataFrame | None:
+    """Archive journalière entre start et end ('YYYY-MM-DD'), même format que get_meteo_data."""
     params = {
         "latitude": lat,
         "longitude": lon,
-        "start_date": f"{year}-01-01",
-        "end_date": f"{year}-12-31",
+        "start_date": start,
+        "end_date": end,
         "daily": (
             "temperature_2m_max,"
             "temperature_2m_min,"
@@ -127,15 +278,13 @@ def get_meteo_data(id_ville: int, lat: float, lon: float, year: int) -> pl.DataF
     }
 
     try:
-        r = requests.get(ARCHIVE_URL, params=params, timeout=20)
-        r.raise_for_status()
-        data = r.json()
-    except Exception as e:
-        print(f"[ERREUR] Ville={id_ville}, année={year} → {e}")
+        data = _get_json("archive", ARCHIVE_URL, params, timeout=20, report=report,
+                         priority="backfill", ville=id_ville)
+    except Exception:
         return None
 
     if "daily" not in data or data["daily"] is None:
-        print(f"[INFO] Pas de données pour ville={id_ville} année={year}")
+        log_event(_log, "archive_empty", ville=id_ville, start=start, end=end)
         return None
 
     daily = data["daily"]
@@ -152,7 +301,84 @@ def get_meteo_data(id_ville: int, lat: float, lon: float, year: int) -> pl.DataF
         pl.lit(id_ville).alias("id_ville")
     )
 
-import requests
+
+# =========================================================
+# ARCHIVE HORAIRE — PAR TRONÇONS (streaming)
+# =========================================================
+
+# Variable Open-Meteo → colonne de meteo_archive_hourly
+HOURLY_VARIABLES = {
+    "temperature_2m": "temperature",
+    "precipitation": "precipitation",
+    "relative_humidity_2m": "humidite",
+    "wind_speed_10m": "vent",
+}
+HOURLY_CHUNK_DAYS = 31  # ≈ 744 lignes par requête
+
+
+def _date_chunks(start: date, end: date, days: int) -> Iterator[tuple[date, date]]:
+    while start <= end:
+        stop = min(start + timedelta(days=days - 1), end)
+        yield start, stop
+        start = stop + timedelta(days=1)
+
+
+def iter_meteo_hourly(id_ville: int, lat: float, lon: float, start: str, end: str,
+                      chunk_days: int = HOURLY_CHUNK_DAYS,
+                      report: dict | None = None) -> Iterator[pl.DataFrame]:
+    """
+    Archive HORAIRE entre start et end ('YYYY-MM-DD'), tronçon par tronçon :
+    un seul tronçon (≈ chunk_days × 24 lignes) est en mémoire à la fois.
+
+    Chaque DataFrame produit :
+      id_ville Int32 • ts Int64 (epoch UTC, secondes) • mesures Float64
+    Les mesures restent en Float64 : elles sont écrites telles quelles en
+    REAL, un passage par Float32 y laisserait du bruit (28.1 → 28.100000381…).
+    Un tronçon en échec est journalisé puis sauté (il ne coupe pas le flux) ;
+    `report` (optionnel) cumule tronçons, octets, reprises et échecs.
+    """
+    if report is not None:
+        report.update(chunks=0, bytes=0, retries=0, failed_chunks=[])
+
+    for chunk_start, chunk_end in _date_chunks(date.fromisoformat(start), date.fromisoformat(end), chunk_days):
+        params = {
+            "latitude": lat,
+            "longitude": lon,
+            "start_date": chunk_start.isoformat(),
+            "end_date": chunk_end.isoformat(),
+            "hourly": ",".join(HOURLY_VARIABLES),
+            "timezone": "GMT",
+        }
+
+        fetch = {}
+        try:
+            data = _get_json("archive_hourly", ARCHIVE_URL, params, timeout=30, report=fetch,
+                             priority="backfill", ville=id_ville)
+        except Exception:
+            data = None
+        finally:
+            if report is not None:
+                report["chunks"] += 1
+                report["bytes"] += fetch.get("bytes", 0)
+                report["retries"] += fetch.get("retries", 0)
+                report["status"] = fetch.get("status")
+                if "error" in fetch:
+                    report["failed_chunks"].append([params["start_date"], params["end_date"]])
+                    report["error"] = fetch["error"]
+
+        if not data or not data.get("hourly"):
+            continue
+
+        hourly = data["hourly"]
+        yield pl.DataFrame(
+            {"ts": hourly["time"], **{col: hourly[var] for var, col in HOURLY_VARIABLES.items()}},
+            strict=False,
+        ).select(
+            pl.lit(id_ville, dtype=pl.Int32).alias("id_ville"),
+            pl.col("ts").str.to_datetime("%Y-%m-%dT%H:%M", time_zone="UTC").dt.epoch("s"),
+            *[pl.col(col).cast(pl.Float64) for col in HOURLY_VARIABLES.values()],
+        )
+
 
 def get_historical_weather(lat, lon, start, end):
     """
@@ -175,6 +401,4 @@ def get_historical_weather(lat, lon, start, end):
         "timezone": "America/Port-au-Prince"
     }
 
-    r = requests.get(LIVE_URL, params=params)
-    r.raise_for_status()
-    return r.json()
+    return _get_json("historical", LIVE_URL, params, timeout=20)
@@ -0,0 +1,301 @@
+# -*- coding: utf-8 -*-
+# ../modules/metrics.py
+
+import bisect
+import functools
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# ---------------------------------------------------------
+# HISTOGRAMMES
+# ---------------------------------------------------------
+# Bornes supérieures des buckets de durée (millisecondes)
+DURATION_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+# Bornes des buckets de dénombrement (appelants par vol, éléments par lot…)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100, 250)
+
+
+class Histogram:
+    """
+    Histogramme cumulable à buckets fixes (compatible Prometheus).
+    unit : "ms" (durées, exportées en secondes) ou "count" (valeurs brutes).
+    """
+
+    def __init__(self, buckets=DURATION_BUCKETS_MS, unit: str = "ms"):
+        self.buckets = tuple(buckets)
+        self.unit = unit
+        self.counts = [0] * (len(self.buckets) + 1)  # dernier = +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        """Estimation par borne supérieure du bucket contenant le quantile q."""
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank:
+                return min(self.buckets[i], self.max) if i < len(self.buckets) else self.max
+        return self.max
+
+
+# ---------------------------------------------------------
+# REGISTRE (processus)
+# ---------------------------------------------------------
+_lock = threading.Lock()
+_histograms: dict[tuple, Histogram] = {}
+_counters: dict[tuple, float] = {}
+_recent: deque = deque(maxlen=500)
+
+
+def _key(name: str, labels: dict) -> tuple:
+    return (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+
+
+def observe(name: str, value_ms: float, **labels):
+    with _lock:
+        hist = _histograms.get(_key(name, labels))
+        if hist is None:
+            hist = _histograms[_key(name, labels)] = Histogram()
+        hist.observe(value_ms)
+
+
+def observe_count(name: str, value: float, **labels):
+    """Observation d'un dénombrement (COUNT_BUCKETS), hors des histogrammes de durée."""
+    with _lock:
+        hist = _histograms.get(_key(name, labels))
+        if hist is None:
+            hist = _histograms[_key(name, labels)] = Histogram(COUNT_BUCKETS, unit="count")
+        hist.observe(value)
+
+
+def incr(name: str, amount: float = 1, **labels):
+    with _lock:
+        key = _key(name, labels)
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+        _recent.clear()
+
+
+# ---------------------------------------------------------
+# SPANS
+# ---------------------------------------------------------
+class Span:
+    """
+    Mesure en cours. Les libellés (labels) identifient la série ;
+    les attributs numériques (bytes, rows, retries…) sont cumulés
+    dans des compteurs `<nom>_<attribut>_total`.
+    """
+
+    def __init__(self, name: str, labels: dict):
+        self.name = name
+        self.labels = labels
+        self.attrs: dict = {}
+        self.duration_ms = 0.0
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+
+@contextmanager
+def span(name: str, **labels):
+    """
+    with span("http_request", endpoint="archive") as s:
+        ...
+        s.set(status=200, bytes=len(r.content), retries=0)
+
+    Durée → histogramme `name` ; `status` et `error` deviennent des libellés.
+    """
+    s = Span(name, labels)
+    t0 = time.perf_counter()
+    try:
+        yield s
+    except Exception as e:
+        s.attrs.setdefault("error", type(e).__name__)
+        raise
+    finally:
+        s.duration_ms = (time.perf_counter() - t0) * 1000
+        _record(s)
+
+
+def timed(name: str, **labels):
+    """Décorateur : chaque appel est un span `name`."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name, **labels):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _record(s: Span):
+    series = dict(s.labels)
+    for label in ("status", "error"):
+        if label in s.attrs:
+            series[label] = s.attrs[label]
+
+    observe(s.name, s.duration_ms, **series)
+    for attr, value in s.attrs.items():
+        if attr not in ("status", "error") and isinstance(value, (int, float)):
+            incr(f"{s.name}_{attr}_total", value, **s.labels)
+
+    with _lock:
+        _recent.append({
+            "time": time.time(),
+            "name": s.name,
+            "duration_ms": round(s.duration_ms, 2),
+            **series,
+            **{k: v for k, v in s.attrs.items() if k not in series},
+        })
+
+
+# ---------------------------------------------------------
+# LECTURE / EXPORT
+# ---------------------------------------------------------
+def snapshot() -> list[dict]:
+    """Une ligne par série de durées : nombre, moyenne, p50/p95 estimés, max (ms)."""
+    with _lock:
+        rows = []
+        for (name, labels), h in sorted(_histograms.items()):
+            if h.unit != "ms":
+                continue
+            rows.append({
+                "metric": name,
+                "labels": ", ".join(f"{k}={v}" for k, v in labels),
+                "count": h.count,
+                "mean_ms": round(h.sum / h.count, 2) if h.count else 0.0,
+                "p50_ms": round(h.quantile(0.50), 2),
+                "p95_ms": round(h.quantile(0.95), 2),
+                "max_ms": round(h.max, 2),
+            })
+        return rows
+
+
+def distributions() -> list[dict]:
+    """Une ligne par série de dénombrement (observe_count) : nombre, moyenne, p50/p95, max."""
+    with _lock:
+        rows = []
+        for (name, labels), h in sorted(_histograms.items()):
+            if h.unit != "count":
+                continue
+            rows.append({
+                "metric": name,
+                "labels": ", ".join(f"{k}={v}" for k, v in labels),
+                "count": h.count,
+                "mean": round(h.sum / h.count, 2) if h.count else 0.0,
+                "p50": h.quantile(0.50),
+                "p95": h.quantile(0.95),
+                "max": h.max,
+            })
+        return rows
+
+
+def counters() -> list[dict]:
+    with _lock:
+        return [
+            {"metric": name, "labels": ", ".join(f"{k}={v}" for k, v in labels), "value": value}
+            for (name, labels), value in sorted(_counters.items())
+        ]
+
+
+def recent(limit: int = 100) -> list[dict]:
+    """Dernières mesures, plus récentes d'abord (copies : le registre n'est pas exposé)."""
+    with _lock:
+        return [dict(r) for r in list(_recent)[-limit:][::-1]]
+
+
+def _prom_labels(labels: tuple, extra: dict | None = None) -> str:
+    pairs = list(labels) + list((extra or {}).items())
+    if not pairs:
+        return ""
+    body = ",".join(f'{k}="{str(v).replace(chr(34), chr(39))}"' for k, v in pairs)
+    return "{" + body + "}"
+
+
+def prometheus_text(prefix: str = "meteo_") -> str:
+    """Export au format texte Prometheus (histogrammes de durée en secondes)."""
+    lines = []
+    with _lock:
+        seen = set()
+        for (name, labels), h in sorted(_histograms.items()):
+            # Durées en secondes ; dénombrements tels quels
+            scale = 1000 if h.unit == "ms" else 1
+            metric = f"{prefix}{name}_seconds" if h.unit == "ms" else f"{prefix}{name}"
+            if metric not in seen:
+                lines.append(f"# TYPE {metric} histogram")
+                seen.add(metric)
+            cumulative = 0
+            for bound, c in zip(h.buckets, h.counts):
+                cumulative += c
+                le = bound / scale if h.unit == "ms" else bound
+                lines.append(f"{metric}_bucket{_prom_labels(labels, {'le': le})} {cumulative}")
+            lines.append(f"{metric}_bucket{_prom_labels(labels, {'le': '+Inf'})} {h.count}")
+            lines.append(f"{metric}_sum{_prom_labels(labels)} {h.sum / scale:.6f}")
+            lines.append(f"{metric}_count{_prom_labels(labels)} {h.count}")
+
+        for (name, labels), value in sorted(_counters.items()):
+            metric = f"{prefix}{name}"
+            if metric not in seen:
+                lines.append(f"# TYPE {metric} counter")
+                seen.add(metric)
+            lines.append(f"{metric}{_prom_labels(labels)} {value}")
+    return "\n".join(lines) + "\n"
+
+
+# ---------------------------------------------------------
+# ENDPOINT PROMETHEUS OPTIONNEL
+# ---------------------------------------------------------
+_server = None
+_server_lock = threading.Lock()
+
+
+def serve_prometheus(port: int, host: str = "0.0.0.0"):
+    """Expose /metrics sur `port` (une seule fois par processus)."""
+    global _server
+    with _server_lock:
+        if _server is not None:
+            return _server
+        _server = _start_prometheus(port, host)
+        return _server
+
+
+def _start_prometheus(port: int, host: str) -> ThreadingHTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            data = prometheus_text().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, fmt, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
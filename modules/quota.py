@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+# ../modules/quota.py
+# Budget d'appels Open-Meteo partagé (app + collecteurs), compteurs SQLite
+
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from modules.logs import get_logger, log_event
+from modules.metrics import incr
+
+_log = get_logger("quota")
+
+# Fichier séparé de la base météo : tous les processus (Streamlit,
+# collect.py, travailleurs, forecast.py) y comptent leurs appels
+QUOTA_PATH = Path(os.environ.get("METEO_QUOTA_PATH", "data/quota.sqlite"))
+
+# Limites Open-Meteo (offre gratuite) ; 0 = fenêtre non contrôlée
+# (ex: METEO_QUOTA_PER_MINUTE=0 … pour les tests de charge en local)
+WINDOWS = {"minute": 60, "hour": 3600, "day": 86400}
+LIMITS = {
+    "minute": int(os.environ.get("METEO_QUOTA_PER_MINUTE", 600)),
+    "hour": int(os.environ.get("METEO_QUOTA_PER_HOUR", 5000)),
+    "day": int(os.environ.get("METEO_QUOTA_PER_DAY", 10000)),
+}
+
+
+# ---------------------------------------------------------
+# CLASSES DE PRIORITÉ
+# ---------------------------------------------------------
+#   live     : pages interactives (live, carte)
+#   poll     : interrogations périodiques (prévisions)
+#   backfill : collecte de l'archive
+# Part de chaque fenêtre qu'une classe laisse aux classes plus prioritaires :
+# le backfill s'arrête à 75 % du budget, le poll à 90 %, le live va jusqu'au bout.
+RESERVE = {"live": 0.0, "poll": 0.10, "backfill": 0.25}
+
+# Attente maximale pour un créneau : le live échoue tout de suite plutôt que
+# de figer la page, les tâches de fond patientent jusqu'à la fenêtre suivante.
+MAX_WAIT = {"live": 0.0, "poll": 60.0, "backfill": 3600.0}
+
+
+class QuotaExceeded(Exception):
+    def __init__(self, priority: str, window: str, retry_after: float):
+        super().__init__(f"Quota Open-Meteo atteint ({window}, {priority}) : réessayer dans {retry_after:.0f} s")
+        self.priority = priority
+        self.window = window
+        self.retry_after = retry_after
+
+
+# ---------------------------------------------------------
+# CONNEXION / SCHÉMA
+# ---------------------------------------------------------
+_ready: set[Path] = set()
+_ready_lock = threading.Lock()
+
+
+def connect_quota(path: Path | None = None) -> sqlite3.Connection:
+    path = Path(path or QUOTA_PATH)
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+    conn.execute("PRAGMA busy_timeout = 30000")
+    with _ready_lock:
+        if path not in _ready:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS quota_usage (
+                    period TEXT NOT NULL,
+                    bucket INTEGER NOT NULL,
+                    priority TEXT NOT NULL,
+                    calls INTEGER NOT NULL,
+                    PRIMARY KEY (period, bucket, priority)
+                ) WITHOUT ROWID;
+            """)
+            _ready.add(path)
+    return conn
+
+
+# ---------------------------------------------------------
+# PRISE DE CRÉNEAU
+# ---------------------------------------------------------
+def _allowed(window: str, priority: str) -> float:
+    return LIMITS[window] * (1 - RESERVE[priority])
+
+
+def try_acquire(conn: sqlite3.Connection, priority: str, cost: int = 1,
+                now: float | None = None) -> tuple[str | None, float]:
+    """
+    Compte `cost` appels si toutes les fenêtres le permettent pour cette
+    priorité (transaction IMMEDIATE : atomique entre processus).
+    Renvoie (None, 0) si accordé, sinon (fenêtre bloquante, secondes avant
+    sa remise à zéro).
+    """
+    now = time.time() if now is None else now
+    buckets = {w: int(now // s) for w, s in WINDOWS.items() if LIMITS[w]}
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for window, bucket in buckets.items():
+            used = conn.execute(
+                "SELECT COALESCE(SUM(calls), 0) FROM quota_usage WHERE period = ? AND bucket = ?",
+                (window, bucket),
+            ).fetchone()[0]
+            if used + cost > _allowed(window, priority):
+                conn.execute("ROLLBACK")
+                return window, (bucket + 1) * WINDOWS[window] - now
+
+        for window, bucket in buckets.items():
+            conn.execute(
+                "INSERT INTO quota_usage (period, bucket, priority, calls) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (period, bucket, priority) DO UPDATE SET calls = calls + excluded.calls",
+                (window, bucket, priority, cost),
+            )
+            # Seules la fenêtre courante et la précédente sont conservées
+            conn.execute("DELETE FROM quota_usage WHERE period = ? AND bucket < ?", (window, bucket - 1))
+        conn.execute("COMMIT")
+        return None, 0.0
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def acquire(priority: str = "live", cost: int = 1, max_wait: float | None = None,
+            path: Path | None = None):
+    """
+    Réserve `cost` appels pour `priority` avant une requête Open-Meteo.
+    Attend la fenêtre suivante si besoin (au plus `max_wait`, MAX_WAIT par
+    défaut), sinon lève QuotaExceeded.
+    """
+    if priority not in RESERVE:
+        raise ValueError(f"Priorité inconnue : {priority}")
+    if not any(LIMITS.values()):
+        return
+
+    max_wait = MAX_WAIT[priority] if max_wait is None else max_wait
+    deadline = time.monotonic() + max_wait
+    conn = connect_quota(path)
+    try:
+        while True:
+            window, wait = try_acquire(conn, priority, cost)
+            if window is None:
+                incr("quota_calls_total", cost, priority=priority)
+                return
+
+            if time.monotonic() + wait > deadline:
+                incr("quota_denied_total", priority=priority, window=window)
+                log_event(_log, "quota_denied", logging.WARNING,
+                          priority=priority, window=window, retry_after=round(wait, 1))
+                raise QuotaExceeded(priority, window, wait)
+
+            # Léger décalage : les processus en attente ne repartent pas tous ensemble
+            wait += random.uniform(0, 1)
+            log_event(_log, "quota_wait", priority=priority, window=window, wait_s=round(wait, 1))
+            incr("quota_wait_seconds_total", wait, priority=priority)
+            time.sleep(wait)
+    finally:
+        conn.close()
+
+
+# ---------------------------------------------------------
+# CONSULTATION
+# ---------------------------------------------------------
+def remaining(priority: str = "live", path: Path | None = None) -> dict:
+    """
+    Budget restant pour `priority` dans chaque fenêtre contrôlée :
+    {fenêtre: {"limit", "used", "available", "resets_in"}}.
+    """
+    now = time.time()
+    conn = connect_quota(path)
+    try:
+        out = {}
+        for window, seconds in WINDOWS.items():
+            if not LIMITS[window]:
+                continue
+            bucket = int(now // seconds)
+            used = conn.execute(
+                "SELECT COALESCE(SUM(calls), 0) FROM quota_usage WHERE period = ? AND bucket = ?",
+                (window, bucket),
+            ).fetchone()[0]
+            out[window] = {
+                "limit": LIMITS[window],
+                "used": used,
+                "available": max(0, int(_allowed(window, priority)) - used),
+                "resets_in": round((bucket + 1) * seconds - now),
+            }
+        return out
+    finally:
+        conn.close()
+
+
+def usage(path: Path | None = None) -> list[dict]:
+    """Appels de la fenêtre courante par fenêtre × priorité."""
+    now = time.time()
+    conn = connect_quota(path)
+    try:
+        rows = []
+        for window, seconds in WINDOWS.items():
+            rows += [
+                {"window": window, "priority": p, "calls": n, "limit": LIMITS[window]}
+                for p, n in conn.execute(
+                    "SELECT priority, calls FROM quota_usage WHERE period = ? AND bucket = ? ORDER BY priority",
+                    (window, int(now // seconds)),
+                )
+            ]
+        return rows
+    finally:
+        conn.close()
@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+# ../modules/rolling.py
+# Cumuls glissants et cumuls annuels de l'archive, cache prolongé jour par jour
+
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import date, timedelta
+
+import polars as pl
+
+from modules.derived import cooling_degree_days, mean_temp
+from modules.metrics import incr, span
+from modules.storage import count_archive_multi, read_archive_multi
+
+
+# ---------------------------------------------------------
+# FENÊTRES
+# ---------------------------------------------------------
+RAIN_WINDOWS = (7, 30, 90)   # cumuls de pluie (jours)
+TEMP_WINDOWS = (7, 30)       # moyennes mobiles de température (jours)
+
+RAW_COLUMNS = ["id_ville", "date", "temp_min", "temp_max", "precipitation"]
+
+
+def rolling_columns(rain_windows=RAIN_WINDOWS, temp_windows=TEMP_WINDOWS) -> list[str]:
+    return [
+        "id_ville", "date", "precipitation", "temp_moy",
+        *[f"pluie_{n}j" for n in rain_windows],
+        *[f"temp_moy_{n}j" for n in temp_windows],
+        "pluie_annee", "dj_clim_annee",
+    ]
+
+
+# ---------------------------------------------------------
+# CALCUL (Polars lazy, toutes les villes en une passe)
+# ---------------------------------------------------------
+def _prepare(frame: pl.DataFrame | pl.LazyFrame) -> pl.LazyFrame:
+    lf = frame.lazy()
+    if lf.collect_schema()["date"] == pl.String:
+        lf = lf.with_columns(pl.col("date").str.to_date())
+    return lf.unique(["id_ville", "date"], keep="first").sort("id_ville", "date")
+
+
+def _window_columns(lf: pl.LazyFrame, rain_windows, temp_windows) -> pl.LazyFrame:
+    """
+    Fenêtres calendaires (« 30d » = les 30 derniers jours, jour courant
+    inclus) : un jour absent de l'archive ne décale pas la fenêtre.
+    """
+    return lf.with_columns(mean_temp()).with_columns(
+        *[pl.col("precipitation").rolling_sum_by("date", f"{n}d").over("id_ville").alias(f"pluie_{n}j")
+          for n in rain_windows],
+        *[pl.col("temp_moy").rolling_mean_by("date", f"{n}d").over("id_ville").alias(f"temp_moy_{n}j")
+          for n in temp_windows],
+    )
+
+
+def _ytd_columns(lf: pl.LazyFrame) -> pl.LazyFrame:
+    """Cumuls depuis le 1er janvier (pluie, degrés-jours de climatisation)."""
+    year = ["id_ville", pl.col("date").dt.year()]
+    return lf.with_columns(
+        pl.col("precipitation").fill_null(0).cum_sum().over(year).alias("pluie_annee"),
+        cooling_degree_days().fill_null(0).cum_sum().over(year).alias("dj_clim_annee"),
+    )
+
+
+def rolling_stats(frame: pl.DataFrame | pl.LazyFrame, rain_windows=RAIN_WINDOWS,
+                  temp_windows=TEMP_WINDOWS) -> pl.LazyFrame:
+    """
+    Cumuls glissants de pluie, moyennes mobiles de température et cumuls
+    annuels, par ville (fenêtres groupées .over("id_ville")).
+    Les premiers jours du frame ont des fenêtres incomplètes : charger
+    l'archive depuis warmup_start() pour des valeurs exactes dès `start`.
+    """
+    lf = _window_columns(_prepare(frame), rain_windows, temp_windows)
+    return _ytd_columns(lf).select(rolling_columns(rain_windows, temp_windows))
+
+
+def warmup_start(start: date, rain_windows=RAIN_WINDOWS, temp_windows=TEMP_WINDOWS) -> date:
+    """Premier jour à lire : la plus longue fenêtre et le 1er janvier doivent être couverts."""
+    span_days = max((*rain_windows, *temp_windows))
+    return min(start - timedelta(days=span_days - 1), date(start.year, 1, 1))
+
+
+# ---------------------------------------------------------
+# CACHE INCRÉMENTAL
+# ---------------------------------------------------------
+@dataclass(frozen=True)
+class _Entry:
+    frame: pl.DataFrame   # résultat depuis `start`, trié par ville puis date
+    tail: pl.DataFrame    # lignes brutes des derniers jours (contexte des fenêtres)
+    last: date            # dernier jour présent dans l'archive lue
+    rows: int             # lignes d'archive lues sur [warmup, last] (doublons inclus)
+
+
+class RollingCache:
+    """
+    Résultats de rolling_stats() par (villes, fenêtres, début), partagés par
+    toutes les sessions du processus.
+
+    Quand la fin demandée dépasse le dernier jour couvert, seuls les jours
+    nouveaux sont lus et calculés, avec les derniers jours déjà connus pour
+    compléter les fenêtres et le cumul annuel repris là où il s'était
+    arrêté. À chaque lecture, le nombre de lignes d'archive déjà couvertes
+    est recompté : s'il a changé (trou comblé, jours rechargés), l'entrée
+    est recalculée en entier, de même qu'une entrée encore vide depuis
+    `start`. Une valeur corrigée sans changement du nombre de lignes n'est
+    pas détectée : appeler invalidate().
+
+    Comme pour FrameCache, les frames renvoyés sont partagés : ne pas les
+    modifier en place.
+    """
+
+    def __init__(self, max_entries: int = 32):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[tuple, _Entry] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.extends = 0
+        self.rebuilds = 0
+
+    # -----------------------------
+    # API
+    # -----------------------------
+    def get(self, ville_ids: list[int], start: str, end: str,
+            rain_windows=RAIN_WINDOWS, temp_windows=TEMP_WINDOWS) -> pl.DataFrame:
+        """Statistiques glissantes des villes sur [start, end] (rolling_columns())."""
+        key = (tuple(sorted(ville_ids)), tuple(rain_windows), tuple(temp_windows), start)
+        end_day = date.fromisoformat(end)
+
+        # Sérialisé : les sessions simultanées trouvent l'entrée déjà à jour
+        with self._lock:
+            entry = self._entries.get(key)
+            with span("rolling_cache", villes=len(ville_ids)) as s:
+                # Entrée vide depuis `start` : les jours à lire peuvent précéder
+                # `start` et aucun cumul annuel n'est à reprendre, on relit tout
+                stale = entry is not None and end_day > entry.last and entry.frame.is_empty()
+                if entry is None or stale or not self._valid(key, entry):
+                    entry = self._rebuild(key, end_day)
+                    s.set(result="rebuild")
+                else:
+                    if end_day > entry.last:
+                        entry, added = self._extend(key, entry, end_day)
+                    else:
+                        added = 0
+                    result = "extend" if added else "hit"
+                    if added:
+                        self.extends += 1
+                    else:
+                        self.hits += 1
+                    incr("rolling_cache_total", result=result)
+                    s.set(result=result, rows=added)
+            self._store(key, entry)
+
+        if end_day >= entry.last:
+            return entry.frame
+        return entry.frame.filter(pl.col("date") <= end_day)
+
+    def invalidate(self, predicate=None):
+        """Supprime les entrées dont la clé satisfait predicate(key) (toutes si None)."""
+        with self._lock:
+            for key in [k for k in self._entries if predicate is None or predicate(k)]:
+                del self._entries[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": sum(int(e.frame.estimated_size()) for e in self._entries.values()),
+                "hits": self.hits,
+                "extends": self.extends,
+                "rebuilds": self.rebuilds,
+            }
+
+    # -----------------------------
+    # Interne
+    # -----------------------------
+    @staticmethod
+    def _windows(key: tuple) -> tuple:
+        return key[1], key[2]
+
+    def _warmup(self, key: tuple) -> date:
+        return warmup_start(date.fromisoformat(key[3]), *self._windows(key))
+
+    def _valid(self, key: tuple, entry: _Entry) -> bool:
+        rows = count_archive_multi(list(key[0]), self._warmup(key).isoformat(), entry.last.isoformat())
+        return rows == entry.rows
+
+    def _rebuild(self, key: tuple, end_day: date) -> _Entry:
+        ville_ids, start = list(key[0]), date.fromisoformat(key[3])
+        warmup = self._warmup(key)
+        raw = read_archive_multi(ville_ids, warmup.isoformat(), end_day.isoformat()).select(RAW_COLUMNS)
+        read = raw.height
+        frame = (
+            rolling_stats(raw, *self._windows(key))
+            .filter(pl.col("date") >= start)
+            .collect()
+        )
+        self.rebuilds += 1
+        incr("rolling_cache_total", result="rebuild")
+        raw = _prepare(raw).collect()
+        last = raw["date"].max() if raw.height else warmup - timedelta(days=1)
+        return _Entry(frame, self._tail(raw, last, key), last, read)
+
+    def _extend(self, key: tuple, entry: _Entry, end_day: date) -> tuple[_Entry, int]:
+        """Calcule les jours postérieurs à entry.last ; renvoie (entrée, lignes ajoutées)."""
+        ville_ids = list(key[0])
+        new = read_archive_multi(
+            ville_ids, (entry.last + timedelta(days=1)).isoformat(), end_day.isoformat()
+        ).select(RAW_COLUMNS)
+        if new.is_empty():
+            return entry, 0
+
+        read = new.height
+        new = _prepare(new).collect()
+        context = pl.concat([entry.tail, new]).sort("id_ville", "date")
+
+        # Fenêtres : calculées sur contexte + jours nouveaux, gardées pour les nouveaux seuls
+        added = (
+            _window_columns(context.lazy(), *self._windows(key))
+            .filter(pl.col("date") > entry.last)
+        )
+        # Cumul annuel : repris depuis la dernière valeur connue de la même année
+        carry = (
+            entry.frame.group_by("id_ville").agg(pl.all().sort_by("date").last())
+            .select(
+                "id_ville",
+                pl.col("date").dt.year().alias("annee"),
+                pl.col("pluie_annee").alias("pluie_report"),
+                pl.col("dj_clim_annee").alias("dj_clim_report"),
+            )
+        )
+        added = (
+            _ytd_columns(added)
+            .with_columns(pl.col("date").dt.year().alias("annee"))
+            .join(carry.lazy(), on=["id_ville", "annee"], how="left")
+            .with_columns(
+                pl.col("pluie_annee") + pl.col("pluie_report").fill_null(0),
+                pl.col("dj_clim_annee") + pl.col("dj_clim_report").fill_null(0),
+            )
+            .select(rolling_columns(*self._windows(key)))
+            .collect()
+        )
+
+        frame = pl.concat([entry.frame, added.cast(entry.frame.schema)]).sort("id_ville", "date")
+        last = new["date"].max()
+        return _Entry(frame, self._tail(context, last, key), last, entry.rows + read), added.height
+
+    def _tail(self, raw: pl.DataFrame, last: date, key: tuple) -> pl.DataFrame:
+        span_days = max((*key[1], *key[2]))
+        return raw.filter(pl.col("date") > last - timedelta(days=span_days))
+
+    def _store(self, key: tuple, entry: _Entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+ROLLING_CACHE = RollingCache()
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+# ../modules/singleflight.py
+# Regroupement des requêtes identiques simultanées (« single-flight »)
+
+import threading
+
+from modules.logs import get_logger, log_cache
+from modules.metrics import incr, observe_count
+
+_log = get_logger("singleflight")
+
+
+class _Flight:
+    __slots__ = ("done", "result", "error", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: BaseException | None = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Un seul appel en vol par clé : les appelants qui arrivent pendant qu'un
+    appel identique est en cours attendent son résultat au lieu de relancer
+    la requête (Open-Meteo ou SQL). Rien n'est conservé une fois l'appel
+    terminé — ce n'est pas un cache.
+
+    Le résultat est partagé tel quel entre les appelants (même objet) :
+    il ne doit pas être modifié en place. Une exception est propagée à
+    tous les appelants du même vol.
+
+    Statistiques (`stats()`) :
+      - flights : appels réellement exécutés
+      - shared  : appelants servis par le vol d'un autre (appels évités)
+      - max_waiters : plus grand nombre d'appelants sur un même vol
+    Chaque vol terminé ajoute aussi son nombre d'appelants regroupés à
+    l'histogramme `singleflight_waiters` (metrics.distributions()).
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._flights: dict = {}
+        self._lock = threading.Lock()
+        self.flights = 0
+        self.shared = 0
+        self.max_waiters = 0
+
+    def do(self, key, fn):
+        """Renvoie fn(), ou le résultat du vol en cours pour la même clé."""
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.flights += 1
+            else:
+                flight.waiters += 1
+                self.shared += 1
+
+        if not leader:
+            flight.done.wait()
+            incr("singleflight_shared_total", group=self.name)
+            log_cache(_log, f"singleflight:{self.name}", "shared", key=repr(key))
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = fn()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+                self.max_waiters = max(self.max_waiters, flight.waiters)
+            flight.done.set()
+            incr("singleflight_flights_total", group=self.name)
+            observe_count("singleflight_waiters", flight.waiters, group=self.name)
+        return flight.result
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._flights)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "group": self.name,
+                "in_flight": len(self._flights),
+                "flights": self.flights,
+                "shared": self.shared,
+                "max_waiters": self.max_waiters,
+            }
+
+
+# ---------------------------------------------------------
+# GROUPES DU PROCESSUS
+# ---------------------------------------------------------
+LIVE_FLIGHTS = SingleFlight("live")        # get_live_weather / get_city_current
+ARCHIVE_FLIGHTS = SingleFlight("archive")  # chargeurs du cache de frames
+
+
+def flight_stats() -> list[dict]:
+    return [LIVE_FLIGHTS.stats(), ARCHIVE_FLIGHTS.stats()]
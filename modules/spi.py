@@ -0,0 +1,349 @@
+# -*- coding: utf-8 -*-
+# ../modules/spi.py
+# Indice de précipitations normalisé (SPI) : ajustement gamma vectorisé, mise à jour incrémentale
+
+import math
+from datetime import date, datetime, timezone
+
+import numpy as np
+import polars as pl
+
+from modules.derived import derived_rollup
+from modules.metrics import span
+from modules.storage import (
+    SPI_COLUMNS,
+    read_observations,
+    read_spi_params,
+    read_spi_values,
+    read_villes,
+    replace_spi,
+    write_spi_values,
+)
+
+
+# ---------------------------------------------------------
+# PARAMÈTRES
+# ---------------------------------------------------------
+SPI_SCALES = (1, 3, 6, 12)   # cumuls sur 1, 3, 6, 12 mois
+MIN_MONTH_COVERAGE = 0.9     # part minimale de jours présents pour un cumul mensuel
+MIN_FIT_SAMPLES = 10         # cumuls non nuls minimum pour ajuster une loi gamma
+SPI_LIMIT = 3.09             # |SPI| borné (probabilités 0,1 % / 99,9 %)
+UPDATE_MONTHS = 3            # mois recalculés par la mise à jour quotidienne
+
+# Classes de sécheresse / humidité (McKee et al. 1993, guide OMM 2012)
+SPI_CLASSES = [
+    (2.0, "Extrêmement humide"),
+    (1.5, "Très humide"),
+    (1.0, "Modérément humide"),
+    (-1.0, "Proche de la normale"),
+    (-1.5, "Modérément sec"),
+    (-2.0, "Très sec"),
+]
+
+
+def spi_category(col: str = "spi") -> pl.Expr:
+    expr = pl.when(pl.col(col).is_null()).then(None)
+    for bound, label in SPI_CLASSES:
+        expr = expr.when(pl.col(col) >= bound).then(pl.lit(label))
+    return expr.otherwise(pl.lit("Extrêmement sec")).alias("classe")
+
+
+# ---------------------------------------------------------
+# CUMULS MENSUELS
+# ---------------------------------------------------------
+def monthly_totals(obs: pl.DataFrame | pl.LazyFrame, today: date | None = None) -> pl.LazyFrame:
+    """
+    Pluie mensuelle par ville (id_ville, mois, precipitation). Un mois
+    en cours ou trop incomplet (< MIN_MONTH_COVERAGE des jours) vaut null :
+    les cumuls qui le contiennent ne sont pas calculés.
+    """
+    today = today or date.today()
+    mois = pl.col("periode").str.to_date()
+    complete = (
+        (pl.col("jours") >= MIN_MONTH_COVERAGE * mois.dt.month_end().dt.day())
+        & (mois.dt.month_end() < today)
+    )
+    return derived_rollup(obs, "1mo").select(
+        "id_ville",
+        mois.alias("mois"),
+        pl.when(complete).then(pl.col("precipitation")).alias("precipitation"),
+    )
+
+
+def accumulations(monthly: pl.LazyFrame, scales=SPI_SCALES) -> pl.LazyFrame:
+    """
+    Cumuls glissants sur `scale` mois consécutifs, toutes échelles et villes
+    en une passe : (id_ville, scale, mois, month, cumul). Seules les fenêtres
+    complètes (scale mois valides) sont gardées.
+    """
+    monthly = monthly.sort("id_ville", "mois")
+    valid = pl.col("precipitation").is_not_null().cast(pl.Int32)
+    frames = [
+        monthly.with_columns(
+            pl.lit(k, dtype=pl.Int64).alias("scale"),
+            pl.col("precipitation").rolling_sum_by("mois", f"{k}mo").over("id_ville").alias("cumul"),
+            valid.rolling_sum_by("mois", f"{k}mo").over("id_ville").alias("n"),
+        ).filter(pl.col("n") == k)
+        for k in scales
+    ]
+    return pl.concat(frames).select(
+        "id_ville", "scale", "mois",
+        pl.col("mois").dt.month().cast(pl.Int64).alias("month"),
+        # Les sommes glissantes laissent des résidus (1e-15) : un cumul nul doit rester nul
+        pl.col("cumul").round(2),
+    )
+
+
+# ---------------------------------------------------------
+# AJUSTEMENT (une agrégation Polars pour toutes les lois)
+# ---------------------------------------------------------
+def fit_params(acc: pl.LazyFrame) -> pl.LazyFrame:
+    """
+    Loi gamma par ville × échelle × mois calendaire, estimée par
+    l'approximation du maximum de vraisemblance de Thom sur les cumuls non
+    nuls ; q = part des cumuls nuls (loi mixte). alpha et beta (forme,
+    échelle) sont null si l'échantillon est trop petit ou dégénéré.
+    """
+    x = pl.col("cumul")
+    pos = x.filter(x > 0)
+    a_stat = pl.col("moy").log() - pl.col("moy_log")
+    alpha = (1 + (1 + 4 * a_stat / 3).sqrt()) / (4 * a_stat)
+    fit_ok = (pl.col("n_pos") >= MIN_FIT_SAMPLES) & (a_stat > 0)
+
+    return (
+        acc.group_by("id_ville", "scale", "month")
+        .agg(
+            pl.len().alias("n"),
+            pos.len().alias("n_pos"),
+            pos.mean().alias("moy"),
+            pos.log().mean().alias("moy_log"),
+            pl.col("mois").min().alias("debut"),
+            pl.col("mois").max().alias("fin"),
+        )
+        .with_columns(
+            ((pl.col("n") - pl.col("n_pos")) / pl.col("n")).alias("q"),
+            pl.when(fit_ok).then(alpha).alias("alpha"),
+        )
+        .with_columns((pl.col("moy") / pl.col("alpha")).alias("beta"))
+    )
+
+
+# ---------------------------------------------------------
+# LOI GAMMA ET LOI NORMALE (numpy, sans boucle sur les lignes)
+# ---------------------------------------------------------
+_EPS = 1e-12
+_FPMIN = 1e-300
+_MAX_ITER = 500
+
+
+def _lgamma(a: np.ndarray) -> np.ndarray:
+    return np.frompyfunc(math.lgamma, 1, 1)(a).astype(float)
+
+
+def _gamma_series(a: np.ndarray, z: np.ndarray) -> np.ndarray:
+    """P(a, z) par la série (z < a + 1)."""
+    ap = a.copy()
+    term = 1.0 / a
+    total = term.copy()
+    for _ in range(_MAX_ITER):
+        ap += 1
+        term *= z / ap
+        total += term
+        if np.all(np.abs(term) < np.abs(total) * _EPS):
+            break
+    return total * np.exp(-z + a * np.log(z) - _lgamma(a))
+
+
+def _gamma_cf(a: np.ndarray, z: np.ndarray) -> np.ndarray:
+    """Q(a, z) = 1 − P(a, z) par fraction continue (Lentz modifié, z ≥ a + 1)."""
+    b = z + 1 - a
+    c = np.full_like(z, 1 / _FPMIN)
+    d = 1 / b
+    h = d.copy()
+    for i in range(1, _MAX_ITER):
+        an = -i * (i - a)
+        b += 2
+        d = an * d + b
+        d = np.where(np.abs(d) < _FPMIN, _FPMIN, d)
+        c = b + an / c
+        c = np.where(np.abs(c) < _FPMIN, _FPMIN, c)
+        d = 1 / d
+        delta = d * c
+        h *= delta
+        if np.all(np.abs(delta - 1) < _EPS):
+            break
+    return np.exp(-z + a * np.log(z) - _lgamma(a)) * h
+
+
+def gamma_cdf(x, alpha, beta) -> np.ndarray:
+    """
+    Fonction de répartition gamma (forme alpha, échelle beta) : fonction
+    gamma incomplète régularisée P(alpha, x / beta). NaN si un paramètre
+    manque.
+    """
+    x, alpha, beta = np.broadcast_arrays(*(np.asarray(v, dtype=float) for v in (x, alpha, beta)))
+    out = np.full(x.shape, np.nan)
+    ok = np.isfinite(x) & np.isfinite(alpha) & np.isfinite(beta) & (alpha > 0) & (beta > 0)
+    z = np.where(ok, np.maximum(x, 0) / np.where(ok, beta, 1), 0)
+
+    out[ok & (z == 0)] = 0.0
+    series = ok & (z > 0) & (z < alpha + 1)
+    out[series] = _gamma_series(alpha[series], z[series])
+    cf = ok & (z >= alpha + 1)
+    out[cf] = 1 - _gamma_cf(alpha[cf], z[cf])
+    return out
+
+
+# Approximation rationnelle de Acklam (erreur relative < 1.2e-9)
+_A = (-3.969683028665376e+01, 2.209460984245205e+02, -2.759285104469687e+02,
+      1.383577518672690e+02, -3.066479806614716e+01, 2.506628277459239e+00)
+_B = (-5.447609879822406e+01, 1.615858368580409e+02, -1.556989798598866e+02,
+      6.680131188771972e+01, -1.328068155288572e+01)
+_C = (-7.784894002430293e-03, -3.223964580411365e-01, -2.400758277161838e+00,
+      -2.549732539343734e+00, 4.374664141464968e+00, 2.938163982698783e+00)
+_D = (7.784695709041462e-03, 3.224671290700398e-01, 2.445134137142996e+00,
+      3.754408661907416e+00)
+_P_LOW = 0.02425
+
+
+def _poly(coefs, x):
+    out = np.zeros_like(x)
+    for c in coefs:
+        out = out * x + c
+    return out
+
+
+def norm_ppf(p) -> np.ndarray:
+    """Quantile de la loi normale centrée réduite (NaN hors de ]0, 1[)."""
+    p = np.asarray(p, dtype=float)
+    out = np.full(p.shape, np.nan)
+
+    low = (p > 0) & (p < _P_LOW)
+    q = np.sqrt(-2 * np.log(p[low]))
+    out[low] = _poly(_C, q) / (_poly(_D, q) * q + 1)
+
+    mid = (p >= _P_LOW) & (p <= 1 - _P_LOW)
+    q = p[mid] - 0.5
+    r = q * q
+    out[mid] = _poly(_A, r) * q / (_poly(_B, r) * r + 1)
+
+    high = (p > 1 - _P_LOW) & (p < 1)
+    q = np.sqrt(-2 * np.log(1 - p[high]))
+    out[high] = -_poly(_C, q) / (_poly(_D, q) * q + 1)
+    return out
+
+
+# ---------------------------------------------------------
+# CALCUL DU SPI
+# ---------------------------------------------------------
+def spi_frame(acc: pl.DataFrame, params: pl.DataFrame) -> pl.DataFrame:
+    """
+    SPI des cumuls `acc` avec les paramètres `params` :
+    H = q + (1 − q)·G(cumul), puis SPI = Φ⁻¹(H), borné à ±SPI_LIMIT.
+    Null si la loi du mois n'a pas pu être ajustée.
+    """
+    df = acc.join(
+        params.select("id_ville", "scale", "month", "q", "alpha", "beta"),
+        on=["id_ville", "scale", "month"],
+        how="left",
+    )
+    q = df["q"].fill_null(np.nan).to_numpy()
+    h = q + (1 - q) * gamma_cdf(
+        df["cumul"].to_numpy(),
+        df["alpha"].fill_null(np.nan).to_numpy(),
+        df["beta"].fill_null(np.nan).to_numpy(),
+    )
+    spi = np.clip(norm_ppf(np.clip(h, _EPS, 1 - _EPS)), -SPI_LIMIT, SPI_LIMIT)
+
+    return df.with_columns(
+        pl.col("mois").dt.strftime("%Y-%m").alias("periode"),
+        pl.Series("spi", spi).fill_nan(None),
+    ).select(SPI_COLUMNS)
+
+
+def fit_spi(ref_start: int | None = None, ref_end: int | None = None,
+            scales=SPI_SCALES, today: date | None = None) -> tuple[int, int]:
+    """
+    Ajustement complet (tâche batch) : cumuls de toute l'archive, lois gamma
+    sur les années de référence [ref_start, ref_end] (toutes par défaut ;
+    l'OMM recommande 30 ans), puis SPI de tout l'historique.
+    Remplace spi_params et spi_values. Renvoie (lois ajustées, valeurs SPI).
+    """
+    with span("spi_fit") as s:
+        obs = read_observations("1900-01-01", "2100-12-31")
+        if obs.is_empty():
+            s.set(params=0, values=0)
+            return 0, 0
+
+        acc = accumulations(monthly_totals(obs, today), scales)
+        year = pl.col("mois").dt.year()
+        ref = acc.filter(
+            (year >= (ref_start or 0)) & (year <= (ref_end or 9999))
+        )
+        params = fit_params(ref).collect().with_columns(
+            pl.col("debut").dt.strftime("%Y-%m").alias("ref_start"),
+            pl.col("fin").dt.strftime("%Y-%m").alias("ref_end"),
+            pl.lit(datetime.now(timezone.utc).isoformat(timespec="seconds")).alias("fitted_at"),
+        )
+        values = spi_frame(acc.collect(), params)
+        replace_spi(params, values)
+
+        fitted = int(params["alpha"].is_not_null().sum())
+        s.set(params=fitted, values=values.height)
+        return fitted, values.height
+
+
+def _month_index(d: date) -> int:
+    return d.year * 12 + d.month - 1
+
+
+def update_spi(today: date | None = None, months: int = UPDATE_MONTHS) -> int:
+    """
+    Mise à jour quotidienne : SPI des `months` derniers mois complets à
+    partir des paramètres enregistrés, sans réajustement. Seuls les jours
+    nécessaires aux plus longues fenêtres sont lus. Renvoie le nombre de
+    valeurs écrites (0 si aucun ajustement n'a encore été fait).
+    """
+    with span("spi_update") as s:
+        params = read_spi_params()
+        if params.is_empty():
+            s.set(values=0)
+            return 0
+
+        today = today or date.today()
+        scales = sorted(params["scale"].unique().to_list())
+        first = _month_index(today) - months - max(scales) + 1
+        start = date(first // 12, first % 12 + 1, 1)
+
+        obs = read_observations(start.isoformat(), today.isoformat())
+        if obs.is_empty():
+            s.set(values=0)
+            return 0
+
+        acc = accumulations(monthly_totals(obs, today), scales).collect()
+        recent = _month_index(today) - months
+        acc = acc.filter(
+            pl.col("mois").dt.year() * 12 + pl.col("mois").dt.month() - 1 >= recent
+        )
+        if acc.is_empty():
+            s.set(values=0)
+            return 0
+
+        written = write_spi_values(spi_frame(acc, params))
+        s.set(values=written)
+        return written
+
+
+# ---------------------------------------------------------
+# CONSULTATION
+# ---------------------------------------------------------
+def spi_table(scale: int | None = None, ville_id: int | None = None) -> pl.DataFrame:
+    """Valeurs SPI avec nom de ville et classe (sec / normal / humide)."""
+    return (
+        read_spi_values(scale, ville_id)
+        .cast({"id_ville": pl.Int64, "scale": pl.Int64, "periode": pl.String,
+               "cumul": pl.Float64, "spi": pl.Float64})
+        .join(read_villes().select(pl.col("id").alias("id_ville"), "ville"), on="id_ville", how="left")
+        .with_columns(spi_category())
+        .select("ville", "id_ville", "scale", "periode", "cumul", "spi", "classe")
+    )
@@ -1,28 +1,206 @@
 # -*- coding: utf-8 -*-
 import datetime
+import hashlib
+import itertools
+import json
+import logging
+import os
 import sqlite3
+import threading
 import time
 from pathlib import Path
 
 import polars as pl
-from modules.meteo import get_meteo_data
+from modules.logs import get_logger, log_event
+from modules.meteo import get_meteo_data, iter_meteo_hourly, HOURLY_VARIABLES
+from modules.metrics import span
 from modules.utils import load_yaml
 
-DB_PATH = Path("data/meteo_haiti.sqlite")
+# METEO_DB_PATH permet de pointer vers une base de test (charge, benchmarks)
+DB_PATH = Path(os.environ.get("METEO_DB_PATH", "data/meteo_haiti.sqlite"))
+
+# Requêtes lentes : au-delà du seuil, le plan (EXPLAIN QUERY PLAN) est
+# capturé et ajouté au journal (une ligne JSON par requête, cf. scripts/slow_queries.py)
+SLOW_QUERY_MS = float(os.environ.get("METEO_SLOW_QUERY_MS", 100))
+SLOW_QUERY_LOG = Path(os.environ.get("METEO_SLOW_QUERY_LOG", "data/slow_queries.jsonl"))
+
+_log = get_logger("storage")
+_slow_lock = threading.Lock()
 
 
 # ---------------------------------------------------------
 # CONNEXION
 # ---------------------------------------------------------
-def connect_db():
-    return sqlite3.connect(DB_PATH)
+class _TimedCursor(sqlite3.Cursor):
+    """Curseur dont chaque instruction passe par le journal des requêtes lentes."""
+
+    def execute(self, sql, params=()):
+        t0 = time.perf_counter()
+        super().execute(sql, params)
+        check_slow(self.connection.query, sql, params,
+                   (time.perf_counter() - t0) * 1000, self.rowcount, self.connection)
+        return self
+
+    def executemany(self, sql, seq_of_params):
+        # Premier jeu de paramètres gardé pour EXPLAIN (seq peut être un générateur)
+        rows = iter(seq_of_params)
+        first = next(rows, None)
+        if first is None:
+            return super().executemany(sql, [])
+        t0 = time.perf_counter()
+        super().executemany(sql, itertools.chain([first], rows))
+        check_slow(self.connection.query, sql, first,
+                   (time.perf_counter() - t0) * 1000, self.rowcount, self.connection)
+        return self
+
+
+class TimedConnection(sqlite3.Connection):
+    """
+    Connexion mesurée : execute / executemany, sur la connexion ou un
+    curseur (to_sql, read_database…), passent par check_slow sous le
+    nom `query`. Seule l'exécution est chronométrée, pas la lecture des
+    lignes : les SELECT volumineux passent par query_df / query_one.
+    """
+
+    query = "sql"
+
+    def cursor(self, factory=_TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, params=()):
+        return self.cursor().execute(sql, params)
+
+    def executemany(self, sql, seq_of_params):
+        return self.cursor().executemany(sql, seq_of_params)
+
+
+def connect_db(query: str | None = None):
+    """
+    Connexion à la base. Avec `query`, la connexion est une TimedConnection :
+    chaque instruction lente est journalisée sous ce nom.
+    """
+    if query is None:
+        return sqlite3.connect(DB_PATH)
+    conn = sqlite3.connect(DB_PATH, factory=TimedConnection)
+    conn.query = query
+    return conn
+
+
+# ---------------------------------------------------------
+# REQUÊTES MESURÉES (span sql_query : durée + lignes)
+# ---------------------------------------------------------
+def query_df(name: str, sql: str, params=None) -> pl.DataFrame:
+    """SELECT → Polars DataFrame. `name` identifie la requête dans les métriques."""
+    with span("sql_query", query=name) as s:
+        conn = connect_db()
+        try:
+            df = pl.read_database(
+                sql,
+                connection=conn,
+                execute_options={"parameters": list(params)} if params else None,
+            )
+        finally:
+            conn.close()
+        s.set(rows=df.height)
+    check_slow(name, sql, params, s.duration_ms, df.height)
+    return df
+
+
+def query_one(name: str, sql: str, params=()) -> tuple | None:
+    """SELECT d'une seule ligne (agrégats, comptages)."""
+    with span("sql_query", query=name) as s:
+        conn = connect_db()
+        try:
+            row = conn.execute(sql, params).fetchone()
+        finally:
+            conn.close()
+        s.set(rows=0 if row is None else 1)
+    check_slow(name, sql, params, s.duration_ms, 0 if row is None else 1)
+    return row
+
+
+# ---------------------------------------------------------
+# JOURNAL DES REQUÊTES LENTES (EXPLAIN QUERY PLAN)
+# ---------------------------------------------------------
+def explain(sql: str, params=(), conn: sqlite3.Connection | None = None) -> list[str]:
+    """
+    Plan SQLite d'une requête (une ligne par nœud, indentée par profondeur).
+    `conn` : connexion où la requête a tourné (autre base, transaction en cours).
+    """
+    if conn is not None:
+        # Curseur brut : le plan lui-même ne passe pas par check_slow
+        rows = sqlite3.Cursor(conn).execute(f"EXPLAIN QUERY PLAN {sql}", params or ()).fetchall()
+    else:
+        conn = connect_db()
+        try:
+            rows = conn.execute(f"EXPLAIN QUERY PLAN {sql}", list(params or ())).fetchall()
+        finally:
+            conn.close()
+
+    depth = {0: -1}
+    lines = []
+    for node_id, parent, _, detail in rows:
+        depth[node_id] = depth.get(parent, -1) + 1
+        lines.append("  " * depth[node_id] + detail)
+    return lines
+
+
+def plan_warnings(plan: list[str]) -> list[str]:
+    """
+    Signale les nœuds coûteux d'un plan :
+      - SCAN <table> sans index → parcours complet de la table
+      - USE TEMP B-TREE        → tri / regroupement hors index
+    """
+    warnings = []
+    for line in plan:
+        detail = line.strip()
+        if detail.startswith("SCAN ") and " USING " not in detail:
+            warnings.append(f"full_scan: {detail[5:]}")
+        elif detail.startswith("USE TEMP B-TREE"):
+            warnings.append(f"temp_btree: {detail[len('USE TEMP B-TREE FOR '):]}")
+    return warnings
+
+
+def check_slow(name: str, sql: str, params, duration_ms: float, rows: int,
+               conn: sqlite3.Connection | None = None):
+    """
+    Au-delà de SLOW_QUERY_MS : plan (EXPLAIN sur `conn` si fournie), avertissements
+    et ligne JSON dans SLOW_QUERY_LOG.
+    """
+    if duration_ms < SLOW_QUERY_MS:
+        return
+
+    try:
+        plan = explain(sql, params, conn)
+    except sqlite3.Error as e:
+        plan = [f"<EXPLAIN impossible : {e}>"]
+    warnings = plan_warnings(plan)
+
+    record = {
+        "ts": datetime.datetime.now().isoformat(timespec="milliseconds"),
+        "query": name,
+        "duration_ms": round(duration_ms, 2),
+        "rows": rows,
+        "sql": " ".join(sql.split()),
+        "params": [p if isinstance(p, (int, float, str)) or p is None else str(p) for p in (params or ())],
+        "plan": plan,
+        "warnings": warnings,
+    }
+
+    log_event(_log, "slow_query", logging.WARNING, duration_ms=duration_ms,
+              query=name, rows=rows, warnings=warnings)
+
+    with _slow_lock:
+        SLOW_QUERY_LOG.parent.mkdir(parents=True, exist_ok=True)
+        with open(SLOW_QUERY_LOG, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
 
 
 # ---------------------------------------------------------
 # INITIALISATION DES TABLES
 # ---------------------------------------------------------
 def init_db():
-    conn = connect_db()
+    conn = connect_db("init_db")
     cur = conn.cursor()
 
     # Table villes
@@ -62,12 +240,158 @@ def init_db():
         );
     """)
 
+    # Dernière observation live par ville (une ligne par ville), tenue à jour
+    # dans la même transaction que meteo_live (insert_live_batch)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS meteo_latest (
+            ville TEXT PRIMARY KEY,
+            timestamp TEXT NOT NULL,
+            temperature REAL,
+            precipitation REAL,
+            vent REAL,
+            humidite REAL,
+            weather_code INTEGER,
+            updated_at TEXT NOT NULL
+        ) WITHOUT ROWID;
+    """)
+    # Première création : reprise de la dernière ligne de meteo_live par ville
+    if cur.execute("SELECT NOT EXISTS (SELECT 1 FROM meteo_latest)").fetchone()[0]:
+        cur.execute("""
+            INSERT OR REPLACE INTO meteo_latest
+                (ville, timestamp, temperature, precipitation, vent, updated_at)
+            SELECT l.ville, l.timestamp, l.temperature, l.precipitation, l.vent, datetime('now')
+            FROM meteo_live l
+            JOIN (SELECT ville, MAX(timestamp) AS ts FROM meteo_live GROUP BY ville) m
+              ON m.ville = l.ville AND m.ts = l.timestamp
+            WHERE l.timestamp IS NOT NULL
+        """)
+
+    # Catalogue de couverture de meteo_archive : une ligne par ville × année,
+    # tenue à jour par les chemins d'écriture (cf. refresh_coverage)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS archive_coverage (
+            id_ville INTEGER NOT NULL,
+            year INTEGER NOT NULL,
+            days_present INTEGER NOT NULL,
+            days_expected INTEGER NOT NULL,
+            days_missing INTEGER GENERATED ALWAYS AS (MAX(days_expected - days_present, 0)) VIRTUAL,
+            first_date TEXT,
+            last_date TEXT,
+            updated_at TEXT NOT NULL,
+            PRIMARY KEY (id_ville, year)
+        ) WITHOUT ROWID;
+    """)
+
+    # Cumuls des variables dérivées (modules/derived.py) par ville × période,
+    # matérialisés à la demande (scripts/derived.py)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS archive_rollup (
+            id_ville INTEGER NOT NULL,
+            every TEXT NOT NULL,
+            periode TEXT NOT NULL,
+            jours INTEGER NOT NULL,
+            temp_moy REAL,
+            amplitude REAL,
+            point_rosee REAL,
+            indice_chaleur_max REAL,
+            dj_clim REAL,
+            jours_pluie INTEGER,
+            precipitation REAL,
+            PRIMARY KEY (id_ville, every, periode)
+        ) WITHOUT ROWID;
+    """)
+
+    # SPI : paramètres gamma par ville × échelle × mois calendaire (ajustement
+    # complet, scripts/spi.py --fit) et valeurs mensuelles calculées avec eux
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS spi_params (
+            id_ville INTEGER NOT NULL,
+            scale INTEGER NOT NULL,
+            month INTEGER NOT NULL,
+            n INTEGER NOT NULL,
+            q REAL,
+            alpha REAL,
+            beta REAL,
+            ref_start TEXT NOT NULL,
+            ref_end TEXT NOT NULL,
+            fitted_at TEXT NOT NULL,
+            PRIMARY KEY (id_ville, scale, month)
+        ) WITHOUT ROWID;
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS spi_values (
+            id_ville INTEGER NOT NULL,
+            scale INTEGER NOT NULL,
+            periode TEXT NOT NULL,
+            cumul REAL,
+            spi REAL,
+            PRIMARY KEY (id_ville, scale, periode)
+        ) WITHOUT ROWID;
+    """)
+
+    # Table météo archive HORAIRE (compacte : clé (ville, ts epoch UTC), sans rowid)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS meteo_archive_hourly (
+            id_ville INTEGER NOT NULL,
+            ts INTEGER NOT NULL,
+            temperature REAL,
+            precipitation REAL,
+            humidite REAL,
+            vent REAL,
+            PRIMARY KEY (id_ville, ts)
+        ) WITHOUT ROWID;
+    """)
+
+    # Prévisions : une ligne par émission × échéance × variable
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS meteo_forecast (
+            id_ville INTEGER NOT NULL,
+            issued_at TEXT NOT NULL,
+            valid_date TEXT NOT NULL,
+            lead_days INTEGER NOT NULL,
+            variable TEXT NOT NULL,
+            value REAL,
+            PRIMARY KEY (id_ville, issued_at, valid_date, variable)
+        ) WITHOUT ROWID;
+    """)
+
+    # Vérification incrémentale : statistiques suffisantes + date vérifiée par ville
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS forecast_skill (
+            id_ville INTEGER NOT NULL,
+            variable TEXT NOT NULL,
+            lead_days INTEGER NOT NULL,
+            n INTEGER NOT NULL,
+            sum_err REAL NOT NULL,
+            sum_abs_err REAL NOT NULL,
+            sum_sq_err REAL NOT NULL,
+            PRIMARY KEY (id_ville, variable, lead_days)
+        ) WITHOUT ROWID;
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS forecast_skill_watermark (
+            id_ville INTEGER PRIMARY KEY,
+            verified_through TEXT NOT NULL
+        );
+    """)
+
     # Indexs pour accélérer Polars + SQLite
     cur.execute("CREATE INDEX IF NOT EXISTS idx_archive_ville_date ON meteo_archive (id_ville, date);")
     cur.execute("CREATE INDEX IF NOT EXISTS idx_archive_date ON meteo_archive (date);")
     cur.execute("CREATE INDEX IF NOT EXISTS idx_archive_ville ON meteo_archive (id_ville);")
 
+    # Historique live : WHERE ville = ? ORDER BY timestamp (load_history)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_live_ville_ts ON meteo_live (ville, timestamp);")
+
+    # Vérification : prévisions par date de validité
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_forecast_valid ON meteo_forecast (valid_date);")
+
     conn.commit()
+
+    # Première création du catalogue : reconstruit depuis l'archive existante
+    if cur.execute("SELECT NOT EXISTS (SELECT 1 FROM archive_coverage)").fetchone()[0]:
+        with conn:
+            _rebuild_coverage(conn)
     conn.close()
 
 
@@ -78,22 +402,26 @@ def sync_villes_from_yaml():
     config = load_yaml("data/config.yaml")
     yaml_villes = config["villes"]
 
-    conn = connect_db()
-    cur = conn.cursor()
+    with span("sql_query", query="sync_villes") as s:
+        conn = connect_db("sync_villes")
+        cur = conn.cursor()
 
-    # Récupérer les IDs déjà existants
-    cur.execute("SELECT id FROM villes")
-    existing_ids = {row[0] for row in cur.fetchall()}
+        # Récupérer les IDs déjà existants
+        cur.execute("SELECT id FROM villes")
+        existing_ids = {row[0] for row in cur.fetchall()}
 
-    for v in yaml_villes:
-        if v["id"] not in existing_ids:
-            cur.execute("""
-                INSERT INTO villes (id, nom, latitude, longitude)
-                VALUES (?, ?, ?, ?)
-            """, (v["id"], v["nom"], v["latitude"], v["longitude"]))
+        inserted = 0
+        for v in yaml_villes:
+            if v["id"] not in existing_ids:
+                cur.execute("""
+                    INSERT INTO villes (id, nom, latitude, longitude)
+                    VALUES (?, ?, ?, ?)
+                """, (v["id"], v["nom"], v["latitude"], v["longitude"]))
+                inserted += 1
 
-    conn.commit()
-    conn.close()
+        conn.commit()
+        conn.close()
+        s.set(rows=inserted)
 
     print("✔ Synchronisation de la table `villes` terminée.")
 
@@ -102,13 +430,10 @@ def sync_villes_from_yaml():
 # LECTURE DES VILLES (POLARS)
 # ---------------------------------------------------------
 def read_villes() -> pl.DataFrame:
-    conn = connect_db()
-    df = pl.read_database(
+    return query_df(
+        "read_villes",
         "SELECT id, nom AS ville, latitude, longitude FROM villes",
-        connection=conn
     )
-    conn.close()
-    return df
 
 
 # ---------------------------------------------------------
@@ -116,11 +441,22 @@ def read_villes() -> pl.DataFrame:
 # ---------------------------------------------------------
 def insert_dataframe(table: str, df: pl.DataFrame):
     """
-    Polars → SQLite (oblige conversion en pandas pour écrire).
+    Polars → SQLite (colonnes du frame, table existante), en une seule
+    transaction : pour meteo_archive, archive_coverage est mis à jour dans
+    la même (comme write_collected).
     """
-    conn = connect_db()
-    df.to_pandas().to_sql(table, conn, if_exists="append", index=False)
-    conn.close()
+    sql = (f"INSERT INTO {table} ({', '.join(df.columns)}) "
+           f"VALUES ({', '.join('?' * len(df.columns))})")
+    with span("sql_query", query=f"insert_{table}") as s:
+        conn = connect_db(f"insert_{table}")
+        try:
+            with conn:
+                conn.executemany(sql, df.iter_rows())
+                if table == "meteo_archive":
+                    _refresh_coverage(conn, _frame_cells(df))
+        finally:
+            conn.close()
+        s.set(rows=df.height)
 
 
 def insert_meteo_data(start_year: int, end_year: int, wait_seconds: float = 1.0):
@@ -150,32 +486,660 @@ def insert_meteo_data(start_year: int, end_year: int, wait_seconds: float = 1.0)
     print("\n✔ Données climatiques insérées dans `meteo_archive`")
 
 
+# ---------------------------------------------------------
+# LECTURE ARCHIVE (plages, bornes)
+# ---------------------------------------------------------
+def read_archive(ville_id: int, start: str, end: str) -> pl.DataFrame:
+    """Archive d'une ville sur [start, end], triée par date."""
+    return query_df(
+        "read_archive",
+        "SELECT date, temp_min, temp_max, humidite, precipitation, vent "
+        "FROM meteo_archive WHERE id_ville = ? AND date BETWEEN ? AND ? "
+        "ORDER BY date",
+        [ville_id, start, end],
+    )
+
+
+def read_date_bounds(ville_id: int) -> pl.DataFrame:
+    """Première et dernière date d'archive d'une ville (min_d, max_d), via le catalogue."""
+    return query_df(
+        "read_date_bounds",
+        "SELECT MIN(first_date) AS min_d, MAX(last_date) AS max_d "
+        "FROM archive_coverage WHERE id_ville = ? AND days_present > 0",
+        [ville_id],
+    )
+
+
+# ---------------------------------------------------------
+# CATALOGUE DE COUVERTURE (ville × année)
+# ---------------------------------------------------------
+COVERAGE_COLUMNS = ["id_ville", "year", "days_present", "days_expected", "days_missing",
+                    "first_date", "last_date", "updated_at"]
+
+
+def expected_days(year: int, today: datetime.date | None = None) -> int:
+    """Jours attendus pour une année : tous, ou jusqu'à hier pour l'année en cours."""
+    today = today or datetime.date.today()
+    start = datetime.date(year, 1, 1)
+    end = min(datetime.date(year, 12, 31), today - datetime.timedelta(days=1))
+    return max((end - start).days + 1, 0)
+
+
+def _frame_cells(df: pl.DataFrame) -> set[tuple[int, int]]:
+    """Cellules (ville, année) touchées par un frame d'archive journalière."""
+    if df.is_empty():
+        return set()
+    cells = df.select(
+        pl.col("id_ville").cast(pl.Int64),
+        pl.col("date").cast(pl.String).str.slice(0, 4).cast(pl.Int64).alias("year"),
+    ).unique()
+    return set(cells.iter_rows())
+
+
+def _range_cells(ville_id: int, start: str, end: str) -> set[tuple[int, int]]:
+    return {(ville_id, y) for y in range(int(start[:4]), int(end[:4]) + 1)}
+
+
+def _refresh_coverage(conn: sqlite3.Connection, cells: set[tuple[int, int]]):
+    """
+    Recalcule les cellules (ville, année) depuis meteo_archive, dans la
+    transaction de l'appelant (recherche par idx_archive_ville_date).
+    Les dates en double ne comptent qu'une fois.
+    """
+    conn.executemany(
+        """
+        INSERT INTO archive_coverage
+            (id_ville, year, days_present, days_expected, first_date, last_date, updated_at)
+        SELECT ?, ?, COUNT(DISTINCT date), ?, MIN(date), MAX(date), datetime('now')
+        FROM meteo_archive WHERE id_ville = ? AND date BETWEEN ? AND ?
+        ON CONFLICT (id_ville, year) DO UPDATE SET
+            days_present = excluded.days_present,
+            days_expected = excluded.days_expected,
+            first_date = excluded.first_date,
+            last_date = excluded.last_date,
+            updated_at = excluded.updated_at
+        """,
+        [
+            (v, y, expected_days(y), v, f"{y}-01-01", f"{y}-12-31")
+            for v, y in sorted(cells)
+        ],
+    )
+
+
+def _rebuild_coverage(conn: sqlite3.Connection):
+    cells = conn.execute(
+        "SELECT DISTINCT id_ville, CAST(substr(date, 1, 4) AS INTEGER) FROM meteo_archive "
+        "WHERE id_ville IS NOT NULL AND date IS NOT NULL"
+    ).fetchall()
+    conn.execute("DELETE FROM archive_coverage")
+    _refresh_coverage(conn, set(cells))
+
+
+def rebuild_coverage() -> int:
+    """Reconstruit tout le catalogue depuis meteo_archive ; renvoie le nombre de cellules."""
+    with span("sql_query", query="rebuild_coverage") as s:
+        conn = connect_db("rebuild_coverage")
+        try:
+            with conn:
+                _rebuild_coverage(conn)
+            n = conn.execute("SELECT COUNT(*) FROM archive_coverage").fetchone()[0]
+        finally:
+            conn.close()
+        s.set(rows=n)
+    return n
+
+
+def data_version() -> str:
+    """
+    Empreinte des données lues par les caches : catalogue archive_coverage
+    (mis à jour dans la transaction de chaque écriture d'archive) et table
+    villes. Contrairement au mtime du fichier, elle voit aussi les écritures
+    encore dans le journal WAL.
+    """
+    row = query_one(
+        "data_version",
+        "SELECT (SELECT COUNT(*) || ':' || COALESCE(SUM(days_present), 0) || ':' "
+        "|| COALESCE(MAX(updated_at), '') FROM archive_coverage), "
+        "(SELECT COUNT(*) || ':' || COALESCE(MAX(id), 0) FROM villes)",
+    )
+    return hashlib.sha1(repr(row).encode("utf-8")).hexdigest()[:12]
+
+
+def read_coverage() -> pl.DataFrame:
+    """Tout le catalogue (ville × année), avec le nom de la ville."""
+    return query_df(
+        "read_coverage",
+        f"SELECT v.nom AS ville, {', '.join('c.' + c for c in COVERAGE_COLUMNS)} "
+        "FROM archive_coverage c JOIN villes v ON v.id = c.id_ville ORDER BY c.id_ville, c.year",
+    )
+
+
+def missing_cells(start_year: int, end_year: int, ville_ids: list[int] | None = None) -> pl.DataFrame:
+    """
+    Cellules (id_ville, year, days_missing) incomplètes sur [start_year, end_year],
+    y compris celles absentes du catalogue (aucune donnée).
+    """
+    villes = read_villes().select(pl.col("id").cast(pl.Int64).alias("id_ville"))
+    if ville_ids:
+        villes = villes.filter(pl.col("id_ville").is_in(ville_ids))
+    years = pl.DataFrame({"year": list(range(start_year, end_year + 1))}, schema={"year": pl.Int64})
+    grid = villes.join(years, how="cross").with_columns(
+        pl.col("year").map_elements(expected_days, return_dtype=pl.Int64).alias("days_expected")
+    )
+
+    coverage = read_coverage().select(
+        pl.col("id_ville").cast(pl.Int64), pl.col("year").cast(pl.Int64), "days_present"
+    )
+    return (
+        grid.join(coverage, on=["id_ville", "year"], how="left")
+        .with_columns(
+            (pl.col("days_expected") - pl.col("days_present").fill_null(0)).clip(0).alias("days_missing")
+        )
+        .filter(pl.col("days_missing") > 0)
+        .select("id_ville", "year", "days_missing")
+        .sort("id_ville", "year")
+    )
+
+
+# ---------------------------------------------------------
+# ARCHIVE HORAIRE (ingestion par tronçons, agrégation à la lecture)
+# ---------------------------------------------------------
+HOURLY_COLUMNS = ["id_ville", "ts", *HOURLY_VARIABLES.values()]
+
+# Les fenêtres d'agrégation sont alignées sur l'heure normale locale
+# (UTC-5, sans heure d'été) : une journée = 00:00 → 24:00 heure d'Haïti
+LOCAL_UTC_OFFSET = -5 * 3600
+
+WINDOW_UNITS = {"m": 60, "h": 3600, "d": 86400, "w": 7 * 86400}
+
+
+def parse_window(every: str) -> int:
+    """'3h', '1d', '7d', '30m'… → durée en secondes."""
+    try:
+        n, unit = int(every[:-1]), WINDOW_UNITS[every[-1]]
+    except (ValueError, KeyError, IndexError):
+        raise ValueError(f"Fenêtre inconnue : {every} (ex: 30m, 3h, 1d, 1w)")
+    if n <= 0:
+        raise ValueError(f"Fenêtre inconnue : {every} (ex: 30m, 3h, 1d, 1w)")
+    return n * unit
+
+
+def _local_epoch(day: str) -> int:
+    """'YYYY-MM-DD' (minuit heure locale normale) → epoch UTC."""
+    d = datetime.datetime.fromisoformat(day).replace(tzinfo=datetime.timezone.utc)
+    return int(d.timestamp()) - LOCAL_UTC_OFFSET
+
+
+def ingest_hourly(ville_id: int, lat: float, lon: float, start: str, end: str,
+                  report: dict | None = None) -> int:
+    """
+    Télécharge l'archive horaire [start, end] et l'écrit tronçon par tronçon
+    (INSERT OR REPLACE : une reprise ne crée pas de doublons).
+    Renvoie le nombre de lignes écrites.
+    """
+    placeholders = ", ".join("?" * len(HOURLY_COLUMNS))
+    sql = f"INSERT OR REPLACE INTO meteo_archive_hourly ({', '.join(HOURLY_COLUMNS)}) VALUES ({placeholders})"
+
+    written = 0
+    with span("sql_query", query="insert_meteo_archive_hourly") as s:
+        conn = connect_db("insert_meteo_archive_hourly")
+        try:
+            for chunk in iter_meteo_hourly(ville_id, lat, lon, start, end, report=report):
+                conn.executemany(sql, chunk.select(HOURLY_COLUMNS).iter_rows())
+                conn.commit()
+                written += chunk.height
+        finally:
+            conn.close()
+        s.set(rows=written)
+    return written
+
+
+def write_collected(items: list[tuple[str, int, str, str, pl.DataFrame]]) -> int:
+    """
+    Écriture groupée (processus écrivain du collecteur multi-processus).
+    items : (kind, id_ville, start, end, frame) avec kind = "daily" | "hourly".
+    Une seule transaction ; chaque plage journalière est remplacée
+    (DELETE puis INSERT) et l'horaire est en INSERT OR REPLACE : rejouer
+    une unité ne crée pas de doublons. Renvoie le nombre de lignes écrites.
+    """
+    daily_cols = ["id_ville", *ARCHIVE_COLUMNS]
+    daily_sql = (f"INSERT INTO meteo_archive ({', '.join(daily_cols)}) "
+                 f"VALUES ({', '.join('?' * len(daily_cols))})")
+    hourly_sql = (f"INSERT OR REPLACE INTO meteo_archive_hourly ({', '.join(HOURLY_COLUMNS)}) "
+                  f"VALUES ({', '.join('?' * len(HOURLY_COLUMNS))})")
+
+    written = 0
+    with span("sql_query", query="write_collected") as s:
+        conn = connect_db("write_collected")
+        try:
+            with conn:
+                for kind, ville_id, start, end, frame in items:
+                    if kind == "hourly":
+                        conn.executemany(hourly_sql, frame.select(HOURLY_COLUMNS).iter_rows())
+                    else:
+                        conn.execute(
+                            "DELETE FROM meteo_archive WHERE id_ville = ? AND date BETWEEN ? AND ?",
+                            (ville_id, start, end),
+                        )
+                        conn.executemany(daily_sql, frame.select(daily_cols).iter_rows())
+                        _refresh_coverage(conn, _range_cells(ville_id, start, end))
+                    written += frame.height
+        finally:
+            conn.close()
+        s.set(rows=written)
+    return written
+
+
+def read_hourly(ville_id: int, start: str, end: str) -> pl.DataFrame:
+    """Archive horaire brute d'une ville sur [start, end] (jours locaux inclus)."""
+    df = query_df(
+        "read_hourly",
+        "SELECT ts, temperature, precipitation, humidite, vent FROM meteo_archive_hourly "
+        "WHERE id_ville = ? AND ts >= ? AND ts < ? ORDER BY ts",
+        [ville_id, _local_epoch(start), _local_epoch(end) + 86400],
+    )
+    return df.with_columns(
+        (pl.from_epoch("ts", time_unit="s") + pl.duration(seconds=LOCAL_UTC_OFFSET)).alias("ts")
+    )
+
+
+def read_hourly_agg(ville_id: int, start: str, end: str, every: str = "1d") -> pl.DataFrame:
+    """
+    Archive horaire agrégée par fenêtre `every` (3h, 6h, 1d, 7d…), calculée
+    par SQLite : seules les lignes agrégées sont transférées.
+      debut (heure locale) • heures • temperature (moy/min/max)
+      precipitation (cumul) • precip_max_1h • humidite (moy) • vent (max)
+    """
+    window = parse_window(every)
+    df = query_df(
+        "read_hourly_agg",
+        "SELECT ((ts + ?) / ?) * ? AS debut, COUNT(*) AS heures, "
+        "AVG(temperature) AS temperature, MIN(temperature) AS temp_min, MAX(temperature) AS temp_max, "
+        "SUM(precipitation) AS precipitation, MAX(precipitation) AS precip_max_1h, "
+        "AVG(humidite) AS humidite, MAX(vent) AS vent "
+        "FROM meteo_archive_hourly WHERE id_ville = ? AND ts >= ? AND ts < ? "
+        "GROUP BY debut ORDER BY debut",
+        [LOCAL_UTC_OFFSET, window, window, ville_id, _local_epoch(start), _local_epoch(end) + 86400],
+    )
+    # debut est déjà décalé en heure locale
+    return df.with_columns(pl.from_epoch("debut", time_unit="s"))
+
+
+# ---------------------------------------------------------
+# PRÉVISIONS (meteo_forecast) ET VÉRIFICATION
+# ---------------------------------------------------------
+FORECAST_SCHEMA = {
+    "id_ville": pl.Int64, "issued_at": pl.String, "valid_date": pl.String,
+    "lead_days": pl.Int64, "variable": pl.String, "value": pl.Float64,
+}
+FORECAST_COLUMNS = list(FORECAST_SCHEMA)
+SKILL_COLUMNS = ["id_ville", "variable", "lead_days", "n", "sum_err", "sum_abs_err", "sum_sq_err"]
+
+
+def insert_forecasts(df: pl.DataFrame) -> int:
+    """Prévisions au format long (FORECAST_COLUMNS) ; une émission rejouée écrase la précédente."""
+    sql = (f"INSERT OR REPLACE INTO meteo_forecast ({', '.join(FORECAST_COLUMNS)}) "
+           f"VALUES ({', '.join('?' * len(FORECAST_COLUMNS))})")
+    with span("sql_query", query="insert_meteo_forecast") as s:
+        conn = connect_db("insert_meteo_forecast")
+        try:
+            conn.executemany(sql, df.select(FORECAST_COLUMNS).iter_rows())
+            conn.commit()
+        finally:
+            conn.close()
+        s.set(rows=df.height)
+    return df.height
+
+
+def read_forecasts(unverified: bool = True) -> pl.DataFrame:
+    """
+    Prévisions (FORECAST_SCHEMA, typé même vide). unverified : seulement
+    celles postérieures à la date vérifiée de leur ville (toutes pour une
+    ville encore jamais vérifiée).
+    """
+    sql = f"SELECT {', '.join('f.' + c for c in FORECAST_COLUMNS)} FROM meteo_forecast f"
+    if unverified:
+        sql += (" LEFT JOIN forecast_skill_watermark w ON w.id_ville = f.id_ville "
+                "WHERE w.verified_through IS NULL OR f.valid_date > w.verified_through")
+    return query_df("read_forecasts", sql).cast(FORECAST_SCHEMA)
+
+
+def read_observations(start: str, end: str) -> pl.DataFrame:
+    """Archive de toutes les villes sur [start, end] (doublons éventuels inclus)."""
+    return query_df(
+        "read_observations",
+        f"SELECT id_ville, {', '.join(ARCHIVE_COLUMNS)} FROM meteo_archive "
+        f"WHERE date BETWEEN ? AND ?",
+        [start, end],
+    )
+
+
+# ---------------------------------------------------------
+# CUMULS DÉRIVÉS (archive_rollup)
+# ---------------------------------------------------------
+ROLLUP_COLUMNS = [
+    "id_ville", "periode", "jours", "temp_moy", "amplitude", "point_rosee",
+    "indice_chaleur_max", "dj_clim", "jours_pluie", "precipitation",
+]
+
+
+def write_rollup(every: str, df: pl.DataFrame) -> int:
+    """Écrit les cumuls `every` (ROLLUP_COLUMNS) ; une période recalculée remplace l'ancienne."""
+    cols = ["every", *ROLLUP_COLUMNS]
+    sql = (f"INSERT OR REPLACE INTO archive_rollup ({', '.join(cols)}) "
+           f"VALUES ({', '.join('?' * len(cols))})")
+    with span("sql_query", query="write_archive_rollup") as s:
+        conn = connect_db("write_archive_rollup")
+        try:
+            with conn:
+                conn.executemany(
+                    sql, df.select(pl.lit(every).alias("every"), *ROLLUP_COLUMNS).iter_rows()
+                )
+        finally:
+            conn.close()
+        s.set(rows=df.height)
+    return df.height
+
+
+def read_rollup(every: str, ville_id: int | None = None) -> pl.DataFrame:
+    """Cumuls matérialisés pour `every` (toutes les villes par défaut)."""
+    sql = f"SELECT {', '.join(ROLLUP_COLUMNS)} FROM archive_rollup WHERE every = ?"
+    params = [every]
+    if ville_id is not None:
+        sql += " AND id_ville = ?"
+        params.append(ville_id)
+    return query_df("read_rollup", sql + " ORDER BY id_ville, periode", params)
+
+
+# ---------------------------------------------------------
+# SPI (spi_params, spi_values)
+# ---------------------------------------------------------
+SPI_PARAM_COLUMNS = ["id_ville", "scale", "month", "n", "q", "alpha", "beta", "ref_start", "ref_end", "fitted_at"]
+SPI_COLUMNS = ["id_ville", "scale", "periode", "cumul", "spi"]
+
+
+def replace_spi(params: pl.DataFrame, values: pl.DataFrame):
+    """Remplace paramètres et valeurs SPI (ajustement complet), dans une seule transaction."""
+    with span("sql_query", query="replace_spi") as s:
+        conn = connect_db("replace_spi")
+        try:
+            with conn:
+                conn.execute("DELETE FROM spi_params")
+                conn.execute("DELETE FROM spi_values")
+                conn.executemany(
+                    f"INSERT INTO spi_params ({', '.join(SPI_PARAM_COLUMNS)}) "
+                    f"VALUES ({', '.join('?' * len(SPI_PARAM_COLUMNS))})",
+                    params.select(SPI_PARAM_COLUMNS).iter_rows(),
+                )
+                conn.executemany(
+                    f"INSERT INTO spi_values ({', '.join(SPI_COLUMNS)}) "
+                    f"VALUES ({', '.join('?' * len(SPI_COLUMNS))})",
+                    values.select(SPI_COLUMNS).iter_rows(),
+                )
+        finally:
+            conn.close()
+        s.set(rows=values.height)
+
+
+def write_spi_values(values: pl.DataFrame) -> int:
+    """Valeurs SPI (SPI_COLUMNS) ; un mois recalculé remplace l'ancien."""
+    sql = (f"INSERT OR REPLACE INTO spi_values ({', '.join(SPI_COLUMNS)}) "
+           f"VALUES ({', '.join('?' * len(SPI_COLUMNS))})")
+    with span("sql_query", query="write_spi_values") as s:
+        conn = connect_db("write_spi_values")
+        try:
+            with conn:
+                conn.executemany(sql, values.select(SPI_COLUMNS).iter_rows())
+        finally:
+            conn.close()
+        s.set(rows=values.height)
+    return values.height
+
+
+def read_spi_params() -> pl.DataFrame:
+    return query_df("read_spi_params", f"SELECT {', '.join(SPI_PARAM_COLUMNS)} FROM spi_params")
+
+
+def read_spi_values(scale: int | None = None, ville_id: int | None = None) -> pl.DataFrame:
+    """Valeurs SPI (toutes échelles et villes par défaut), triées par ville puis mois."""
+    sql = f"SELECT {', '.join(SPI_COLUMNS)} FROM spi_values WHERE 1 = 1"
+    params = []
+    if scale is not None:
+        sql += " AND scale = ?"
+        params.append(scale)
+    if ville_id is not None:
+        sql += " AND id_ville = ?"
+        params.append(ville_id)
+    return query_df("read_spi_values", sql + " ORDER BY id_ville, scale, periode", params)
+
+
+def read_archive_last_dates() -> pl.DataFrame:
+    """Dernière date observée par ville (id_ville, last_obs)."""
+    return query_df(
+        "read_archive_last_dates",
+        "SELECT id_ville, MAX(date) AS last_obs FROM meteo_archive GROUP BY id_ville",
+    ).cast({"id_ville": pl.Int64, "last_obs": pl.String})
+
+
+def read_forecast_skill() -> pl.DataFrame:
+    return query_df(
+        "read_forecast_skill",
+        f"SELECT {', '.join(SKILL_COLUMNS)} FROM forecast_skill",
+    )
+
+
+def merge_forecast_skill(stats: pl.DataFrame, watermarks: pl.DataFrame, reset: bool = False):
+    """
+    Ajoute des statistiques partielles (SKILL_COLUMNS) à forecast_skill et avance
+    les dates vérifiées, dans une seule transaction.
+    reset : repart de zéro (recalcul complet).
+    """
+    with span("sql_query", query="merge_forecast_skill") as s:
+        conn = connect_db("merge_forecast_skill")
+        try:
+            with conn:
+                if reset:
+                    conn.execute("DELETE FROM forecast_skill")
+                    conn.execute("DELETE FROM forecast_skill_watermark")
+                conn.executemany(
+                    f"INSERT INTO forecast_skill ({', '.join(SKILL_COLUMNS)}) "
+                    f"VALUES ({', '.join('?' * len(SKILL_COLUMNS))}) "
+                    "ON CONFLICT (id_ville, variable, lead_days) DO UPDATE SET "
+                    "n = n + excluded.n, "
+                    "sum_err = sum_err + excluded.sum_err, "
+                    "sum_abs_err = sum_abs_err + excluded.sum_abs_err, "
+                    "sum_sq_err = sum_sq_err + excluded.sum_sq_err",
+                    stats.select(SKILL_COLUMNS).iter_rows(),
+                )
+                conn.executemany(
+                    "INSERT OR REPLACE INTO forecast_skill_watermark (id_ville, verified_through) "
+                    "VALUES (?, ?)",
+                    watermarks.select("id_ville", "verified_through").iter_rows(),
+                )
+        finally:
+            conn.close()
+        s.set(rows=stats.height)
+
+
+# ---------------------------------------------------------
+# LECTURE ARCHIVE PAGINÉE (tableaux)
+# ---------------------------------------------------------
+ARCHIVE_COLUMNS = ["date", "temp_min", "temp_max", "humidite", "precipitation", "vent"]
+
+
+def count_archive(ville_id: int, start: str, end: str) -> int:
+    """Nombre de lignes d'archive pour une ville sur [start, end]."""
+    (total,) = query_one(
+        "count_archive",
+        "SELECT COUNT(*) FROM meteo_archive "
+        "WHERE id_ville = ? AND date BETWEEN ? AND ?",
+        (ville_id, start, end),
+    )
+    return total
+
+
+def read_archive_page(
+    ville_id: int,
+    start: str,
+    end: str,
+    sort_by: str = "date",
+    descending: bool = False,
+    limit: int = 50,
+    offset: int = 0,
+) -> pl.DataFrame:
+    """
+    Une page de meteo_archive (LIMIT/OFFSET), triée côté SQLite.
+    Seules `limit` lignes sont lues : le coût ne dépend pas de la plage.
+    `date` puis `id` servent de clés secondaires (une date peut figurer
+    plusieurs fois pour une ville) : l'ordre est total, donc stable entre
+    les pages.
+    """
+    if sort_by not in ARCHIVE_COLUMNS:
+        raise ValueError(f"Colonne de tri inconnue : {sort_by}")
+
+    direction = "DESC" if descending else "ASC"
+    order = f"{sort_by} {direction}"
+    if sort_by != "date":
+        order += f", date {direction}"
+    order += f", id {direction}"
+
+    return query_df(
+        "read_archive_page",
+        f"SELECT {', '.join(ARCHIVE_COLUMNS)} FROM meteo_archive "
+        f"WHERE id_ville = ? AND date BETWEEN ? AND ? "
+        f"ORDER BY {order} LIMIT ? OFFSET ?",
+        [ville_id, start, end, limit, offset],
+    )
+
+
+# ---------------------------------------------------------
+# LECTURE ARCHIVE EN FLUX (exports)
+# ---------------------------------------------------------
+EXPORT_COLUMNS = ["id_ville", "ville", *ARCHIVE_COLUMNS]
+
+
+def _archive_filter(ville_ids: list[int]) -> str:
+    return f"a.id_ville IN ({', '.join('?' * len(ville_ids))}) AND a.date BETWEEN ? AND ?"
+
+
+def count_archive_multi(ville_ids: list[int], start: str, end: str) -> int:
+    """Nombre de lignes d'archive pour plusieurs villes sur [start, end]."""
+    (total,) = query_one(
+        "count_archive_multi",
+        f"SELECT COUNT(*) FROM meteo_archive a WHERE {_archive_filter(ville_ids)}",
+        (*ville_ids, start, end),
+    )
+    return total
+
+
+def read_archive_multi(ville_ids: list[int], start: str, end: str) -> pl.DataFrame:
+    """Archive de plusieurs villes sur [start, end] (id_ville + ARCHIVE_COLUMNS)."""
+    return query_df(
+        "read_archive_multi",
+        f"SELECT a.id_ville, {', '.join('a.' + c for c in ARCHIVE_COLUMNS)} "
+        f"FROM meteo_archive a WHERE {_archive_filter(ville_ids)}",
+        [*ville_ids, start, end],
+    )
+
+
+def iter_archive_rows(ville_ids: list[int], start: str, end: str, batch_rows: int = 50_000):
+    """
+    Archive de plusieurs villes sur [start, end], par lots de `batch_rows`
+    tuples (EXPORT_COLUMNS), triée par ville puis date (ordre de l'index).
+    Un seul lot est en mémoire à la fois, quelle que soit la plage.
+    """
+    sql = (
+        f"SELECT a.id_ville, v.nom, {', '.join('a.' + c for c in ARCHIVE_COLUMNS)} "
+        f"FROM meteo_archive a JOIN villes v ON v.id = a.id_ville "
+        f"WHERE {_archive_filter(ville_ids)} ORDER BY a.id_ville, a.date"
+    )
+    params = (*ville_ids, start, end)
+    with span("sql_query", query="iter_archive_rows") as s:
+        conn = connect_db()
+        rows = 0
+        db_ms = 0.0   # temps SQLite seul (le span inclut celui du consommateur)
+        try:
+            t0 = time.perf_counter()
+            cur = conn.execute(sql, params)
+            while batch := cur.fetchmany(batch_rows):
+                db_ms += (time.perf_counter() - t0) * 1000
+                rows += len(batch)
+                yield batch
+                t0 = time.perf_counter()
+            db_ms += (time.perf_counter() - t0) * 1000
+        finally:
+            conn.close()
+            s.set(rows=rows)
+    check_slow("iter_archive_rows", sql, params, db_ms, rows)
+
+
 # ---------------------------------------------------------
 # MÉTÉO LIVE (Streamlit)
 # ---------------------------------------------------------
 def save_weather(ville: str, temp: float, precip: float, wind: float):
-    conn = connect_db()
-    cur = conn.cursor()
+    insert_live_batch([(ville, datetime.datetime.now().isoformat(), temp, precip, wind, None, None)])
 
-    cur.execute("""
-        INSERT INTO meteo_live (ville, timestamp, temperature, precipitation, vent)
-        VALUES (?, ?, ?, ?, ?)
-    """, (ville, datetime.datetime.now().isoformat(), temp, precip, wind))
 
-    conn.commit()
-    conn.close()
+LIVE_COLUMNS = ["ville", "timestamp", "temperature", "precipitation", "vent"]
+LATEST_COLUMNS = LIVE_COLUMNS + ["humidite", "weather_code"]
+
+
+def insert_live_batch(rows: list[tuple]) -> int:
+    """
+    Insertion groupée dans meteo_live (une transaction) : rows = tuples
+    LATEST_COLUMNS. Une lecture déjà présente (même ville, même horodatage)
+    est ignorée. meteo_latest est mis à jour dans la même transaction (la
+    lecture la plus récente l'emporte). Renvoie le nombre de lignes
+    réellement insérées dans meteo_live.
+    """
+    n = len(LIVE_COLUMNS)
+    with span("sql_query", query="insert_live_batch") as s:
+        conn = connect_db("insert_live_batch")
+        try:
+            with conn:
+                before = conn.total_changes
+                conn.executemany(
+                    f"INSERT INTO meteo_live ({', '.join(LIVE_COLUMNS)}) "
+                    "SELECT ?, ?, ?, ?, ? WHERE NOT EXISTS "
+                    "(SELECT 1 FROM meteo_live WHERE ville = ? AND timestamp = ?)",
+                    [(*r[:n], r[0], r[1]) for r in rows],
+                )
+                inserted = conn.total_changes - before
+                conn.executemany(
+                    f"INSERT INTO meteo_latest ({', '.join(LATEST_COLUMNS)}, updated_at) "
+                    f"VALUES ({', '.join('?' * len(LATEST_COLUMNS))}, datetime('now')) "
+                    "ON CONFLICT (ville) DO UPDATE SET "
+                    + ", ".join(f"{c} = excluded.{c}" for c in LATEST_COLUMNS[1:])
+                    + ", updated_at = excluded.updated_at "
+                    "WHERE excluded.timestamp > meteo_latest.timestamp",
+                    rows,
+                )
+        finally:
+            conn.close()
+        s.set(rows=inserted)
+    return inserted
+
+
+def read_latest(ville: str | None = None) -> pl.DataFrame:
+    """
+    Dernière observation par ville (LATEST_COLUMNS), lue dans meteo_latest :
+    N lignes au plus, quelle que soit la taille de meteo_live.
+    """
+    where, params = ("WHERE ville = ?", [ville]) if ville else ("", None)
+    return query_df(
+        "read_latest",
+        f"SELECT {', '.join(LATEST_COLUMNS)} FROM meteo_latest {where} ORDER BY ville",
+        params,
+    )
 
 
 def load_history(ville: str) -> pl.DataFrame:
-    conn = connect_db()
-    df = pl.read_database(
+    return query_df(
+        "load_history",
         "SELECT timestamp, temperature, precipitation, vent "
         "FROM meteo_live WHERE ville = ? ORDER BY timestamp",
-        connection=conn,
-        params=[ville]
+        [ville],
     )
-    conn.close()
-    return df
 
 def save_history(ville_id, daily_json):
     """
@@ -198,9 +1162,12 @@ def save_history(ville_id, daily_json):
         "id_ville": [ville_id] * len(daily_json["time"])
     })
 
-    with sqlite3.connect("data/meteo_haiti.sqlite") as conn:
-        df.write_database(
-            table_name="meteo_archive",
-            connection=conn,
-            if_exists="append"
-        )
\ No newline at end of file
+    with span("sql_query", query="save_history") as s:
+        with connect_db("save_history") as conn:
+            df.write_database(
+                table_name="meteo_archive",
+                connection=conn,
+                if_exists="append"
+            )
+            _refresh_coverage(conn, _frame_cells(df))
+        s.set(rows=df.height)
\ No newline at end of file
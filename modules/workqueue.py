@@ -0,0 +1,267 @@
+# -*- coding: utf-8 -*-
+# ../modules/workqueue.py
+# File de travail SQLite (baux + battements) pour le collecteur multi-processus
+
+import os
+import socket
+import sqlite3
+import threading
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+from modules.storage import TimedConnection
+
+# File séparée de la base de données météo : les prises de bail ne
+# bloquent pas l'écrivain (et la file peut être partagée entre machines)
+QUEUE_PATH = Path(os.environ.get("METEO_QUEUE_PATH", "data/collect_queue.sqlite"))
+
+LEASE_SECONDS = 60.0
+MAX_ATTEMPTS = 5
+
+
+# ---------------------------------------------------------
+# CONNEXION / SCHÉMA
+# ---------------------------------------------------------
+def connect_queue(path: Path | None = None) -> sqlite3.Connection:
+    # TimedConnection : les prises de bail lentes (contention) vont au journal des requêtes lentes
+    conn = sqlite3.connect(path or QUEUE_PATH, timeout=30, isolation_level=None, factory=TimedConnection)
+    conn.query = "collect_queue"
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA busy_timeout = 30000")
+    return conn
+
+
+def init_queue(path: Path | None = None):
+    conn = connect_queue(path)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS collect_queue (
+            id INTEGER PRIMARY KEY,
+            kind TEXT NOT NULL,
+            id_ville INTEGER NOT NULL,
+            latitude REAL NOT NULL,
+            longitude REAL NOT NULL,
+            start_date TEXT NOT NULL,
+            end_date TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            lease_owner TEXT,
+            lease_expires REAL,
+            rows INTEGER,
+            error TEXT,
+            updated_at REAL,
+            UNIQUE (kind, id_ville, start_date, end_date)
+        );
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_queue_status ON collect_queue (status, lease_expires);")
+    conn.close()
+
+
+def worker_id() -> str:
+    """Identifiant unique d'un processus travailleur (machine:pid)."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+# ---------------------------------------------------------
+# ALIMENTATION
+# ---------------------------------------------------------
+def date_spans(start: str, end: str, span_days: int) -> list[tuple[str, str]]:
+    d, stop = date.fromisoformat(start), date.fromisoformat(end)
+    spans = []
+    while d <= stop:
+        e = min(d + timedelta(days=span_days - 1), stop)
+        spans.append((d.isoformat(), e.isoformat()))
+        d = e + timedelta(days=1)
+    return spans
+
+
+def enqueue(villes: list[dict], start: str, end: str, span_days: int = 365,
+            kind: str = "daily", path: Path | None = None) -> int:
+    """
+    Une unité par ville × tranche de `span_days` jours.
+    Les unités déjà présentes (même plage) sont ignorées.
+    Renvoie le nombre d'unités ajoutées.
+    """
+    units = [
+        (kind, v["id"], v["latitude"], v["longitude"], s, e, time.time())
+        for v in villes
+        for s, e in date_spans(start, end, span_days)
+    ]
+    conn = connect_queue(path)
+    try:
+        before = conn.total_changes
+        conn.execute("BEGIN IMMEDIATE")
+        conn.executemany(
+            "INSERT OR IGNORE INTO collect_queue "
+            "(kind, id_ville, latitude, longitude, start_date, end_date, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            units,
+        )
+        conn.execute("COMMIT")
+        return conn.total_changes - before
+    finally:
+        conn.close()
+
+
+# ---------------------------------------------------------
+# BAUX
+# ---------------------------------------------------------
+def claim(conn: sqlite3.Connection, owner: str, lease_seconds: float = LEASE_SECONDS) -> dict | None:
+    """
+    Prend atomiquement une unité disponible : en attente, ou louée dont le
+    bail a expiré (travailleur arrêté ou planté). None si la file est vide.
+    """
+    now = time.time()
+    row = conn.execute(
+        """
+        UPDATE collect_queue
+        SET status = 'leased', lease_owner = ?, lease_expires = ?,
+            attempts = attempts + 1, updated_at = ?
+        WHERE id = (
+            SELECT id FROM collect_queue
+            WHERE status = 'pending' OR (status = 'leased' AND lease_expires < ?)
+            ORDER BY id LIMIT 1
+        )
+        RETURNING *
+        """,
+        (owner, now + lease_seconds, now, now),
+    ).fetchone()
+    return dict(row) if row else None
+
+
+def heartbeat(conn: sqlite3.Connection, unit_id: int, owner: str,
+              lease_seconds: float = LEASE_SECONDS) -> bool:
+    """Prolonge le bail ; False si l'unité a été reprise par un autre travailleur."""
+    now = time.time()
+    cur = conn.execute(
+        "UPDATE collect_queue SET lease_expires = ?, updated_at = ? "
+        "WHERE id = ? AND lease_owner = ? AND status = 'leased'",
+        (now + lease_seconds, now, unit_id, owner),
+    )
+    return cur.rowcount == 1
+
+
+def fail(conn: sqlite3.Connection, unit_id: int, owner: str, error: str,
+         max_attempts: int = MAX_ATTEMPTS):
+    """Échec : l'unité repasse en attente, ou `failed` après max_attempts essais."""
+    conn.execute(
+        "UPDATE collect_queue SET "
+        "status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+        "lease_owner = NULL, lease_expires = NULL, error = ?, updated_at = ? "
+        "WHERE id = ? AND lease_owner = ?",
+        (max_attempts, error, time.time(), unit_id, owner),
+    )
+
+
+def fail_many(conn: sqlite3.Connection, unit_ids: list[int], error: str,
+              max_attempts: int = MAX_ATTEMPTS):
+    """
+    Échec d'écriture d'un lot (appelé par l'écrivain) : comme fail(), quel
+    que soit le travailleur qui détient le bail ; son battement cesse de
+    suivre ces unités au passage suivant.
+    """
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")
+    conn.executemany(
+        "UPDATE collect_queue SET "
+        "status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+        "lease_owner = NULL, lease_expires = NULL, error = ?, updated_at = ? "
+        "WHERE id = ? AND status = 'leased'",
+        [(max_attempts, error, now, unit_id) for unit_id in unit_ids],
+    )
+    conn.execute("COMMIT")
+
+
+def complete_many(conn: sqlite3.Connection, done: list[tuple[int, int]]):
+    """Marque des unités écrites : [(unit_id, lignes), …] (appelé par l'écrivain)."""
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")
+    conn.executemany(
+        "UPDATE collect_queue SET status = 'done', rows = ?, error = NULL, "
+        "lease_owner = NULL, lease_expires = NULL, updated_at = ? WHERE id = ?",
+        [(rows, now, unit_id) for unit_id, rows in done],
+    )
+    conn.execute("COMMIT")
+
+
+def outstanding(conn: sqlite3.Connection) -> int:
+    """Unités louées non encore validées (en cours ou chez l'écrivain)."""
+    return conn.execute("SELECT COUNT(*) FROM collect_queue WHERE status = 'leased'").fetchone()[0]
+
+
+def reset_failed(path: Path | None = None) -> int:
+    conn = connect_queue(path)
+    try:
+        return conn.execute(
+            "UPDATE collect_queue SET status = 'pending', attempts = 0, updated_at = ? "
+            "WHERE status = 'failed'",
+            (time.time(),),
+        ).rowcount
+    finally:
+        conn.close()
+
+
+def queue_stats(path: Path | None = None) -> dict:
+    """Unités par statut (+ baux expirés, + lignes écrites)."""
+    conn = connect_queue(path)
+    try:
+        stats = {r["status"]: r["n"] for r in conn.execute(
+            "SELECT status, COUNT(*) AS n FROM collect_queue GROUP BY status"
+        )}
+        stats["expired_leases"] = conn.execute(
+            "SELECT COUNT(*) FROM collect_queue WHERE status = 'leased' AND lease_expires < ?",
+            (time.time(),),
+        ).fetchone()[0]
+        stats["rows"] = conn.execute(
+            "SELECT COALESCE(SUM(rows), 0) FROM collect_queue WHERE status = 'done'"
+        ).fetchone()[0]
+        return stats
+    finally:
+        conn.close()
+
+
+class Heartbeat:
+    """
+    Thread de battement : prolonge toutes les lease/3 secondes le bail des
+    unités suivies (add / discard), tant que le travailleur est vivant —
+    unité en cours de téléchargement comme unités confiées à l'écrivain.
+    Une unité validée (`done`) ou reprise par un autre travailleur cesse
+    d'être suivie au battement suivant.
+    """
+
+    def __init__(self, owner: str, lease_seconds: float = LEASE_SECONDS, path: Path | None = None):
+        self.owner = owner
+        self.lease_seconds = lease_seconds
+        self.path = path
+        self._units: set[int] = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def add(self, unit_id: int):
+        with self._lock:
+            self._units.add(unit_id)
+
+    def discard(self, unit_id: int):
+        with self._lock:
+            self._units.discard(unit_id)
+
+    def _run(self):
+        conn = connect_queue(self.path)
+        try:
+            while not self._stop.wait(self.lease_seconds / 3):
+                with self._lock:
+                    units = list(self._units)
+                for unit_id in units:
+                    if not heartbeat(conn, unit_id, self.owner, self.lease_seconds):
+                        self.discard(unit_id)
+        finally:
+            conn.close()
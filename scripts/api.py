@@ -0,0 +1,50 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import argparse
+import time
+
+from modules.storage import DB_PATH
+from modules.api import serve, ROUTES
+from modules.logs import configure_logging
+
+
+# ---------------------------------------------------------
+# CLI
+# ---------------------------------------------------------
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(
+        description="API HTTP en lecture seule sur l'archive (JSON / Arrow, ETag, 304).",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument("--host", default="127.0.0.1", help="Adresse d'écoute")
+    parser.add_argument("--port", type=int, default=8600, help="Port d'écoute")
+    parser.add_argument("--db", default=str(DB_PATH), help="Base SQLite (ouverte en lecture seule)")
+    parser.add_argument("--pool-size", type=int, default=4, help="Connexions SQLite partagées")
+    parser.add_argument("--max-age", type=int, default=60, help="Cache-Control max-age (secondes)")
+    return parser.parse_args()
+
+
+# ---------------------------------------------------------
+# MAIN
+# ---------------------------------------------------------
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    configure_logging()
+
+    serve(args.host, args.port, args.db, args.pool_size, args.max_age)
+
+    base = f"http://{args.host}:{args.port}"
+    print(f"📡 API archive sur {base} (base : {args.db}, lecture seule)")
+    for path in ROUTES:
+        print(f"   {base}{path}")
+    print("   ?format=arrow ou Accept: application/vnd.apache.arrow.stream pour Arrow")
+
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
@@ -3,15 +3,25 @@ import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
 import argparse
+import json
+import time
+from datetime import datetime
+import polars as pl
 from tqdm import tqdm
 from modules.storage import (
     init_db,
     sync_villes_from_yaml,
     read_villes,
-    insert_dataframe,
-    connect_db
+    write_collected,
+    missing_cells,
+    ingest_hourly,
+    connect_db,
+    DB_PATH
 )
 from modules.meteo import get_meteo_data
+from modules.quota import remaining
+from modules.spi import update_spi
+from modules.logs import configure_logging
 
 
 # ---------------------------------------------------------
@@ -27,64 +37,259 @@ def ensure_data_folder():
 
 def reset_database_if_requested(force_reset: bool):
     """Supprime la base SQLite si l'utilisateur demande --force."""
-    db_file = "data/meteo_haiti.sqlite"
+    db_file = DB_PATH
 
     if force_reset and os.path.exists(db_file):
         os.remove(db_file)
         print("🗑 Base SQLite supprimée (option --force).")
 
 
+# ---------------------------------------------------------
+# RAPPORTS DE COLLECTE (JSON)
+# ---------------------------------------------------------
+
+REPORT_DIR = "data/reports"
+LAST_REPORT = os.path.join(REPORT_DIR, "collect_last.json")
+
+
+def write_report(report: dict) -> str:
+    """Écrit le rapport horodaté + une copie `collect_last.json` (pour --retry-failed)."""
+    os.makedirs(REPORT_DIR, exist_ok=True)
+    stamp = report["started_at"].replace(":", "").replace("-", "")
+    path = os.path.join(REPORT_DIR, f"collect_{stamp}.json")
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    for target in (path, LAST_REPORT):
+        with open(target, "w", encoding="utf-8") as f:
+            f.write(text)
+    return path
+
+
+def load_report(report_path: str) -> dict:
+    with open(report_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def failed_units(report: dict) -> list[tuple[int, int]]:
+    """Unités (id_ville, année) en échec dans un rapport précédent."""
+    return [(u["ville_id"], u["year"]) for u in report["units"] if u["status"] == "failed"]
+
+
+def summarize(units: list[dict], elapsed: float) -> dict:
+    count = lambda status: sum(1 for u in units if u["status"] == status)
+    rows = sum(u["rows"] for u in units)
+    nbytes = sum(u["bytes"] for u in units)
+    requests_sent = sum(u.get("chunks", 1) + u["retries"] for u in units)
+    return {
+        "units": len(units),
+        "ok": count("ok"),
+        "empty": count("empty"),
+        "failed": count("failed"),
+        "rows": rows,
+        "bytes": nbytes,
+        "requests": requests_sent,
+        "retries": sum(u["retries"] for u in units),
+        "duration_s": round(elapsed, 3),
+        "requests_per_s": round(requests_sent / elapsed, 3) if elapsed else 0.0,
+        "rows_per_s": round(rows / elapsed, 1) if elapsed else 0.0,
+        "bytes_per_s": round(nbytes / elapsed, 1) if elapsed else 0.0,
+    }
+
+
 # ---------------------------------------------------------
 # COLLECTE ARCHIVE AVEC TQDM
 # ---------------------------------------------------------
 
-def run_collection(start_year: int, end_year: int, pause: float, villes_filtrees: list | None):
+def collect_hourly_unit(ville: dict, year: int) -> dict:
+    """Archive horaire d'une ville pour une année (écrite par tronçons mensuels)."""
+    fetch = {}
+    t0 = time.perf_counter()
+
+    rows = ingest_hourly(
+        ville["id"],
+        ville["latitude"],
+        ville["longitude"],
+        f"{year}-01-01",
+        f"{year}-12-31",
+        report=fetch
+    )
+
+    # Un tronçon manquant suffit : la reprise rejoue l'année (écriture idempotente)
+    if fetch["failed_chunks"]:
+        status = "failed"
+    elif rows:
+        status = "ok"
+    else:
+        status = "empty"
+
+    return {
+        "ville_id": ville["id"],
+        "ville": ville["ville"],
+        "year": year,
+        "status": status,
+        "rows": rows,
+        "http_status": fetch.get("status"),
+        "bytes": fetch["bytes"],
+        "retries": fetch["retries"],
+        "chunks": fetch["chunks"],
+        "failed_chunks": fetch["failed_chunks"],
+        "duration_ms": round((time.perf_counter() - t0) * 1000, 2),
+        "error": fetch.get("error"),
+    }
+
+
+def collect_unit(ville: dict, year: int) -> dict:
+    """Télécharge + insère une unité (ville, année) et renvoie sa ligne de rapport."""
+    fetch = {}
+    t0 = time.perf_counter()
+
+    df = get_meteo_data(
+        id_ville=ville["id"],
+        lat=ville["latitude"],
+        lon=ville["longitude"],
+        year=year,
+        report=fetch
+    )
+
+    if df is not None:
+        # Remplace l'année (idempotent : une reprise ne crée pas de doublons)
+        # et met à jour le catalogue de couverture
+        write_collected([("daily", ville["id"], f"{year}-01-01", f"{year}-12-31", df)])
+
+    if df is not None:
+        status = "ok"
+    elif "error" in fetch:
+        status = "failed"
+    else:
+        status = "empty"
+
+    return {
+        "ville_id": ville["id"],
+        "ville": ville["ville"],
+        "year": year,
+        "status": status,
+        "rows": 0 if df is None else df.height,
+        "http_status": fetch.get("status"),
+        "bytes": fetch.get("bytes", 0),
+        "retries": fetch.get("retries", 0),
+        "fetch_ms": fetch.get("duration_ms"),
+        "duration_ms": round((time.perf_counter() - t0) * 1000, 2),
+        "error": fetch.get("error"),
+    }
+
+
+def print_budget():
+    budget = remaining("backfill")
+    if budget:
+        parts = [f"{w} {b['available']}/{b['limit']}" for w, b in budget.items()]
+        print(f"📶 Budget Open-Meteo restant (backfill) : {' • '.join(parts)}")
+
+
+def run_collection(start_year: int, end_year: int, pause: float, villes_filtrees: list | None,
+                   retry_from: str | None = None, hourly: bool = False, gaps_only: bool = False):
     """
     Collecte 2010–2020 avec barre de progression.
-    S'insère dans meteo_archive.
+    S'insère dans meteo_archive (ou meteo_archive_hourly si hourly).
+    Chaque exécution produit un rapport JSON (data/reports/).
+    retry_from : rapport précédent → ne rejoue que ses unités en échec
+    (dans le mode, journalier ou horaire, de ce rapport).
+    gaps_only : ne télécharge que les années incomplètes d'après le
+    catalogue de couverture (archive journalière).
     """
 
     villes = read_villes()
 
     # Filtrage par noms de ville si demandé
     if villes_filtrees:
-        villes = villes[villes["ville"].isin(villes_filtrees)]
+        villes = villes.filter(pl.col("ville").is_in(villes_filtrees))
         print(f"🎯 Filtre appliqué : {len(villes)} villes sélectionnées.")
 
-    if villes.empty:
+    if villes.is_empty():
         print("❌ Aucune ville sélectionnée. Abandon.")
         return
 
-    total_taches = len(villes) * (end_year - start_year + 1)
+    by_id = {v["id"]: v for v in villes.iter_rows(named=True)}
+
+    if retry_from:
+        previous = load_report(retry_from)
+        hourly = previous["params"].get("hourly", False)
+        todo = [(by_id[vid], year) for vid, year in failed_units(previous) if vid in by_id]
+        print(f"🔁 Reprise de {len(todo)} unité(s) en échec depuis {retry_from}")
+        if not todo:
+            print("✔ Rien à reprendre.")
+            return
+    elif gaps_only:
+        if hourly:
+            print("❌ --gaps ne s'applique qu'à l'archive journalière.")
+            return
+        gaps = missing_cells(start_year, end_year, list(by_id))
+        todo = [(by_id[vid], year) for vid, year, _ in gaps.iter_rows()]
+        print(f"🧩 {len(todo)} année(s) incomplète(s) • {gaps['days_missing'].sum()} jours manquants")
+        if not todo:
+            print("✔ Archive complète sur la période.")
+            return
+    else:
+        todo = [(v, year) for v in by_id.values() for year in range(start_year, end_year + 1)]
 
-    nb_annees = end_year - start_year + 1
+        nb_annees = end_year - start_year + 1
 
-    print(f"📊 Collecte pour {len(villes)} villes • {start_year} → {end_year}")
-    print(f"Total estimé : {nb_annees} années à télécharger\n")
+        print(f"📊 Collecte pour {len(villes)} villes • {start_year} → {end_year}")
+        print(f"Total estimé : {nb_annees} années à télécharger\n")
 
-    pbar = tqdm(total=total_taches, desc="📥 Collecte", unit="année")
+    started_at = datetime.now().isoformat(timespec="seconds")
+    t0 = time.perf_counter()
+    units = []
 
-    for _, ville in villes.iterrows():
-        nom = ville["ville"]
+    pbar = tqdm(total=len(todo), desc="📥 Collecte", unit="année")
 
-        for year in range(start_year, end_year + 1):
+    table = "meteo_archive_hourly" if hourly else "meteo_archive"
+    collect = collect_hourly_unit if hourly else collect_unit
 
-            df = get_meteo_data(
-                id_ville=ville["id"],
-                lat=ville["latitude"],
-                lon=ville["longitude"],
-                year=year
-            )
+    for ville, year in todo:
+        unit = collect(ville, year)
+        units.append(unit)
 
-            if df is not None:
-                insert_dataframe("meteo_archive", df)
+        if unit["status"] == "failed":
+            tqdm.write(f"❌ {ville['ville']} {year} : {unit['error']}")
 
-            pbar.update(1)
-            pbar.set_postfix(ville=nom, année=year)
+        pbar.update(1)
+        pbar.set_postfix(ville=ville["ville"], année=year)
+
+        time.sleep(pause)
 
     pbar.close()
 
-    print("\n🎉 Collecte terminée ! Données insérées dans `meteo_archive`.")
+    summary = summarize(units, time.perf_counter() - t0)
+    report = {
+        "started_at": started_at,
+        "finished_at": datetime.now().isoformat(timespec="seconds"),
+        "params": {
+            "start": start_year,
+            "end": end_year,
+            "pause": pause,
+            "villes": villes_filtrees,
+            "retry_from": retry_from,
+            "hourly": hourly,
+            "gaps_only": gaps_only,
+        },
+        "summary": summary,
+        "units": units,
+    }
+    path = write_report(report)
+
+    print(f"\n🎉 Collecte terminée ! Données insérées dans `{table}`.")
+    print(f"   {summary['ok']} ok • {summary['empty']} vides • {summary['failed']} en échec • "
+          f"{summary['rows']} lignes • {summary['bytes'] / 1e6:.1f} Mo • "
+          f"{summary['requests_per_s']} req/s")
+    print(f"🧾 Rapport : {path}")
+    print_budget()
+    if not hourly and summary["rows"]:
+        # Nouveaux cumuls mensuels : SPI recalculé avec les paramètres enregistrés
+        spi = update_spi()
+        if spi:
+            print(f"🏜️ SPI mis à jour : {spi} valeurs (réajuster : python scripts/spi.py --fit)")
+    if summary["failed"]:
+        print("   Relancer les échecs : python scripts/collect.py --retry-failed")
 
 
 # ---------------------------------------------------------
@@ -114,8 +319,8 @@ def parse_arguments():
     parser.add_argument(
         "--pause",
         type=float,
-        default=1.0,
-        help="Pause (secondes) entre les appels API"
+        default=0.0,
+        help="Pause (secondes) entre les appels API (le budget partagé modules.quota régule déjà le débit)"
     )
 
     parser.add_argument(
@@ -130,6 +335,26 @@ def parse_arguments():
         help="Ne pas synchroniser les villes depuis config.yaml"
     )
 
+    parser.add_argument(
+        "--hourly",
+        action="store_true",
+        help="Archive horaire (meteo_archive_hourly, écrite par tronçons mensuels)"
+    )
+
+    parser.add_argument(
+        "--retry-failed",
+        nargs="?",
+        const=LAST_REPORT,
+        metavar="RAPPORT",
+        help="Rejoue uniquement les unités en échec du rapport indiqué (dernier rapport par défaut)"
+    )
+
+    parser.add_argument(
+        "--gaps",
+        action="store_true",
+        help="Ne collecte que les années incomplètes (catalogue archive_coverage)"
+    )
+
     parser.add_argument(
         "--force",
         action="store_true",
@@ -147,6 +372,7 @@ if __name__ == "__main__":
     print("=== 📡 COLLECTE DES DONNÉES ARCHIVÉES (Open-Meteo) ===")
 
     args = parse_arguments()
+    configure_logging()
 
     ensure_data_folder()
     reset_database_if_requested(args.force)
@@ -166,5 +392,8 @@ if __name__ == "__main__":
         start_year=args.start,
         end_year=args.end,
         pause=args.pause,
-        villes_filtrees=args.villes
+        villes_filtrees=args.villes,
+        retry_from=args.retry_failed,
+        hourly=args.hourly,
+        gaps_only=args.gaps
     )
@@ -0,0 +1,267 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import argparse
+import multiprocessing as mp
+import queue
+import time
+
+import polars as pl
+
+from modules.storage import init_db, read_villes, write_collected
+from modules.meteo import get_meteo_range, iter_meteo_hourly
+from modules.workqueue import (
+    LEASE_SECONDS,
+    MAX_ATTEMPTS,
+    Heartbeat,
+    claim,
+    complete_many,
+    connect_queue,
+    enqueue,
+    fail,
+    fail_many,
+    init_queue,
+    outstanding,
+    queue_stats,
+    reset_failed,
+    worker_id,
+)
+from modules.logs import configure_logging
+from modules.quota import remaining
+
+
+# ---------------------------------------------------------
+# TRAVAILLEUR : prise de bail → téléchargement → parsing
+# ---------------------------------------------------------
+
+def fetch_unit(unit: dict) -> tuple[pl.DataFrame | None, str | None]:
+    """Télécharge une unité ; renvoie (frame, erreur)."""
+    report = {}
+    if unit["kind"] == "hourly":
+        chunks = list(iter_meteo_hourly(
+            unit["id_ville"], unit["latitude"], unit["longitude"],
+            unit["start_date"], unit["end_date"], report=report,
+        ))
+        if report["failed_chunks"]:
+            return None, report.get("error", "tronçon en échec")
+        return (pl.concat(chunks) if chunks else None), None
+
+    df = get_meteo_range(
+        unit["id_ville"], unit["latitude"], unit["longitude"],
+        unit["start_date"], unit["end_date"], report=report,
+    )
+    return df, report.get("error")
+
+
+def put_frame(frames: mp.Queue, item, stop) -> bool:
+    """frames.put, abandonné si `stop` est levé (écrivain arrêté : la file ne se vide plus)."""
+    while not stop.is_set():
+        try:
+            frames.put(item, timeout=1.0)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def worker(frames: mp.Queue, stop, lease_seconds: float, max_attempts: int, wait_seconds: float):
+    """
+    Boucle d'un processus travailleur. Les frames partent vers l'écrivain ;
+    l'unité reste louée, et son bail prolongé par le battement, jusqu'à ce
+    que l'écrivain l'ait validée : aucun autre travailleur ne peut la
+    reprendre entre-temps. Seul l'arrêt du travailleur laisse expirer le
+    bail (l'unité est alors reprise et réécrite, sans doublons).
+    `stop` (levé par le parent si l'écrivain meurt) arrête la boucle : les
+    unités confiées ne sont plus prolongées et seront reprises.
+    """
+    configure_logging()
+    owner = worker_id()
+    conn = connect_queue()
+    beat = Heartbeat(owner, lease_seconds).start()
+
+    try:
+        while not stop.is_set():
+            unit = claim(conn, owner, lease_seconds)
+            if unit is None:
+                if wait_seconds > 0:
+                    time.sleep(wait_seconds)
+                elif outstanding(conn):
+                    # Unités encore louées : validation en attente chez l'écrivain,
+                    # ou travailleur planté dont le bail va expirer → on patiente
+                    time.sleep(min(1.0, lease_seconds / 3))
+                else:
+                    break
+                continue
+
+            beat.add(unit["id"])
+            df, error = fetch_unit(unit)
+
+            if error:
+                fail(conn, unit["id"], owner, error, max_attempts)
+                beat.discard(unit["id"])
+            elif df is None or df.is_empty():
+                complete_many(conn, [(unit["id"], 0)])
+                beat.discard(unit["id"])
+            else:
+                # Reste suivie par le battement jusqu'au complete_many de l'écrivain
+                put_frame(frames, (unit["id"], unit["kind"], unit["id_ville"],
+                                   unit["start_date"], unit["end_date"], df), stop)
+    finally:
+        beat.stop()
+        conn.close()
+        put_frame(frames, None, stop)  # fin de ce travailleur
+
+
+# ---------------------------------------------------------
+# ÉCRIVAIN UNIQUE : commits groupés
+# ---------------------------------------------------------
+
+def writer(frames: mp.Queue, n_workers: int, batch_rows: int, flush_seconds: float,
+           max_attempts: int):
+    """
+    Seul processus qui écrit dans la base météo : accumule les frames et
+    les valide par lots (batch_rows lignes ou flush_seconds), puis marque
+    les unités correspondantes `done` dans la file. Un lot en échec est
+    rendu à la file (fail_many : en attente, ou `failed` après
+    max_attempts essais) et l'écrivain continue.
+    """
+    configure_logging()
+    conn = connect_queue()
+    pending, rows, finished = [], 0, 0
+    last_flush = time.monotonic()
+
+    def flush():
+        nonlocal pending, rows, last_flush
+        if pending:
+            try:
+                write_collected([(kind, v, s, e, df) for _, kind, v, s, e, df in pending])
+                complete_many(conn, [(unit_id, df.height) for unit_id, *_, df in pending])
+            except Exception as e:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                print(f"❌ Écriture d'un lot de {len(pending)} unité(s) → {e}")
+                fail_many(conn, [unit_id for unit_id, *_ in pending], str(e), max_attempts)
+        pending, rows, last_flush = [], 0, time.monotonic()
+
+    while finished < n_workers:
+        try:
+            item = frames.get(timeout=flush_seconds)
+        except queue.Empty:
+            item = False
+
+        if item is None:
+            finished += 1
+        elif item:
+            pending.append(item)
+            rows += item[-1].height
+
+        if rows >= batch_rows or time.monotonic() - last_flush >= flush_seconds:
+            flush()
+
+    flush()
+    conn.close()
+
+
+def run(n_workers: int, lease_seconds: float, max_attempts: int, batch_rows: int,
+        flush_seconds: float, wait_seconds: float):
+    frames = mp.Queue(maxsize=n_workers * 4)  # contre-pression sur les travailleurs
+    stop = mp.Event()  # écrivain mort : les travailleurs s'arrêtent au lieu d'attendre
+
+    w = mp.Process(target=writer, args=(frames, n_workers, batch_rows, flush_seconds, max_attempts),
+                   name="writer")
+    w.start()
+    workers = [
+        mp.Process(target=worker, args=(frames, stop, lease_seconds, max_attempts, wait_seconds),
+                   name=f"worker-{i}")
+        for i in range(n_workers)
+    ]
+    for p in workers:
+        p.start()
+
+    while any(p.is_alive() for p in workers):
+        if not w.is_alive():
+            print(f"❌ Écrivain arrêté (code {w.exitcode}) : arrêt des travailleurs, "
+                  "les unités non écrites seront reprises à l'expiration de leur bail.")
+            stop.set()
+            break
+        time.sleep(0.5)
+
+    for p in workers:
+        p.join()
+        if p.exitcode != 0:
+            put_frame(frames, None, stop)  # travailleur tué : il n'a pas signalé sa fin
+    w.join()
+
+
+# ---------------------------------------------------------
+# CLI
+# ---------------------------------------------------------
+
+def print_stats():
+    stats = queue_stats()
+    parts = [f"{k}={stats.get(k, 0)}" for k in ("pending", "leased", "done", "failed")]
+    print(f"📋 File : {' • '.join(parts)} • baux expirés={stats['expired_leases']} • lignes={stats['rows']}")
+    budget = remaining("backfill")
+    if budget:
+        print("📶 Budget Open-Meteo restant (backfill) : "
+              + " • ".join(f"{w} {b['available']}/{b['limit']}" for w, b in budget.items()))
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(
+        description="Collecte multi-processus (file SQLite à baux + écrivain unique).",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("enqueue", help="Ajoute des unités ville × tranche de dates")
+    p.add_argument("--start", default="2010-01-01", help="Date de début")
+    p.add_argument("--end", default="2020-12-31", help="Date de fin")
+    p.add_argument("--span-days", type=int, default=365, help="Taille d'une unité (jours)")
+    p.add_argument("--villes", nargs="+", help="Villes (toutes par défaut)")
+    p.add_argument("--hourly", action="store_true", help="Archive horaire (meteo_archive_hourly)")
+
+    p = sub.add_parser("run", help="Lance N travailleurs + l'écrivain jusqu'à épuisement de la file")
+    p.add_argument("--workers", type=int, default=os.cpu_count() or 2, help="Processus travailleurs")
+    p.add_argument("--lease", type=float, default=LEASE_SECONDS, help="Durée d'un bail (secondes)")
+    p.add_argument("--max-attempts", type=int, default=MAX_ATTEMPTS, help="Essais avant `failed`")
+    p.add_argument("--batch-rows", type=int, default=100_000, help="Lignes par commit de l'écrivain")
+    p.add_argument("--flush-seconds", type=float, default=2.0, help="Délai max avant commit")
+    p.add_argument("--wait", type=float, default=0.0,
+                   help="Attente quand la file est vide (0 = s'arrêter ; >0 = rester à l'écoute)")
+
+    sub.add_parser("status", help="État de la file")
+    sub.add_parser("reset-failed", help="Remet les unités `failed` en attente")
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    configure_logging()
+    init_queue()
+
+    if args.command == "enqueue":
+        init_db()
+        villes = read_villes()
+        if args.villes:
+            villes = villes.filter(pl.col("ville").is_in(args.villes))
+        added = enqueue(villes.to_dicts(), args.start, args.end, args.span_days,
+                        kind="hourly" if args.hourly else "daily")
+        print(f"➕ {added} unité(s) ajoutée(s).")
+
+    elif args.command == "run":
+        init_db()
+        t0 = time.perf_counter()
+        before = queue_stats()["rows"]
+        print(f"🚀 {args.workers} travailleur(s) + 1 écrivain ({worker_id()})")
+        run(args.workers, args.lease, args.max_attempts, args.batch_rows, args.flush_seconds, args.wait)
+        elapsed = time.perf_counter() - t0
+        rows = queue_stats()["rows"] - before
+        print(f"✔ {rows} lignes en {elapsed:.1f} s ({rows / elapsed:.0f} lignes/s)")
+
+    elif args.command == "reset-failed":
+        print(f"🔁 {reset_failed()} unité(s) remise(s) en attente.")
+
+    print_stats()
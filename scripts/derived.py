@@ -0,0 +1,94 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import argparse
+import time
+
+import polars as pl
+
+from modules.storage import init_db, read_observations, read_villes, write_rollup
+from modules.derived import derived_rollup
+from modules.logs import configure_logging
+
+
+# ---------------------------------------------------------
+# CLI
+# ---------------------------------------------------------
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(
+        description="Cumuls des variables dérivées (point de rosée, indice de chaleur, "
+                    "degrés-jours, amplitude, jours de pluie) → archive_rollup.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+
+    parser.add_argument(
+        "--every",
+        nargs="+",
+        default=["1mo", "1y"],
+        help="Périodes Polars à matérialiser (ex: 1w 1mo 1y)"
+    )
+
+    parser.add_argument(
+        "--start",
+        default="1900-01-01",
+        help="Date de début (YYYY-MM-DD, à caler sur un début de période)"
+    )
+
+    parser.add_argument(
+        "--end",
+        default="2100-12-31",
+        help="Date de fin (YYYY-MM-DD)"
+    )
+
+    parser.add_argument(
+        "--parquet",
+        help="Lire un export Parquet (scripts/export.py) au lieu de la base"
+    )
+
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Afficher les cumuls sans les écrire"
+    )
+
+    return parser.parse_args()
+
+
+# ---------------------------------------------------------
+# MAIN
+# ---------------------------------------------------------
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    configure_logging()
+    init_db()
+
+    if args.parquet:
+        # Lecture paresseuse : seules les colonnes et lignes utiles sont lues
+        source = pl.scan_parquet(args.parquet).filter(
+            pl.col("date").cast(pl.String).is_between(pl.lit(args.start), pl.lit(args.end))
+        )
+    else:
+        source = read_observations(args.start, args.end).lazy()
+
+    noms = dict(read_villes().select("id", "ville").iter_rows())
+
+    for every in args.every:
+        t0 = time.perf_counter()
+        rollup = derived_rollup(source, every).collect()
+        elapsed = time.perf_counter() - t0
+
+        if rollup.is_empty():
+            print(f"⚠️ {every} : aucune donnée d'archive sur la période.")
+            continue
+
+        print(f"📊 {every} : {rollup.height} périodes • {rollup['id_ville'].n_unique()} villes "
+              f"• {elapsed * 1000:.0f} ms")
+        if args.dry_run:
+            print(rollup.with_columns(pl.col("id_ville").replace_strict(noms, default=None).alias("ville")))
+            continue
+
+        write_rollup(every, rollup)
+        print(f"✔ archive_rollup ({every}) mis à jour")
@@ -0,0 +1,94 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import argparse
+
+import polars as pl
+from tqdm import tqdm
+
+from modules.storage import read_villes
+from modules.export import export_archive, EXPORT_FORMATS, EXPORT_BATCH_ROWS
+from modules.logs import configure_logging
+
+
+# ---------------------------------------------------------
+# CLI
+# ---------------------------------------------------------
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(
+        description="Export de meteo_archive en CSV ou Parquet (mémoire constante).",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+
+    parser.add_argument(
+        "output",
+        help="Fichier de sortie (ex: archive.parquet)"
+    )
+
+    parser.add_argument(
+        "--format",
+        choices=list(EXPORT_FORMATS),
+        help="Format (déduit de l'extension par défaut)"
+    )
+
+    parser.add_argument(
+        "--start",
+        default="1900-01-01",
+        help="Date de début (YYYY-MM-DD)"
+    )
+
+    parser.add_argument(
+        "--end",
+        default="2100-12-31",
+        help="Date de fin (YYYY-MM-DD)"
+    )
+
+    parser.add_argument(
+        "--villes",
+        nargs="+",
+        help="Villes à exporter (toutes par défaut)"
+    )
+
+    parser.add_argument(
+        "--batch-rows",
+        type=int,
+        default=EXPORT_BATCH_ROWS,
+        help="Lignes par lot (borne la mémoire)"
+    )
+
+    return parser.parse_args()
+
+
+# ---------------------------------------------------------
+# MAIN
+# ---------------------------------------------------------
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    configure_logging()
+
+    fmt = args.format or os.path.splitext(args.output)[1].lstrip(".").lower()
+    if fmt not in EXPORT_FORMATS:
+        sys.exit(f"❌ Format inconnu : {fmt!r} (utiliser --format {'/'.join(EXPORT_FORMATS)})")
+
+    villes = read_villes()
+    if args.villes:
+        villes = villes.filter(pl.col("ville").is_in(args.villes))
+    if villes.is_empty():
+        sys.exit("❌ Aucune ville sélectionnée.")
+
+    pbar = tqdm(desc="📤 Export", unit="ligne", unit_scale=True)
+
+    def progress(done: int, total: int):
+        pbar.total = total
+        pbar.update(done - pbar.n)
+
+    result = export_archive(
+        args.output, fmt, villes["id"].to_list(), args.start, args.end,
+        progress=progress, batch_rows=args.batch_rows,
+    )
+    pbar.close()
+
+    print(f"✔ {result['rows']} lignes • {result['bytes'] / 1e6:.1f} Mo → {result['path']}")
@@ -0,0 +1,125 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import argparse
+
+import polars as pl
+from apscheduler.schedulers.blocking import BlockingScheduler
+
+from modules.storage import init_db
+from modules.forecast import collect_forecasts, refresh_verification, skill_table
+from modules.logs import configure_logging
+
+
+# ---------------------------------------------------------
+# TÂCHES
+# ---------------------------------------------------------
+
+def job_collect(days: int):
+    rows = collect_forecasts(days=days)
+    print(f"📥 Émission enregistrée : {rows} lignes dans `meteo_forecast`.")
+
+
+def job_verify(rebuild: bool = False):
+    pairs = refresh_verification(rebuild=rebuild)
+    print(f"✅ Vérification : {pairs} nouvelles paires prévision/observation.")
+
+
+def print_skill(variable: str | None):
+    df = skill_table()
+    if variable:
+        df = df.filter(pl.col("variable") == variable)
+    if df.is_empty():
+        print("Aucun score : il faut des prévisions dont les observations sont archivées.")
+        return
+
+    with pl.Config(tbl_rows=-1, float_precision=2):
+        print(df.drop("id_ville"))
+
+
+# ---------------------------------------------------------
+# CLI
+# ---------------------------------------------------------
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(
+        description="Collecte planifiée des prévisions (meteo_forecast) et vérification.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+
+    parser.add_argument(
+        "--once",
+        action="store_true",
+        help="Une seule émission + vérification, sans planificateur"
+    )
+
+    parser.add_argument(
+        "--every-hours",
+        type=int,
+        default=6,
+        help="Intervalle entre deux émissions (planificateur)"
+    )
+
+    parser.add_argument(
+        "--days",
+        type=int,
+        default=7,
+        help="Nombre de jours prévus par émission"
+    )
+
+    parser.add_argument(
+        "--verify-only",
+        action="store_true",
+        help="Vérification incrémentale seulement (pas de collecte)"
+    )
+
+    parser.add_argument(
+        "--rebuild",
+        action="store_true",
+        help="Recalcule la vérification depuis la première prévision"
+    )
+
+    parser.add_argument(
+        "--report",
+        nargs="?",
+        const="",
+        metavar="VARIABLE",
+        help="Affiche biais / MAE / RMSE par ville et échéance (ex: --report temp_max)"
+    )
+
+    return parser.parse_args()
+
+
+# ---------------------------------------------------------
+# MAIN
+# ---------------------------------------------------------
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    configure_logging()
+    init_db()
+
+    if args.report is not None:
+        print_skill(args.report or None)
+
+    elif args.verify_only or args.rebuild:
+        job_verify(rebuild=args.rebuild)
+
+    elif args.once:
+        job_collect(args.days)
+        job_verify()
+
+    else:
+        print(f"⏰ Émissions toutes les {args.every_hours} h, vérification quotidienne (Ctrl+C pour arrêter).")
+        scheduler = BlockingScheduler(timezone="America/Port-au-Prince")
+        scheduler.add_job(job_collect, "interval", hours=args.every_hours, args=[args.days],
+                          id="collect", coalesce=True, max_instances=1)
+        scheduler.add_job(job_verify, "cron", hour=7, id="verify", coalesce=True, max_instances=1)
+
+        # Première émission immédiate
+        job_collect(args.days)
+        try:
+            scheduler.start()
+        except (KeyboardInterrupt, SystemExit):
+            pass
@@ -0,0 +1,141 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import argparse
+import json
+import statistics
+
+from modules.storage import SLOW_QUERY_LOG, SLOW_QUERY_MS, explain, plan_warnings
+
+
+# ---------------------------------------------------------
+# LECTURE DU JOURNAL
+# ---------------------------------------------------------
+
+def read_log(path: str) -> list[dict]:
+    """Une entrée par requête lente (JSON lines écrit par modules/storage)."""
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def group_by_query(records: list[dict]) -> list[dict]:
+    """
+    Regroupe par requête nommée (+ texte SQL, pour distinguer les tris
+    de read_archive_page), trié par temps cumulé décroissant.
+    """
+    groups = {}
+    for r in records:
+        groups.setdefault((r["query"], r["sql"]), []).append(r)
+
+    rows = []
+    for (name, sql), items in groups.items():
+        durations = [r["duration_ms"] for r in items]
+        last = items[-1]
+        rows.append({
+            "query": name,
+            "sql": sql,
+            "count": len(items),
+            "total_ms": sum(durations),
+            "median_ms": statistics.median(durations),
+            "max_ms": max(durations),
+            "rows": last["rows"],
+            "params": last["params"],
+            "plan": last["plan"],
+            "warnings": last["warnings"],
+        })
+    return sorted(rows, key=lambda r: r["total_ms"], reverse=True)
+
+
+# ---------------------------------------------------------
+# AFFICHAGE
+# ---------------------------------------------------------
+
+def print_report(rows: list[dict], top: int, replan: bool):
+    for i, r in enumerate(rows[:top], 1):
+        print(f"#{i} {r['query']} — {r['count']} fois • total {r['total_ms']:.0f} ms • "
+              f"médiane {r['median_ms']:.1f} ms • max {r['max_ms']:.1f} ms • {r['rows']} lignes")
+        print(f"   {r['sql']}")
+
+        plan, warnings = r["plan"], r["warnings"]
+        if replan:
+            # Plan recalculé sur la base actuelle (ex: après ajout d'un index)
+            plan = explain(r["sql"], r["params"])
+            warnings = plan_warnings(plan)
+
+        for line in plan:
+            print(f"     {line}")
+        for w in warnings:
+            kind, _, detail = w.partition(": ")
+            label = "⚠️  FULL SCAN" if kind == "full_scan" else "⚠️  TRI TEMPORAIRE"
+            print(f"   {label} : {detail}")
+        print()
+
+
+# ---------------------------------------------------------
+# CLI
+# ---------------------------------------------------------
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(
+        description="Top des requêtes SQLite lentes et de leurs plans (EXPLAIN QUERY PLAN).",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+
+    parser.add_argument(
+        "--log",
+        default=str(SLOW_QUERY_LOG),
+        help="Journal des requêtes lentes (METEO_SLOW_QUERY_LOG)"
+    )
+
+    parser.add_argument(
+        "--top",
+        type=int,
+        default=10,
+        help="Nombre de requêtes affichées"
+    )
+
+    parser.add_argument(
+        "--replan",
+        action="store_true",
+        help="Recalcule les plans sur la base actuelle au lieu des plans enregistrés"
+    )
+
+    parser.add_argument(
+        "--scans-only",
+        action="store_true",
+        help="N'affiche que les requêtes avec un parcours complet de table"
+    )
+
+    parser.add_argument(
+        "--clear",
+        action="store_true",
+        help="Vide le journal après affichage"
+    )
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+
+    records = read_log(args.log)
+    if not records:
+        print(f"Aucune requête lente dans {args.log} (seuil : {SLOW_QUERY_MS:.0f} ms, METEO_SLOW_QUERY_MS).")
+        sys.exit(0)
+
+    rows = group_by_query(records)
+    if args.scans_only:
+        rows = [r for r in rows if any(w.startswith("full_scan") for w in r["warnings"])]
+
+    scans = sum(1 for r in rows if any(w.startswith("full_scan") for w in r["warnings"]))
+    print(f"=== 🐢 {len(records)} requêtes lentes • {len(rows)} distinctes • "
+          f"{scans} avec parcours complet ===\n")
+
+    print_report(rows, args.top, args.replan)
+
+    if args.clear:
+        os.remove(args.log)
+        print(f"🧹 Journal vidé : {args.log}")
@@ -0,0 +1,110 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import argparse
+import time
+
+import polars as pl
+
+from modules.storage import init_db
+from modules.spi import SPI_SCALES, fit_spi, spi_table, update_spi
+from modules.logs import configure_logging
+
+
+# ---------------------------------------------------------
+# TÂCHES
+# ---------------------------------------------------------
+
+def job_fit(ref_start: int | None, ref_end: int | None, scales: list[int]):
+    t0 = time.perf_counter()
+    fitted, values = fit_spi(ref_start, ref_end, scales)
+    print(f"📐 {fitted} lois gamma ajustées • {values} valeurs SPI • {time.perf_counter() - t0:.1f} s")
+    if not fitted:
+        print("⚠️ Aucune loi ajustée : l'archive est trop courte (collecter d'abord avec scripts/collect.py).")
+
+
+def job_update():
+    t0 = time.perf_counter()
+    written = update_spi()
+    if not written:
+        print("Aucune valeur à mettre à jour (pas de paramètres : lancer --fit, ou pas de mois complet récent).")
+        return
+    print(f"✅ {written} valeurs SPI mises à jour • {(time.perf_counter() - t0) * 1000:.0f} ms")
+
+
+def print_latest(scale: int):
+    df = spi_table(scale)
+    if df.is_empty():
+        print("Aucun SPI enregistré : lancer python scripts/spi.py --fit")
+        return
+
+    with pl.Config(tbl_rows=-1, float_precision=2):
+        print(df.group_by("ville").agg(pl.all().sort_by("periode").last()).drop("id_ville").sort("ville"))
+
+
+# ---------------------------------------------------------
+# CLI
+# ---------------------------------------------------------
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(
+        description="Indice de précipitations normalisé (SPI) : ajustement complet ou mise à jour quotidienne.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+
+    parser.add_argument(
+        "--fit",
+        action="store_true",
+        help="Réajuste toutes les lois gamma et recalcule tout l'historique (tâche batch)"
+    )
+
+    parser.add_argument(
+        "--ref-start",
+        type=int,
+        help="Première année de la période de référence (toute l'archive par défaut)"
+    )
+
+    parser.add_argument(
+        "--ref-end",
+        type=int,
+        help="Dernière année de la période de référence"
+    )
+
+    parser.add_argument(
+        "--scales",
+        type=int,
+        nargs="+",
+        default=list(SPI_SCALES),
+        help="Échelles de cumul (mois) pour --fit"
+    )
+
+    parser.add_argument(
+        "--report",
+        type=int,
+        nargs="?",
+        const=3,
+        metavar="SCALE",
+        help="Affiche le dernier SPI de chaque ville (ex: --report 12)"
+    )
+
+    return parser.parse_args()
+
+
+# ---------------------------------------------------------
+# MAIN
+# ---------------------------------------------------------
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    configure_logging()
+    init_db()
+
+    if args.report is not None:
+        print_latest(args.report)
+
+    elif args.fit:
+        job_fit(args.ref_start, args.ref_end, args.scales)
+
+    else:
+        job_update()